@@ -1,6 +1,8 @@
 import os
-import requests
-import pandas as pd
+import csv
+import asyncio
+import aiohttp
+import aiofiles
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from datetime import datetime
@@ -10,61 +12,88 @@ BASE_URL = "https://pradan.issdc.gov.in/al1/protected/browse.xhtml?id=suit"
 LOCAL_DIR = "fits_images"
 CSV_FILE = "fits_image_log.csv"
 USER_AGENT = "Mozilla/5.0"
+CSV_HEADER = ['filename', 'url', 'date_downloaded']
+MAX_CONCURRENT_DOWNLOADS = 8
+CHUNK_SIZE = 1 << 16
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.3
+TIMEOUT = aiohttp.ClientTimeout(sock_connect=5, sock_read=30)
 
 # --- Ensure directory exists ---
 os.makedirs(LOCAL_DIR, exist_ok=True)
 
-# --- Initialize existing image set from directory ---
-existing_files = set(os.listdir(LOCAL_DIR))
-
-# --- Load existing CSV if exists ---
+# --- Initialize known files from directory and existing CSV log ---
+known_files = set(os.listdir(LOCAL_DIR))
 if os.path.exists(CSV_FILE):
-    existing_df = pd.read_csv(CSV_FILE)
-    downloaded_files = set(existing_df['filename'])
-else:
-    existing_df = pd.DataFrame(columns=['filename', 'url', 'date_downloaded'])
-    downloaded_files = set()
-
-# --- Request the page ---
-headers = {"User-Agent": USER_AGENT}
-response = requests.get(BASE_URL, headers=headers)
-soup = BeautifulSoup(response.content, "html.parser")
-
-# --- Extract .fits links ---
-new_entries = []
-for a_tag in soup.find_all("a", href=True):
-    href = a_tag["href"]
-    if href.endswith(".fits"):
-        fits_url = urljoin(BASE_URL, href)
-        filename = href.split("/")[-1]
-
-        # Skip if already downloaded
-        if filename in existing_files or filename in downloaded_files:
-            continue
-
-        print(f"Downloading: {filename}")
-        try:
-            file_data = requests.get(fits_url, stream=True)
-            file_path = os.path.join(LOCAL_DIR, filename)
-            with open(file_path, "wb") as f:
-                for chunk in file_data.iter_content(chunk_size=8192):
-                    f.write(chunk)
-
-            # Add entry to CSV data
-            new_entries.append({
-                "filename": filename,
-                "url": fits_url,
-                "date_downloaded": datetime.now().isoformat()
-            })
-
-        except Exception as e:
-            print(f"Failed to download {filename}: {e}")
-
-# --- Append to or create CSV ---
+    with open(CSV_FILE, newline="") as fh:
+        known_files.update(row[0] for row in csv.reader(fh) if row)
+
+
+async def fetch(session, url, path, sem, writer):
+    """Stream one FITS file to disk and log it, returning True on success."""
+    filename = os.path.basename(path)
+    async with sem:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    print(f"Downloading: {filename}")
+                    async with aiofiles.open(path, "wb") as f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await f.write(chunk)
+
+                # Log the row as soon as the file is on disk
+                writer.writerow([filename, url, datetime.now().isoformat()])
+                return True
+
+            except Exception as e:
+                if attempt == MAX_RETRIES:
+                    print(f"Failed to download {filename}: {e}")
+                    return False
+                # Exponential backoff before retrying on the same pooled connection
+                await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+
+
+async def download_all():
+    # One session for the whole run so every download reuses keep-alive connections
+    connector = aiohttp.TCPConnector(limit=16, limit_per_host=MAX_CONCURRENT_DOWNLOADS, keepalive_timeout=60)
+    async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}, timeout=TIMEOUT) as session:
+        # --- Request the page ---
+        async with session.get(BASE_URL) as response:
+            content = await response.read()
+        soup = BeautifulSoup(content, "html.parser")
+
+        # --- Extract .fits links ---
+        fits_links = []
+        for a_tag in soup.find_all("a", href=True):
+            href = a_tag["href"]
+            if href.endswith(".fits"):
+                filename = href.split("/")[-1]
+
+                # Skip if already downloaded
+                if filename in known_files:
+                    continue
+
+                fits_links.append((urljoin(BASE_URL, href), filename))
+
+        # --- Append to or create CSV ---
+        new_file = not os.path.exists(CSV_FILE)
+        with open(CSV_FILE, "a", newline="", buffering=1 << 20) as fh:
+            writer = csv.writer(fh)
+            if new_file:
+                writer.writerow(CSV_HEADER)
+
+            sem = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+            tasks = [fetch(session, url, os.path.join(LOCAL_DIR, filename), sem, writer)
+                     for url, filename in fits_links]
+            results = await asyncio.gather(*tasks)
+
+    return sum(results)
+
+
+new_entries = asyncio.run(download_all())
+
 if new_entries:
-    new_df = pd.DataFrame(new_entries)
-    final_df = pd.concat([existing_df, new_df], ignore_index=True)
-    final_df.to_csv(CSV_FILE, index=False)
-    print(f"\n✅ CSV updated with {len(new_entries)} new entries.")
+    print(f"\n✅ CSV updated with {new_entries} new entries.")
 else:
     print("\n📁 No new files to download. Everything is up to date.")
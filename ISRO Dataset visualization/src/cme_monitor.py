@@ -1,20 +1,32 @@
 import tkinter as tk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import websocket
 import json
+import queue
+import threading
 import numpy as np
 from datetime import time as dt_time
 import time
 
+# Scalar series kept as fixed-size ring buffers
+HISTORY = 100
+SERIES_KEYS = ['flux_proton', 'flux_sector', 'flux_alpha', 'threshold', 'ahe', 'uncer',
+               'principal_angle', 'angular_width', 'velocity']
+
 class CMEApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Aditya-L1 & SOHO CME Monitor")
+        self.buf = {key: np.zeros(HISTORY) for key in SERIES_KEYS}
+        self.idx = 0
+        # Redraw plots only every disp_skip ticks; data is ingested every tick
+        self.step = 0
+        self.disp_skip = 5
         self.data = {
-            'flux_proton': [], 'flux_sector': [], 'flux_alpha': [], 'threshold': [],
-            'ahe': [], 'uncer': [], 'principal_angle': [], 'angular_width': [], 'velocity': [],
-            'height_time_data': [], 'cme_detections': [], 'catalog_cmes': [], 'software_cmes': [],
+            'height_time_data': np.empty((0, 0)), 'cme_detections': np.empty((0, 3)),
+            'catalog_cmes': np.empty((0, 2)), 'software_cmes': np.empty((0, 2)),
             'is_cme_particle': False, 'is_cme_lasco': False, 'lasco_time': ''
         }
 
@@ -23,6 +35,30 @@ class CMEApp:
         self.fig_front, self.ax_front = plt.subplots()
         self.fig_map, self.ax_map = plt.subplots()
 
+        # Persistent artists; update_plots only swaps their data
+        self._heatmap = self.ax_heatmap.imshow(np.zeros((100, 100)), cmap='viridis', aspect='auto')
+        self._detections = LineCollection([], colors='red', linewidths=2)
+        self.ax_heatmap.add_collection(self._detections)
+        self.ax_heatmap.set_xlabel('Time (minutes)')
+        self.ax_heatmap.set_ylabel('Height (solar radii)')
+        self.ax_heatmap.set_title('[Height, Time] Plot')
+
+        self._front_line, = self.ax_front.plot([], [], label='Current Front', color='red')
+        self._earlier_line, = self.ax_front.plot([], [], label='Earlier', color='blue')
+        self._later_line, = self.ax_front.plot([], [], label='Later', color='yellow')
+        self.ax_front.set_xlabel('Time Index')
+        self.ax_front.set_ylabel('Principal Angle (°)')
+        self.ax_front.set_title('CME Front Tracking')
+        self.ax_front.legend()
+
+        self._catalog_scatter = self.ax_map.scatter([], [], color='green', label='Catalog CMEs')
+        self._software_scatter = self.ax_map.scatter([], [], color='white', label='Software CMEs')
+        self.ax_map.set_xlim(0, 360)
+        self.ax_map.set_xlabel('Poloidal Angle (°)')
+        self.ax_map.set_ylabel('Time (minutes)')
+        self.ax_map.set_title('Combined CME Map')
+        self.ax_map.legend()
+
         # Initialize canvases
         self.canvas_heatmap = FigureCanvasTkAgg(self.fig_heatmap, master=root)
         self.canvas_front = FigureCanvasTkAgg(self.fig_front, master=root)
@@ -33,12 +69,33 @@ class CMEApp:
         self.canvas_front.get_tk_widget().pack()
         self.canvas_map.get_tk_widget().pack()
 
-        # Start mock data simulation
-        self.simulate_data()
+        # Live control for plot decimation
+        self.disp_skip_scale = tk.Scale(root, from_=1, to=20, orient=tk.HORIZONTAL,
+                                        label='Redraw every N ticks', command=self.set_disp_skip)
+        self.disp_skip_scale.set(self.disp_skip)
+        self.disp_skip_scale.pack()
+
+        # Start mock data simulation off the Tk thread; the GUI only drains the queue
+        self.q = queue.Queue(maxsize=4)
+        threading.Thread(target=self.simulate_data, daemon=True).start()
+        self._poll()
 
     def simulate_data(self):
-        # Mock data
-        mock_data = {
+        while True:
+            # Simulated ticks skip the JSON round trip and are queued as dicts
+            self.q.put(self.mock_data())
+            time.sleep(1)  # Update every 1 second
+
+    def _poll(self):
+        try:
+            while True:
+                self._dispatch(self.q.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(100, self._poll)
+
+    def mock_data(self):
+        return {
             "flux_proton": np.random.random(),
             "flux_sector": np.random.random(),
             "flux_alpha": np.random.random(),
@@ -48,97 +105,98 @@ class CMEApp:
             "principal_angle": np.random.uniform(0, 360),
             "angular_width": np.random.uniform(10, 100),
             "velocity": np.random.uniform(100, 1000),
-            "height_time_data": np.random.random((100, 100)).tolist(),
+            "height_time_data": np.random.random((100, 100)),
             "cme_detections": [[time.time(), np.random.uniform(0, 360), np.random.uniform(2, 30)] for _ in range(3)],
             "catalog_cmes": [[time.time() + i*3600, np.random.uniform(0, 360)] for i in range(5)],
             "software_cmes": [[time.time() + i*3600, np.random.uniform(0, 360)] for i in range(5)],
-            "is_cme_particle": np.random.choice([True, False]),
-            "is_cme_lasco": np.random.choice([True, False]),
+            "is_cme_particle": bool(np.random.choice([True, False])),
+            "is_cme_lasco": bool(np.random.choice([True, False])),
             "lasco_time": time.strftime("%Y-%m-%d %H:%M:%S"),
             "cme_detected": bool(np.random.rand() > 0.5)  # Convert to Python bool
 
         }
-        json.dumps(mock_data)  # ✅ Works
-        # Simulate WebSocket message
-        self.on_message(json.dumps(mock_data))
-        # Schedule next data simulation
-        self.root.after(1000, self.simulate_data)  # Update every 1 second
 
+    def _dispatch(self, data):
+        self.update_data(data)
+        self.step += 1
+        if self.step % self.disp_skip == 0:
+            self.update_plots()
+
+    # Real WebSocket traffic arrives as JSON text on the socket thread; it is queued
+    # like the simulated ticks so the plots are only touched from the Tk thread
     def on_message(self, message):
         try:
-            data = json.loads(message)
-            self.update_data(data)
-            self.update_plots()
-        except Exception as e:
+            self.q.put(json.loads(message))
+        except ValueError as e:
             print(f"Error parsing message: {e}")
 
+    def set_disp_skip(self, value):
+        self.disp_skip = max(1, int(value))
+
     def on_error(self, ws, error):
         print(f"WebSocket Error: {error}")
 
     def on_close(self, ws, close_status_code, close_msg):
         print("WebSocket Closed")
 
+    def series(self, key):
+        """Return the last HISTORY values of a ring-buffered series in arrival order."""
+        if self.idx < HISTORY:
+            return self.buf[key][:self.idx]
+        return np.roll(self.buf[key], -(self.idx % HISTORY))
+
     def update_data(self, new_data):
-        self.data['flux_proton'].append(new_data['flux_proton'])
-        self.data['flux_sector'].append(new_data['flux_sector'])
-        self.data['flux_alpha'].append(new_data['flux_alpha'])
-        self.data['threshold'].append(new_data['threshold'])
-        self.data['ahe'].append(new_data['ahe'])
-        self.data['uncer'].append(new_data['uncer'])
-        self.data['principal_angle'].append(new_data['principal_angle'])
-        self.data['angular_width'].append(new_data['angular_width'])
-        self.data['velocity'].append(new_data['velocity'])
-        self.data['height_time_data'] = new_data['height_time_data'] if new_data['height_time_data'] else self.data['height_time_data']
-        self.data['cme_detections'] = new_data['cme_detections'] if new_data['cme_detections'] else self.data['cme_detections']
-        self.data['catalog_cmes'] = new_data['catalog_cmes'] if new_data['catalog_cmes'] else self.data['catalog_cmes']
-        self.data['software_cmes'] = new_data['software_cmes'] if new_data['software_cmes'] else self.data['software_cmes']
+        i = self.idx % HISTORY
+        for key in SERIES_KEYS:
+            self.buf[key][i] = new_data[key]
+        self.idx += 1
+        if len(new_data['height_time_data']):
+            self.data['height_time_data'] = np.asarray(new_data['height_time_data'], dtype=np.float64)
+        # CME lists are stored as 2-D arrays so plotting can use column slices
+        for key in ('cme_detections', 'catalog_cmes', 'software_cmes'):
+            if len(new_data[key]):
+                self.data[key] = np.asarray(new_data[key], dtype=np.float64)
         self.data['is_cme_particle'] = new_data['is_cme_particle']
         self.data['is_cme_lasco'] = new_data['is_cme_lasco']
         self.data['lasco_time'] = new_data['lasco_time']
 
-        # Limit to last 100 points
-        for key in ['flux_proton', 'flux_sector', 'flux_alpha', 'threshold', 'ahe', 'uncer',
-                   'principal_angle', 'angular_width', 'velocity']:
-            self.data[key] = self.data[key][-100:]
-
     def update_plots(self):
         # [Height, Time] Plot
-        self.ax_heatmap.clear()
-        heatmap = self.ax_heatmap.imshow(self.data['height_time_data'], cmap='viridis', aspect='auto')
-        self.ax_heatmap.set_xlabel('Time (minutes)')
-        self.ax_heatmap.set_ylabel('Height (solar radii)')
-        self.ax_heatmap.set_title('[Height, Time] Plot')
-        for det in self.data['cme_detections']:
-            t, angle, h = det
-            x = (t - self.data['cme_detections'][0][0]) / (60 * 720) * heatmap.get_array().shape[1]
-            y = (1 - (h - 2) / 28) * heatmap.get_array().shape[0]
-            self.ax_heatmap.plot([x, x + 10], [y, y - 10], color='red', linewidth=2)
-        self.canvas_heatmap.draw()
+        height_time = self.data['height_time_data']
+        if height_time.size:
+            self._heatmap.set_array(height_time)
+            self._heatmap.set_clim(height_time.min(), height_time.max())
+        rows, cols = self._heatmap.get_array().shape
+        det = self.data['cme_detections']
+        if len(det):
+            x = (det[:, 0] - det[0, 0]) / (60 * 720) * cols
+            y = (1 - (det[:, 2] - 2) / 28) * rows
+            # One (start, end) segment per detection: shape [n, 2, 2]
+            self._detections.set_segments(np.stack([np.column_stack([x, y]),
+                                                    np.column_stack([x + 10, y - 10])], axis=1))
+        self.canvas_heatmap.draw_idle()
 
         # CME Front Tracking
-        self.ax_front.clear()
-        self.ax_front.plot(self.data['principal_angle'], label='Current Front', color='red')
-        self.ax_front.plot([a - 5 for a in self.data['principal_angle']], label='Earlier', color='blue')
-        self.ax_front.plot([a + 5 for a in self.data['principal_angle']], label='Later', color='yellow')
-        self.ax_front.set_xlabel('Time Index')
-        self.ax_front.set_ylabel('Principal Angle (°)')
-        self.ax_front.set_title('CME Front Tracking')
-        self.ax_front.legend()
-        self.canvas_front.draw()
+        principal_angle = self.series('principal_angle')
+        x = np.arange(len(principal_angle))
+        self._front_line.set_data(x, principal_angle)
+        self._earlier_line.set_data(x, principal_angle - 5)
+        self._later_line.set_data(x, principal_angle + 5)
+        self.ax_front.relim()
+        self.ax_front.autoscale_view()
+        self.canvas_front.draw_idle()
 
         # Combined Map
-        self.ax_map.clear()
-        catalog_x = [c[1] for c in self.data['catalog_cmes']]
-        catalog_y = [(c[0] - self.data['catalog_cmes'][0][0]) / (60 * 720) for c in self.data['catalog_cmes']]
-        software_x = [s[1] for s in self.data['software_cmes']]
-        software_y = [(s[0] - self.data['software_cmes'][0][0]) / (60 * 720) for s in self.data['software_cmes']]
-        self.ax_map.scatter(catalog_x, catalog_y, color='green', label='Catalog CMEs')
-        self.ax_map.scatter(software_x, software_y, color='white', label='Software CMEs')
-        self.ax_map.set_xlabel('Poloidal Angle (°)')
-        self.ax_map.set_ylabel('Time (minutes)')
-        self.ax_map.set_title('Combined CME Map')
-        self.ax_map.legend()
-        self.canvas_map.draw()
+        catalog = self.data['catalog_cmes']
+        software = self.data['software_cmes']
+        catalog_y = (catalog[:, 0] - catalog[0, 0]) / (60 * 720) if len(catalog) else catalog[:, 0]
+        software_y = (software[:, 0] - software[0, 0]) / (60 * 720) if len(software) else software[:, 0]
+        self._catalog_scatter.set_offsets(np.column_stack([catalog[:, 1], catalog_y]))
+        self._software_scatter.set_offsets(np.column_stack([software[:, 1], software_y]))
+        map_y = np.concatenate([catalog_y, software_y])
+        if map_y.size:
+            self.ax_map.set_ylim(map_y.min() - 0.5, map_y.max() + 0.5)
+        self.canvas_map.draw_idle()
 
         # Alert for CME detection
         if self.data['is_cme_particle'] or self.data['is_cme_lasco']:
@@ -1,33 +1,32 @@
 import os
-import shutil
-import pandas as pd
+import re
+from collections import namedtuple
+from functools import lru_cache
 import sunpy.map
 from astropy.io import fits
 import matplotlib.pyplot as plt
-# Create DataFrame with file paths and labels
 
 
-def filter_data_into_file(SRC_DIR, DEST_DIR):
-    sample_df = pd.DataFrame(
-        [(os.path.join(SRC_DIR, fname), fname) for fname in os.listdir(SRC_DIR)],
-        columns=['file_path', 'label']
-    )
-
-    def make_folder(folder_name):
-        os.makedirs(folder_name, exist_ok=True)
+# observation date in SUIT file names, e.g. ..._Lev1.0_2025-02-24T23.31.40.997_0972NB03.fits
+DATE_RE = re.compile(r'_(\d{4}-\d{2}-\d{2})T')
 
-    def file_transfer(source, destination):
-        shutil.move(source, destination)
+def filter_data_into_file(SRC_DIR, DEST_DIR):
+    # Source and destination live on the same volume, so a rename is enough
+    with os.scandir(SRC_DIR) as it:
+        entries = list(it)
 
-    # Move files into new folders
-    for _, row in sample_df.iterrows():
-        image = row['file_path']
-        # Adjust slicing as needed for your filenames
-        folder_name = image[40:-27]
+    created = set()
+    for entry in entries:
+        match = DATE_RE.search(entry.name)
+        if match is None:
+            print(f"Skipping file without a date in its name: {entry.name}")
+            continue
+        folder_name = match.group(1)
         dest_folder = os.path.join(DEST_DIR, folder_name)
-        make_folder(dest_folder)
-        dest_path = os.path.join(dest_folder, os.path.basename(image))
-        file_transfer(image, dest_path)
+        if dest_folder not in created:
+            os.makedirs(dest_folder, exist_ok=True)
+            created.add(dest_folder)
+        os.rename(entry.path, os.path.join(dest_folder, entry.name))
 
 # open fits image
 def open_fits_images(image_path):
@@ -42,26 +41,42 @@ def open_fits_images(image_path):
         # Create the SunPy map from the patched HDU
         return sunpy.map.Map(hdul[0].data, hdr)
 
+FitsInfo = namedtuple('FitsInfo', ['meta', 'date', 'wavelength', 'exposure'])
+
+# open a fits image once and collect the header attributes the helpers below need;
+# only these are cached, the pixel data is not kept
+def inspect_fits(image_path):
+    # mtime is part of the cache key so a rewritten file is parsed again
+    return _inspect_fits(image_path, os.path.getmtime(image_path))
+
+@lru_cache(maxsize=4096)
+def _inspect_fits(image_path, mtime):
+    image = open_fits_images(image_path)
+    return FitsInfo(
+        meta=image.meta,
+        date=image.date,
+        # Wavelength comes as e.g. '2796.0 Angstrom'
+        wavelength=float(str(image.wavelength).split()[0]),
+        exposure=str(image.exposure_time)
+    )
+
 def meta_data_of_image(image_path):
-    return open_fits_images(image_path).meta
+    return inspect_fits(image_path).meta
 
 def date_from_fit_image(image_path):
-    return open_fits_images(image_path).date.datetime.date()
+    return inspect_fits(image_path).date.datetime.date()
 
 def time_from_fit_image(image_path):
-    return open_fits_images(image_path).date.datetime.time()
+    return inspect_fits(image_path).date.datetime.time()
 
 def wavelength_from_image(image_path):
-    # Get the wavelength as a string (e.g., '2796.0 Angstrom')
-    wavelength = open_fits_images(image_path).wavelength
-    # Convert to float first, then int
-    return float(str(wavelength).split()[0])
+    return inspect_fits(image_path).wavelength
 
 def return_image(image_path):
-    image = open_fits_images(image_path)
-    image.plot(cmap='inferno')
+    info = inspect_fits(image_path)
+    open_fits_images(image_path).plot(cmap='inferno')
     plt.colorbar(label='Intensity')
-    plt.title(f"{wavelength_from_image(image_path)} - {image.date}")
+    plt.title(f"{info.wavelength} - {info.date}")
     plt.show()
 
 def return_graph(image_path):
@@ -75,5 +90,4 @@ def return_graph(image_path):
     plt.show()
 
 def exposure_duration(image_path):
-    return str(open_fits_images(image_path).exposure_time)
-
+    return inspect_fits(image_path).exposure
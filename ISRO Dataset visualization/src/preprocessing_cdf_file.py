@@ -1,131 +1,284 @@
 import pandas as pd
 import numpy as np
+import numexpr as ne
+from numba import njit
 import matplotlib.pyplot as plt
 import spacepy.pycdf as pycdf
 from spacepy import pycdf
-import shutil
+from sklearn.preprocessing import StandardScaler
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+import hashlib
 import os
+import re
+
+# decoded prepare_data_exception results, keyed on the input files and their mtimes
+CACHE_DIR = 'cache'
+
+# observation date in SWIS file names, e.g. AL1_ASW91_L2_BLK_20250621_UNP_9999_999999_V02.cdf
+DATE_RE = re.compile(r'_(\d{8})_')
 
 # rearrange distributed file accoeding to there dates
 def filter_data_into_file(SRC_DIR, DEST_DIR):
-    sample_df = pd.DataFrame(
-        [(os.path.join(SRC_DIR, fname), fname) for fname in os.listdir(SRC_DIR)],
-        columns=['file_path', 'label']
-    )
-
-    def make_folder(folder_name):
-        os.makedirs(folder_name, exist_ok=True)
-
-    def file_transfer(source, destination):
-        shutil.move(source, destination)
-
-    # Move files into new folders
-    for _, row in sample_df.iterrows():
-        image = row['file_path']
-        # Adjust slicing as needed for your filenames
-        folder_name = image[17:-24]
+    # Source and destination live on the same volume, so a rename is enough
+    with os.scandir(SRC_DIR) as it:
+        entries = list(it)
+
+    created = set()
+    for entry in entries:
+        match = DATE_RE.search(entry.name)
+        if match is None:
+            print(f"Skipping file without a date in its name: {entry.name}")
+            continue
+        folder_name = match.group(1)
         dest_folder = os.path.join(DEST_DIR, folder_name)
-        make_folder(dest_folder)
-        dest_path = os.path.join(dest_folder, os.path.basename(image))
-        file_transfer(image, dest_path)
+        if dest_folder not in created:
+            os.makedirs(dest_folder, exist_ok=True)
+            created.add(dest_folder)
+        os.rename(entry.path, os.path.join(dest_folder, entry.name))
+
+class CDFVariables(dict):
+    """Read each CDF variable fully on first access; later slices hit memory."""
+
+    def __init__(self, cdf):
+        super().__init__()
+        self.cdf = cdf
+
+    def __missing__(self, name):
+        value = self[name] = self.cdf[name][...]
+        return value
+
+def stack_columns(columns, dtype=np.float32):
+    """
+    Build a DataFrame from equal-length 1-D arrays through one preallocated 2-D block,
+    so pandas gets a single consolidated numeric block instead of one per column.
+    """
+    names = list(columns)
+    n_rows = len(columns[names[0]])
+    block = np.empty((n_rows, len(names)), dtype=dtype)
+    for j, name in enumerate(names):
+        block[:, j] = columns[name]
+    return pd.DataFrame(block, columns=names)
+
+def sun_angle_columns(sun_angle, index):
+    """Flatten a [N, sectors, components] sun_angle array into sun_angle_s*_c* columns."""
+    n_rows, n_sectors, n_comps = sun_angle.shape
+    names = [f'sun_angle_s{sector}_c{comp}' for sector in range(n_sectors) for comp in range(n_comps)]
+    return pd.DataFrame(sun_angle.reshape(n_rows, -1), columns=names, index=index)
 
 # image dataframe
 def prepare_data(image_path):
-        image_data = pycdf.CDF(image_path)
-        if 'L1_AUX' in image_path:
-            df = pd.DataFrame({
-                'epoch_for_cdf': image_data['epoch_for_cdf'][:, 0],
-                'trig_counts': image_data['trig_counts'][:, 0, 0, 0],
-                'coin_trig_counts': image_data['coin_trig_counts'][:, 0, 0],
-                'coinc_trig_count_total': image_data['coinc_trig_count_total'][:, 0],
-                'angle_tha1': image_data['angle_tha1'][:, 0, 0],
-                'angle_tha2': image_data['angle_tha2'][:, 0, 0],
-                'angle_xgse': image_data['angle_xgse'][:],
-                'angle_ygse': image_data['angle_ygse'][:],
-                'angle_zgse': image_data['angle_zgse'][:],
-                'peak_det_counts': image_data['peak_det_counts'][:, 0, 0],
-                'rej_counts': image_data['rej_counts'][:, 0, 0],
-                'obs_time': image_data['obs_time'][:, 0],
-                'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                'spacecraft_xvel': image_data['spacecraft_xvel'][:],
-                'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                'spacecraft_yvel': image_data['spacecraft_yvel'][:],
-                'spacecraft_zpos': image_data['spacecraft_zpos'][:],
-                'spacecraft_zvel': image_data['spacecraft_zvel'][:]
-            })
-            return df
+        with pycdf.CDF(image_path) as image_data:
+            v = CDFVariables(image_data)
+            if 'L1_AUX' in image_path:
+                df = stack_columns({
+                    'trig_counts': v['trig_counts'][:, 0, 0, 0],
+                    'coin_trig_counts': v['coin_trig_counts'][:, 0, 0],
+                    'coinc_trig_count_total': v['coinc_trig_count_total'][:, 0],
+                    'angle_tha1': v['angle_tha1'][:, 0, 0],
+                    'angle_tha2': v['angle_tha2'][:, 0, 0],
+                    'angle_xgse': v['angle_xgse'][:],
+                    'angle_ygse': v['angle_ygse'][:],
+                    'angle_zgse': v['angle_zgse'][:],
+                    'peak_det_counts': v['peak_det_counts'][:, 0, 0],
+                    'rej_counts': v['rej_counts'][:, 0, 0],
+                    'spacecraft_xpos': v['spacecraft_xpos'][:],
+                    'spacecraft_xvel': v['spacecraft_xvel'][:],
+                    'spacecraft_ypos': v['spacecraft_ypos'][:],
+                    'spacecraft_yvel': v['spacecraft_yvel'][:],
+                    'spacecraft_zpos': v['spacecraft_zpos'][:],
+                    'spacecraft_zvel': v['spacecraft_zvel'][:]
+                })
+                # Epochs and counters keep their native dtypes
+                df.insert(0, 'epoch_for_cdf', v['epoch_for_cdf'][:, 0])
+                df.insert(11, 'obs_time', v['obs_time'][:, 0])
+                return df
 
-        elif 'L1_TH1' in image_path:
-            df = pd.DataFrame({
-                'epoch_for_cdf': image_data['epoch_for_cdf'][:, 0],
-                'obs_time': image_data['obs_time'][:, 0],
-                'THA-1_spec': image_data['THA-1_spec'],
-                'fpga_ticks': image_data['fpga_ticks'],
-                'frame_num': image_data['frame_num']
-            })
-            return df
+            elif 'L1_TH1' in image_path:
+                df = pd.DataFrame({
+                    'epoch_for_cdf': v['epoch_for_cdf'][:, 0],
+                    'obs_time': v['obs_time'][:, 0],
+                    'THA-1_spec': list(v['THA-1_spec']),
+                    'fpga_ticks': v['fpga_ticks'],
+                    'frame_num': v['frame_num']
+                })
+                return df
+
+            elif 'L2_BLK' in image_path:
+                df = stack_columns({
+                    'proton_bulk_speed': v['proton_bulk_speed'][:],
+                    'alpha_bulk_speed': v['alpha_bulk_speed'][:],
+                    'alpha_density': v['alpha_density'][:],
+                    'alpha_thermal': v['alpha_thermal'][:],
+                    'proton_density': v['proton_density'][:],
+                    'proton_thermal': v['proton_thermal'][:],
+                    'proton_xvelocity': v['proton_xvelocity'][:],
+                    'proton_yvelocity': v['proton_yvelocity'][:],
+                    'proton_zvelocity': v['proton_zvelocity'][:],
+                    'spacecraft_xpos': v['spacecraft_xpos'][:],
+                    'spacecraft_ypos': v['spacecraft_ypos'][:],
+                    'spacecraft_zpos': v['spacecraft_zpos'][:]
+                })
+                df.insert(0, 'time', pd.to_datetime(v['epoch_for_cdf_mod'][:]))
+                return df
 
-        elif 'L2_BLK' in image_path:
-            df = pd.DataFrame({
-                'time': pd.to_datetime(image_data['epoch_for_cdf_mod'][:]),
-                'proton_bulk_speed': image_data['proton_bulk_speed'][:],
-                'alpha_bulk_speed': image_data['alpha_bulk_speed'][:],
-                'alpha_density': image_data['alpha_density'][:],
-                'alpha_thermal': image_data['alpha_thermal'][:],
-                'proton_density': image_data['proton_density'][:],
-                'proton_thermal': image_data['proton_thermal'][:],
-                'proton_xvelocity': image_data['proton_xvelocity'][:],
-                'proton_yvelocity': image_data['proton_yvelocity'][:],
-                'proton_zvelocity': image_data['proton_zvelocity'][:],
-                'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                'spacecraft_zpos': image_data['spacecraft_zpos'][:]
+            elif 'L1_TH2' in image_path:
+                df = pd.DataFrame({
+                    'epoch': v['epoch_for_cdf'][:, 0],
+                    'obs_time': v['obs_time'][:, 0],
+                    'fpga_ticks': v['fpga_ticks'][:],
+                    'frame_num': v['frame_num'][:],
+                    'tha2_spec': list(v['THA-2_spec']),
+                })
+                return df
+
+            elif 'L2_TH1' in image_path:
+                df = stack_columns({
+                    'spacecraft_xpos': v['spacecraft_xpos'][:],
+                    'spacecraft_ypos': v['spacecraft_ypos'][:],
+                    'spacecraft_zpos': v['spacecraft_zpos'][:],
+                })
+                df.insert(0, 'epoch', pd.to_datetime(v['epoch_for_cdf_mod'][:]))
+
+                # Optional: flatten sun_angle_tha1 (16 sectors × 3 components)
+                sun_angle = v['sun_angle_tha1'][:]  # shape: [N, 16, 3]
+                df = pd.concat([df, sun_angle_columns(sun_angle, df.index)], axis=1)
+
+                return df
+            # elif 'L2_TH2' in image_path:
+            #     df = pd.DataFrame({
+            #         'epoch': pd.to_datetime(v['epoch_for_cdf_mod'][:]),
+            #         'spacecraft_xpos': v['spacecraft_xpos'][:],
+            #         'spacecraft_ypos': v['spacecraft_ypos'][:],
+            #         'spacecraft_zpos': v['spacecraft_zpos'][:],
+            #         # Shape: (time, 32)
+            #         'integrated_flux_mod': v['integrated_flux_mod'][:]
+            #     })
+
+            #     # Flatten sun_angle_tha2: [time, 32 sectors, 3 components]
+            
+
+            #     return df
+
+            else:
+                return None
+
+# parse one .cdf file into a time-indexed DataFrame; runs in a worker process
+def _parse_one(file_path):
+    if not isinstance(file_path, str) or not file_path.endswith('.cdf'):
+        print(f"Skipping invalid file path: {file_path}")
+        return None
+
+    try:
+        image_data = pycdf.CDF(file_path)
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return None
+
+    with image_data:
+        v = CDFVariables(image_data)
+        df = pd.DataFrame()
+        if 'L1_AUX' in file_path:
+            df = stack_columns({
+                'trig_counts': v['trig_counts'][:, 0, 0, 0],
+                'coin_trig_counts': v['coin_trig_counts'][:, 0, 0],
+                'coinc_trig_count_total': v['coinc_trig_count_total'][:, 0],
+                'angle_tha1': v['angle_tha1'][:, 0, 0],
+                'angle_tha2': v['angle_tha2'][:, 0, 0],
+                'angle_xgse': v['angle_xgse'][:],
+                'angle_ygse': v['angle_ygse'][:],
+                'angle_zgse': v['angle_zgse'][:],
+                'peak_det_counts': v['peak_det_counts'][:, 0, 0],
+                'rej_counts': v['rej_counts'][:, 0, 0],
+                'spacecraft_xpos': v['spacecraft_xpos'][:],
+                'spacecraft_xvel': v['spacecraft_xvel'][:],
+                'spacecraft_ypos': v['spacecraft_ypos'][:],
+                'spacecraft_yvel': v['spacecraft_yvel'][:],
+                'spacecraft_zpos': v['spacecraft_zpos'][:],
+                'spacecraft_zvel': v['spacecraft_zvel'][:]
             })
-            return df
+            # Epochs and counters keep their native dtypes
+            df.insert(0, 'epoch_for_cdf', v['epoch_for_cdf'][:, 0])
+            df.insert(11, 'obs_time', v['obs_time'][:, 0])
+            df['time'] = pd.to_datetime(df['epoch_for_cdf'])
 
-        elif 'L1_TH2' in image_path:
+        elif 'L1_TH1' in file_path:
             df = pd.DataFrame({
-                'epoch': image_data['epoch_for_cdf'][:, 0],
-                'obs_time': image_data['obs_time'][:, 0],
-                'fpga_ticks': image_data['fpga_ticks'][:],
-                'frame_num': image_data['frame_num'][:],
-                'tha2_spec': image_data['THA-2_spec'][:],
+                'epoch_for_cdf': v['epoch_for_cdf'][:, 0],
+                'obs_time': v['obs_time'][:, 0],
+                'THA-1_spec': list(v['THA-1_spec']),
+                'fpga_ticks': v['fpga_ticks'],
+                'frame_num': v['frame_num']
             })
-            return df
+            df['time'] = pd.to_datetime(df['epoch_for_cdf'])
+
+        elif 'L2_BLK' in file_path:
+            df = stack_columns({
+                'proton_bulk_speed': v['proton_bulk_speed'][:],
+                'alpha_bulk_speed': v['alpha_bulk_speed'][:],
+                'alpha_density': v['alpha_density'][:],
+                'alpha_thermal': v['alpha_thermal'][:],
+                'proton_density': v['proton_density'][:],
+                'proton_thermal': v['proton_thermal'][:],
+                'proton_xvelocity': v['proton_xvelocity'][:],
+                'proton_yvelocity': v['proton_yvelocity'][:],
+                'proton_zvelocity': v['proton_zvelocity'][:],
+                'spacecraft_xpos': v['spacecraft_xpos'][:],
+                'spacecraft_ypos': v['spacecraft_ypos'][:],
+                'spacecraft_zpos': v['spacecraft_zpos'][:]
+            })
+            df.insert(0, 'time', pd.to_datetime(v['epoch_for_cdf_mod'][:]))
 
-        elif 'L2_TH1' in image_path:
+        elif 'L1_TH2' in file_path:
             df = pd.DataFrame({
-                'epoch': pd.to_datetime(image_data['epoch_for_cdf_mod'][:]),
-                'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                'spacecraft_zpos': image_data['spacecraft_zpos'][:],
+                'epoch': v['epoch_for_cdf'][:, 0],
+                'obs_time': v['obs_time'][:, 0],
+                'fpga_ticks': v['fpga_ticks'][:],
+                'frame_num': v['frame_num'][:],
+                'tha2_spec': list(v['THA-2_spec'])
             })
+            df['time'] = pd.to_datetime(df['epoch'])
 
-            # Optional: flatten sun_angle_tha1 (16 sectors × 3 components)
-            sun_angle = image_data['sun_angle_tha1'][:]  # shape: [N, 16, 3]
-            for sector in range(sun_angle.shape[1]):
-                for comp in range(3):
-                    df[f'sun_angle_s{sector}_c{comp}'] = sun_angle[:, sector, comp]
-
-            return df
-        # elif 'L2_TH2' in image_path:
-        #     df = pd.DataFrame({
-        #         'epoch': pd.to_datetime(image_data['epoch_for_cdf_mod'][:]),
-        #         'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-        #         'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-        #         'spacecraft_zpos': image_data['spacecraft_zpos'][:],
-        #         # Shape: (time, 32)
-        #         'integrated_flux_mod': image_data['integrated_flux_mod'][:]
-        #     })
-
-        #     # Flatten sun_angle_tha2: [time, 32 sectors, 3 components]
-            
-
-        #     return df
+        elif 'L2_TH1' in file_path:
+            df = stack_columns({
+                'spacecraft_xpos': v['spacecraft_xpos'][:],
+                'spacecraft_ypos': v['spacecraft_ypos'][:],
+                'spacecraft_zpos': v['spacecraft_zpos'][:]
+            })
+            df.insert(0, 'time', pd.to_datetime(v['epoch_for_cdf_mod'][:]))
+            sun_angle = v['sun_angle_tha1'][:]  # shape: [N, 16, 3]
+            df = pd.concat([df, sun_angle_columns(sun_angle, df.index)], axis=1)
+
+        # Handle missing L2_TH2 for now (commented out in original)
+        elif 'L2_TH2' in file_path:
+            df = stack_columns({
+                'spacecraft_xpos': v['spacecraft_xpos'][:],
+                'spacecraft_ypos': v['spacecraft_ypos'][:],
+                'spacecraft_zpos': v['spacecraft_zpos'][:]
+            })
+            df.insert(0, 'time', pd.to_datetime(v['epoch_for_cdf_mod'][:]))
+            # Shape: (time, 32); one spectrum per row
+            df['integrated_flux_mod'] = list(v['integrated_flux_mod'])
+            sun_angle = v['sun_angle_tha2'][:]  # shape: [N, 32, 3]
+            df = pd.concat([df, sun_angle_columns(sun_angle, df.index)], axis=1)
 
         else:
+            print(f"Unsupported file type: {file_path}")
             return None
 
+    if df.empty:
+        print(f"No data extracted from {file_path}")
+        return None
+
+    # Ensure 'time' is the index for alignment
+    return df.set_index('time')
+
+def _cache_path(file_paths):
+    stamps = sorted((p, os.path.getmtime(p)) for p in file_paths
+                    if isinstance(p, str) and os.path.exists(p))
+    cache_key = hashlib.sha1(repr(stamps).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f'{cache_key}.feather')
+
 # exception handling prepre data
 def prepare_data_exception(file_paths):
     """
@@ -138,134 +291,35 @@ def prepare_data_exception(file_paths):
     Returns:
         pd.DataFrame: Unified DataFrame with processed features, or None if processing fails.
     """
-    dfs = []
     scaler = StandardScaler()
     
     try:
-        for file_path in file_paths:
-            if not isinstance(file_path, str) or not file_path.endswith('.cdf'):
-                print(f"Skipping invalid file path: {file_path}")
-                continue
-            
-            try:
-                image_data = pycdf.CDF(file_path)
-            except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-                continue
-            
-            df = pd.DataFrame()
-            if 'L1_AUX' in file_path:
-                df = pd.DataFrame({
-                    'epoch_for_cdf': image_data['epoch_for_cdf'][:, 0],
-                    'trig_counts': image_data['trig_counts'][:, 0, 0, 0],
-                    'coin_trig_counts': image_data['coin_trig_counts'][:, 0, 0],
-                    'coinc_trig_count_total': image_data['coinc_trig_count_total'][:, 0],
-                    'angle_tha1': image_data['angle_tha1'][:, 0, 0],
-                    'angle_tha2': image_data['angle_tha2'][:, 0, 0],
-                    'angle_xgse': image_data['angle_xgse'][:],
-                    'angle_ygse': image_data['angle_ygse'][:],
-                    'angle_zgse': image_data['angle_zgse'][:],
-                    'peak_det_counts': image_data['peak_det_counts'][:, 0, 0],
-                    'rej_counts': image_data['rej_counts'][:, 0, 0],
-                    'obs_time': image_data['obs_time'][:, 0],
-                    'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                    'spacecraft_xvel': image_data['spacecraft_xvel'][:],
-                    'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                    'spacecraft_yvel': image_data['spacecraft_yvel'][:],
-                    'spacecraft_zpos': image_data['spacecraft_zpos'][:],
-                    'spacecraft_zvel': image_data['spacecraft_zvel'][:]
-                })
-                df['time'] = pd.to_datetime(df['epoch_for_cdf'])
-
-            elif 'L1_TH1' in file_path:
-                df = pd.DataFrame({
-                    'epoch_for_cdf': image_data['epoch_for_cdf'][:, 0],
-                    'obs_time': image_data['obs_time'][:, 0],
-                    'THA-1_spec': image_data['THA-1_spec'],
-                    'fpga_ticks': image_data['fpga_ticks'],
-                    'frame_num': image_data['frame_num']
-                })
-                df['time'] = pd.to_datetime(df['epoch_for_cdf'])
-
-            elif 'L2_BLK' in file_path:
-                df = pd.DataFrame({
-                    'time': pd.to_datetime(image_data['epoch_for_cdf_mod'][:]),
-                    'proton_bulk_speed': image_data['proton_bulk_speed'][:],
-                    'alpha_bulk_speed': image_data['alpha_bulk_speed'][:],
-                    'alpha_density': image_data['alpha_density'][:],
-                    'alpha_thermal': image_data['alpha_thermal'][:],
-                    'proton_density': image_data['proton_density'][:],
-                    'proton_thermal': image_data['proton_thermal'][:],
-                    'proton_xvelocity': image_data['proton_xvelocity'][:],
-                    'proton_yvelocity': image_data['proton_yvelocity'][:],
-                    'proton_zvelocity': image_data['proton_zvelocity'][:],
-                    'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                    'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                    'spacecraft_zpos': image_data['spacecraft_zpos'][:]
-                })
-
-            elif 'L1_TH2' in file_path:
-                df = pd.DataFrame({
-                    'epoch': image_data['epoch_for_cdf'][:, 0],
-                    'obs_time': image_data['obs_time'][:, 0],
-                    'fpga_ticks': image_data['fpga_ticks'][:],
-                    'frame_num': image_data['frame_num'][:],
-                    'tha2_spec': image_data['THA-2_spec'][:]
-                })
-                df['time'] = pd.to_datetime(df['epoch'])
-
-            elif 'L2_TH1' in file_path:
-                df = pd.DataFrame({
-                    'time': pd.to_datetime(image_data['epoch_for_cdf_mod'][:]),
-                    'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                    'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                    'spacecraft_zpos': image_data['spacecraft_zpos'][:]
-                })
-                sun_angle = image_data['sun_angle_tha1'][:]  # shape: [N, 16, 3]
-                for sector in range(sun_angle.shape[1]):
-                    for comp in range(3):
-                        df[f'sun_angle_s{sector}_c{comp}'] = sun_angle[:, sector, comp]
-
-            # Handle missing L2_TH2 for now (commented out in original)
-            elif 'L2_TH2' in file_path:
-                df = pd.DataFrame({
-                    'time': pd.to_datetime(image_data['epoch_for_cdf_mod'][:]),
-                    'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                    'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                    'spacecraft_zpos': image_data['spacecraft_zpos'][:],
-                    'integrated_flux_mod': image_data['integrated_flux_mod'][:]
-                })
-                sun_angle = image_data['sun_angle_tha2'][:]  # shape: [N, 32, 3]
-                for sector in range(sun_angle.shape[1]):
-                    for comp in range(3):
-                        df[f'sun_angle_s{sector}_c{comp}'] = sun_angle[:, sector, comp]
-
-            else:
-                print(f"Unsupported file type: {file_path}")
-                continue
-
-            if df.empty:
-                print(f"No data extracted from {file_path}")
-                continue
+        cache = _cache_path(file_paths)
+        if os.path.exists(cache):
+            return pd.read_feather(cache).set_index('time')
 
-            # Ensure 'time' is the index for alignment
-            df = df.set_index('time')
-            dfs.append(df)
+        # Each file is decoded independently, so spread them across processes
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            dfs = [df for df in executor.map(_parse_one, file_paths, chunksize=4) if df is not None]
 
         if not dfs:
             print("No valid data frames created from the provided files.")
             return None
 
-        # Combine all DataFrames, aligning on 'time' index
-        combined_df = pd.concat(dfs, axis=1, join='outer').sort_index()
+        # Align every frame on the union of all timestamps. Each frame is reindexed and
+        # interpolated on its own so it stays dense, then the aligned frames are joined once.
+        grid = reduce(lambda left, right: left.union(right), (df.index for df in dfs[1:]), dfs[0].index)
+        dfs = [
+            df[~df.index.duplicated()].select_dtypes('number')
+              .reindex(grid).interpolate(method='time', limit_direction='both')
+            for df in dfs
+        ]
+        combined_df = pd.concat(dfs, axis=1)
 
-        # Handle missing values due to different row sizes
+        # Only columns with no samples at all are left unfilled
         if combined_df.isnull().any().any():
-            print("Warning: Missing values detected due to row size differences. Attempting to fill...")
-            combined_df = combined_df.interpolate(method='time').ffill().bfill()
-            if combined_df.isnull().any().any():
-                print("Warning: Some missing values could not be filled. Dropping rows with NaN...")
-                combined_df = combined_df.dropna()
+            print("Warning: Some missing values could not be filled. Dropping rows with NaN...")
+            combined_df = combined_df.dropna()
 
         # Select relevant features for training
         relevant_features = [
@@ -284,6 +338,13 @@ def prepare_data_exception(file_paths):
         scaled_features = scaler.fit_transform(combined_df)
         combined_df = pd.DataFrame(scaled_features, index=combined_df.index, columns=combined_df.columns)
 
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            combined_df.rename_axis('time').reset_index().to_feather(cache, compression='zstd')
+        except Exception as e:
+            # Feather rejects e.g. duplicate column names; the result is still usable
+            print(f"Could not write cache {cache}: {e}")
+
         return combined_df
 
     except Exception as e:
@@ -308,139 +369,141 @@ def safe_get(data, key, *slices):
 
 
 
+def pad_columns(data_dict, min_len=0):
+    """
+    Bring every value of data_dict to a common length as a numpy array: scalars are
+    broadcast, shorter arrays are NaN-padded at the end.
+    """
+    max_len = max([len(v) if isinstance(v, (list, np.ndarray)) else 1 for v in data_dict.values()] + [min_len])
+    columns = {}
+    for k, v in data_dict.items():
+        if not isinstance(v, (list, np.ndarray)):
+            columns[k] = np.full(max_len, v)
+        elif len(v) < max_len:
+            columns[k] = np.concatenate([v, np.full(max_len - len(v), np.nan)])
+        else:
+            columns[k] = np.asarray(v)
+    return columns
+
+# bulk variables read from an L2_BLK file
+L2_BLK_VARS = (
+    'proton_bulk_speed', 'alpha_bulk_speed', 'alpha_density', 'alpha_thermal',
+    'proton_density', 'proton_thermal', 'proton_xvelocity', 'proton_yvelocity',
+    'proton_zvelocity', 'spacecraft_xpos', 'spacecraft_ypos', 'spacecraft_zpos',
+)
+
 # for L1
 def L1_prepare_data(image_path):
-    sample = pd.DataFrame()
+    parts = []
     for image in image_path:
-        image_data = pycdf.CDF(image)
-        if 'L1_AUX' in image:
-            df = pd.DataFrame({
-                'epoch_for_cdf': image_data['epoch_for_cdf'][:, 0],
-                'trig_counts': image_data['trig_counts'][:, 0, 0, 0],
-                'coin_trig_counts': image_data['coin_trig_counts'][:, 0, 0],
-                'coinc_trig_count_total': image_data['coinc_trig_count_total'][:, 0],
-                'angle_tha1': image_data['angle_tha1'][:, 0, 0],
-                'angle_tha2': image_data['angle_tha2'][:, 0, 0],
-                'angle_xgse': image_data['angle_xgse'][:],
-                'angle_ygse': image_data['angle_ygse'][:],
-                'angle_zgse': image_data['angle_zgse'][:],
-                'peak_det_counts': image_data['peak_det_counts'][:, 0, 0],
-                'rej_counts': image_data['rej_counts'][:, 0, 0],
-                'obs_time': image_data['obs_time'][:, 0],
-                'spacecraft_xpos': image_data['spacecraft_xpos'][:],
-                'spacecraft_xvel': image_data['spacecraft_xvel'][:],
-                'spacecraft_ypos': image_data['spacecraft_ypos'][:],
-                'spacecraft_yvel': image_data['spacecraft_yvel'][:],
-                'spacecraft_zpos': image_data['spacecraft_zpos'][:],
-                'spacecraft_zvel': image_data['spacecraft_zvel'][:]
-            })
-            sample = pd.concat([sample,df], ignore_index=True)
+        with pycdf.CDF(image) as image_data:
+            v = CDFVariables(image_data)
+            if 'L1_AUX' in image:
+                df = stack_columns({
+                    'trig_counts': v['trig_counts'][:, 0, 0, 0],
+                    'coin_trig_counts': v['coin_trig_counts'][:, 0, 0],
+                    'coinc_trig_count_total': v['coinc_trig_count_total'][:, 0],
+                    'angle_tha1': v['angle_tha1'][:, 0, 0],
+                    'angle_tha2': v['angle_tha2'][:, 0, 0],
+                    'angle_xgse': v['angle_xgse'][:],
+                    'angle_ygse': v['angle_ygse'][:],
+                    'angle_zgse': v['angle_zgse'][:],
+                    'peak_det_counts': v['peak_det_counts'][:, 0, 0],
+                    'rej_counts': v['rej_counts'][:, 0, 0],
+                    'spacecraft_xpos': v['spacecraft_xpos'][:],
+                    'spacecraft_xvel': v['spacecraft_xvel'][:],
+                    'spacecraft_ypos': v['spacecraft_ypos'][:],
+                    'spacecraft_yvel': v['spacecraft_yvel'][:],
+                    'spacecraft_zpos': v['spacecraft_zpos'][:],
+                    'spacecraft_zvel': v['spacecraft_zvel'][:]
+                })
+                # Epochs and counters keep their native dtypes
+                df.insert(0, 'epoch_for_cdf', v['epoch_for_cdf'][:, 0])
+                df.insert(11, 'obs_time', v['obs_time'][:, 0])
+                parts.append(df)
 
-        elif 'L1_TH1' in image:
-            df = pd.DataFrame({
-                'epoch_for_cdf': image_data['epoch_for_cdf'][:, 0],
-                'obs_time': image_data['obs_time'][:, 0],
-                'THA-1_spec': image_data['THA-1_spec'],
-                'fpga_ticks': image_data['fpga_ticks'],
-                'frame_num': image_data['frame_num']
-            })
-            sample = pd.concat([sample,df], ignore_index=True)
+            elif 'L1_TH1' in image:
+                df = pd.DataFrame({
+                    'epoch_for_cdf': v['epoch_for_cdf'][:, 0],
+                    'obs_time': v['obs_time'][:, 0],
+                    'THA-1_spec': list(v['THA-1_spec']),
+                    'fpga_ticks': v['fpga_ticks'],
+                    'frame_num': v['frame_num']
+                })
+                parts.append(df)
 
-        elif 'L1_TH2' in image:
-            df = pd.DataFrame({
-                'epoch': image_data['epoch_for_cdf'][:, 0],
-                'obs_time': image_data['obs_time'][:, 0],
-                'fpga_ticks': image_data['fpga_ticks'][:],
-                'frame_num': image_data['frame_num'][:],
-                'tha2_spec': image_data['THA-2_spec'][:].flatten(),
-            })
-            sample = pd.concat([sample,df], ignore_index=True)
-    return sample
+            elif 'L1_TH2' in image:
+                df = pd.DataFrame({
+                    'epoch': v['epoch_for_cdf'][:, 0],
+                    'obs_time': v['obs_time'][:, 0],
+                    'fpga_ticks': v['fpga_ticks'][:],
+                    'frame_num': v['frame_num'][:],
+                    'tha2_spec': v['THA-2_spec'][:].flatten(),
+                })
+                parts.append(df)
+    # One concat at the end instead of re-copying the growing frame per file
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
 
 
 # for L2
 
 def L2_prepare_data(image):
-    image_data = pycdf.CDF(image)
-
-    if 'L2_BLK' in image:
-            data_dict = {
-                'time': safe_get(image_data, 'epoch_for_cdf_mod'),
-                'proton_bulk_speed': safe_get(image_data, 'proton_bulk_speed'),
-                'alpha_bulk_speed': safe_get(image_data, 'alpha_bulk_speed'),
-                'alpha_density': safe_get(image_data, 'alpha_density'),
-                'alpha_thermal': safe_get(image_data, 'alpha_thermal'),
-                'proton_density': safe_get(image_data, 'proton_density'),
-                'proton_thermal': safe_get(image_data, 'proton_thermal'),
-                'proton_xvelocity': safe_get(image_data, 'proton_xvelocity'),
-                'proton_yvelocity': safe_get(image_data, 'proton_yvelocity'),
-                'proton_zvelocity': safe_get(image_data, 'proton_zvelocity'),
-                'spacecraft_xpos': safe_get(image_data, 'spacecraft_xpos'),
-                'spacecraft_ypos': safe_get(image_data, 'spacecraft_ypos'),
-                'spacecraft_zpos': safe_get(image_data, 'spacecraft_zpos')
-            }
-
-            max_len = max([len(v) if isinstance(v, (list, np.ndarray)) else 1 for v in data_dict.values()])
-            for k, v in data_dict.items():
-                if not isinstance(v, (list, np.ndarray)):
-                    data_dict[k] = [v] * max_len
-                elif len(v) < max_len:
-                    data_dict[k] = np.append(v, [np.nan] * (max_len - len(v)))
-
-            df = pd.DataFrame(data_dict)
-            sample = pd.concat([sample, df], ignore_index=True)
-
-    elif 'L2_TH1' in image or 'L2_TH2' in image:
-            is_th1 = 'L2_TH1' in image
-            data_dict = {
-                'spacecraft_xpos': safe_get(image_data, 'spacecraft_xpos'),
-                'spacecraft_ypos': safe_get(image_data, 'spacecraft_ypos'),
-                'spacecraft_zpos': safe_get(image_data, 'spacecraft_zpos')
-            }
-
-            # Attempt to access energy bins and flux data
-            try:
+    with pycdf.CDF(image) as image_data:
+        frames = []
+
+        if 'L2_BLK' in image:
+                # One read per variable; the column names match the CDF names apart from time
+                data_dict = {'time': safe_get(image_data, 'epoch_for_cdf_mod')}
+                data_dict.update({k: safe_get(image_data, k) for k in L2_BLK_VARS})
+
+                df = pd.DataFrame(pad_columns(data_dict), copy=False)
+                frames.append(df)
+
+        elif 'L2_TH1' in image or 'L2_TH2' in image:
+                is_th1 = 'L2_TH1' in image
+                data_dict = {
+                    'spacecraft_xpos': safe_get(image_data, 'spacecraft_xpos'),
+                    'spacecraft_ypos': safe_get(image_data, 'spacecraft_ypos'),
+                    'spacecraft_zpos': safe_get(image_data, 'spacecraft_zpos')
+                }
+
+                # Energy bins and flux data; safe_get returns NaN for a missing variable
                 energy_bins = safe_get(image_data, 'energy_center_mod')
                 n_bins = energy_bins.shape[1] if isinstance(energy_bins, np.ndarray) and energy_bins.ndim == 2 else 0
 
+                # Read each [time, energy] flux variable once; columns are views into the slab
+                sectors = ['s9', 's10', 's11'] if is_th1 else ['s15', 's16', 's17', 's18', 's19']
+                fluxes = {'mod': safe_get(image_data, 'integrated_flux_mod')}
+                for sector in sectors:
+                    fluxes[sector] = safe_get(image_data, f'integrated_flux_{sector}_mod')
+
                 for i in range(n_bins):
-                    data_dict[f'flux_mod_E{i}'] = safe_get(image_data, 'integrated_flux_mod', slice(None), i)
-                    if is_th1:
-                        data_dict[f'flux_s9_E{i}'] = safe_get(image_data, 'integrated_flux_s9_mod', slice(None), i)
-                        data_dict[f'flux_s10_E{i}'] = safe_get(image_data, 'integrated_flux_s10_mod', slice(None), i)
-                        data_dict[f'flux_s11_E{i}'] = safe_get(image_data, 'integrated_flux_s11_mod', slice(None), i)
-                    else:
-                        data_dict[f'flux_s15_E{i}'] = safe_get(image_data, 'integrated_flux_s15_mod', slice(None), i)
-                        data_dict[f'flux_s16_E{i}'] = safe_get(image_data, 'integrated_flux_s16_mod', slice(None), i)
-                        data_dict[f'flux_s17_E{i}'] = safe_get(image_data, 'integrated_flux_s17_mod', slice(None), i)
-                        data_dict[f'flux_s18_E{i}'] = safe_get(image_data, 'integrated_flux_s18_mod', slice(None), i)
-                        data_dict[f'flux_s19_E{i}'] = safe_get(image_data, 'integrated_flux_s19_mod', slice(None), i)
-            except Exception:
-                pass  # Skip if energy bins are missing or malformed
-
-            # Flatten sun_angle
-            sun_key = 'sun_angle_tha1' if is_th1 else 'sun_angle_tha2'
-            try:
-                sun_angle = safe_get(image_data, sun_key)
-                if isinstance(sun_angle, np.ndarray) and sun_angle.ndim == 3:
-                    for sector in range(sun_angle.shape[1]):
-                        for comp in range(sun_angle.shape[2]):
-                            data_dict[f'sun_angle_s{sector}_c{comp}'] = sun_angle[:, sector, comp]
-            except Exception:
-                pass
-
-            # Normalize lengths
-            max_len = max([len(v) if isinstance(v, (list, np.ndarray)) else 1 for v in data_dict.values()])
-            for k, v in data_dict.items():
-                if not isinstance(v, (list, np.ndarray)):
-                    data_dict[k] = [v] * max_len
-                elif len(v) < max_len:
-                    data_dict[k] = np.append(v, [np.nan] * (max_len - len(v)))
-
-            df = pd.DataFrame(data_dict)
-            sample = pd.concat([sample, df], ignore_index=True)
-
-    return sample
+                    for tag, flux in fluxes.items():
+                        # A missing or malformed slab only NaN-fills its own columns
+                        if isinstance(flux, np.ndarray) and flux.ndim == 2 and i < flux.shape[1]:
+                            data_dict[f'flux_{tag}_E{i}'] = flux[:, i]
+                        else:
+                            data_dict[f'flux_{tag}_E{i}'] = np.nan
+
+                # Flatten sun_angle with one reshape; attached as a block after padding
+                sun_key = 'sun_angle_tha1' if is_th1 else 'sun_angle_tha2'
+                sun_frame = None
+                try:
+                    sun_angle = safe_get(image_data, sun_key)
+                    if isinstance(sun_angle, np.ndarray) and sun_angle.ndim == 3:
+                        sun_frame = sun_angle_columns(sun_angle, pd.RangeIndex(len(sun_angle)))
+                except Exception:
+                    pass
+
+                # Normalize lengths
+                min_len = len(sun_frame) if sun_frame is not None else 0
+                df = pd.DataFrame(pad_columns(data_dict, min_len), copy=False)
+                if sun_frame is not None:
+                    # Shorter sun_angle columns are NaN-padded by the index alignment
+                    df = pd.concat([df, sun_frame], axis=1)
+                frames.append(df)
+
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
 def detect_cme_event_graph(df):
     """
@@ -506,7 +569,12 @@ def calculate_spacecraft_distance(df):
     """
     required_cols = ['spacecraft_xpos', 'spacecraft_ypos', 'spacecraft_zpos']
     if all(col in df.columns for col in required_cols):
-        df['distance'] = np.sqrt(df['spacecraft_xpos']**2 + df['spacecraft_ypos']**2 + df['spacecraft_zpos']**2)
+        # Single fused pass instead of three squared temporaries and two sums
+        df['distance'] = ne.evaluate('sqrt(x*x + y*y + z*z)', local_dict={
+            'x': df['spacecraft_xpos'].values,
+            'y': df['spacecraft_ypos'].values,
+            'z': df['spacecraft_zpos'].values
+        })
     else:
         raise ValueError("Required position columns not found in DataFrame")
 
@@ -521,10 +589,24 @@ def calculate_dynamic_pressure(df):
         ValueError: If required columns are missing.
     """
     if 'proton_density' in df.columns and 'proton_bulk_speed' in df.columns:
-        df['P_dyn'] = 1.67e-6 * df['proton_density'] * df['proton_bulk_speed']**2
+        df['P_dyn'] = ne.evaluate('1.67e-6 * n * v * v', local_dict={
+            'n': df['proton_density'].values,
+            'v': df['proton_bulk_speed'].values
+        })
     else:
         raise ValueError("Required columns 'proton_density' and 'proton_bulk_speed' not found in DataFrame")
 
+@njit(cache=True)
+def _label_runs(cond):
+    """Give every maximal run of equal values in cond its own increasing integer id."""
+    labels = np.empty(cond.shape[0], dtype=np.int64)
+    run_id = 0
+    for i in range(cond.shape[0]):
+        if i == 0 or cond[i] != cond[i - 1]:
+            run_id += 1
+        labels[i] = run_id
+    return labels
+
 def detect_events(df, detect_var, threshold, min_duration, comparison='above'):
     """
     Detects events where a specified variable crosses a threshold for a minimum duration.
@@ -553,16 +635,17 @@ def detect_events(df, detect_var, threshold, min_duration, comparison='above'):
         raise ValueError("Invalid comparison type; use 'above' or 'below'")
     
     df['condition'] = condition
-    df['event_id'] = (df['condition'] != df['condition'].shift()).cumsum()
+    df['event_id'] = _label_runs(condition.values.view(np.uint8))
     
     events = df[df['condition']].groupby('event_id').agg(
         start_time=('time', 'min'),
         end_time=('time', 'max'),
-        duration=('time', lambda x: (x.max() - x.min()).total_seconds()),
         average_speed=('proton_bulk_speed', 'mean'),
         first_speed=('proton_bulk_speed', 'first'),
         first_distance=('distance', 'first'),
         max_P_dyn=('P_dyn', 'max')
     ).reset_index()
+    # Duration from the two Cython aggregations instead of a per-group Python lambda
+    events.insert(3, 'duration', (events['end_time'] - events['start_time']).dt.total_seconds())
     
     return events[events['duration'] >= min_duration]
\ No newline at end of file
@@ -8,13 +8,135 @@ import glob
 import numpy as np
 import pandas as pd
 import spacepy.pycdf as cdf
-from datetime import datetime, timedelta
+from numba import njit, prange
 import torch
 import torch.nn.functional as F
 from typing import List, Dict, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
+# BLK output column -> CDF variable name
+BLK_VARS = {
+    'proton_density': 'proton_density',
+    'proton_density_error': 'numden_p_uncer',
+    'proton_bulk_speed': 'proton_bulk_speed',
+    'proton_speed_error': 'bulk_p_uncer',
+    'proton_vx': 'proton_xvelocity',
+    'proton_vy': 'proton_yvelocity',
+    'proton_vz': 'proton_zvelocity',
+    'proton_thermal_speed': 'proton_thermal',
+    'proton_thermal_error': 'thermal_p_uncer',
+    'alpha_density': 'alpha_density',
+    'alpha_density_error': 'numden_a_uncer',
+    'alpha_bulk_speed': 'alpha_bulk_speed',
+    'alpha_speed_error': 'bulk_a_uncer',
+    'alpha_thermal_speed': 'alpha_thermal',
+    'alpha_thermal_error': 'thermal_a_uncer',
+    'spacecraft_x': 'spacecraft_xpos',
+    'spacecraft_y': 'spacecraft_ypos',
+    'spacecraft_z': 'spacecraft_zpos',
+}
+
+@njit(cache=True)
+def _scan_events(cond, times_ns, min_dur_ns):
+    """
+    Scan a boolean mask for runs of True. A run ends on the first False sample;
+    runs still open at the end of the array are dropped.
+
+    Returns:
+        (start_idx, end_idx, duration_ns) arrays for runs lasting at least min_dur_ns
+    """
+    n = cond.shape[0]
+    starts = np.empty(n, dtype=np.int64)
+    ends = np.empty(n, dtype=np.int64)
+    durations = np.empty(n, dtype=np.int64)
+    count = 0
+    in_event = False
+    start = 0
+    for i in range(n):
+        if cond[i] and not in_event:
+            in_event = True
+            start = i
+        elif not cond[i] and in_event:
+            in_event = False
+            duration = times_ns[i] - times_ns[start]
+            if duration >= min_dur_ns:
+                starts[count] = start
+                ends[count] = i
+                durations[count] = duration
+                count += 1
+    return starts[:count], ends[:count], durations[:count]
+
+@njit(cache=True)
+def _rolling_median(values, window):
+    """
+    Centered rolling median matching pandas' rolling(window, center=True).median():
+    NaN wherever the window is incomplete or contains a NaN.
+
+    Keeps the current window in a sorted buffer, so each step is one binary search and
+    shift per inserted/removed sample instead of a fresh partial sort.
+    """
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if window > n:
+        return out
+    offset = (window - 1) // 2
+    half = window // 2
+    buf = np.empty(window + 1)
+    size = 0
+    n_nan = 0
+    for end in range(n):
+        x = values[end]
+        if np.isnan(x):
+            n_nan += 1
+        else:
+            k = np.searchsorted(buf[:size], x)
+            for j in range(size, k, -1):
+                buf[j] = buf[j - 1]
+            buf[k] = x
+            size += 1
+        if end >= window:
+            old = values[end - window]
+            if np.isnan(old):
+                n_nan -= 1
+            else:
+                k = np.searchsorted(buf[:size], old)
+                for j in range(k, size - 1):
+                    buf[j] = buf[j + 1]
+                size -= 1
+        if end >= window - 1 and n_nan == 0:
+            if window % 2:
+                out[end - offset] = buf[half]
+            else:
+                out[end - offset] = 0.5 * (buf[half - 1] + buf[half])
+    return out
+
+@njit(parallel=True, cache=True)
+def _rolling_medians(values, window):
+    """Column-wise _rolling_median of a [N, P] array, one column per thread."""
+    background = np.empty_like(values)
+    for j in prange(values.shape[1]):
+        background[:, j] = _rolling_median(values[:, j], window)
+    return background
+
+@njit(parallel=True, cache=True)
+def _background_scores(values, thresholds, window):
+    """
+    Rolling-median background of each column of values [N, P] and, per sample, the number
+    of columns whose ratio to background exceeds its threshold (NaN background never scores).
+    """
+    background = _rolling_medians(values, window)
+    n, p = values.shape
+    scores = np.zeros(n, dtype=np.int8)
+    for i in prange(n):
+        count = 0
+        for j in range(p):
+            if values[i, j] / (background[i, j] + 1e-10) > thresholds[j]:
+                count += 1
+        scores[i] = count
+    return background, scores
+
 class SWISDataLoader:
     """
     Data loader for ASPEX-SWIS Level-2 data from Aditya-L1 mission
@@ -74,30 +196,11 @@ class SWISDataLoader:
             with cdf.CDF(blk_file) as data:
                 # Extract time and convert to datetime
                 epoch = data['epoch_for_cdf_mod'][:]
-                timestamps = [datetime(1970, 1, 1) + timedelta(seconds=float(t)) for t in epoch]
+                timestamps = pd.to_datetime(np.asarray(epoch, dtype='float64'), unit='s')
                 
-                # Extract bulk parameters
-                df = pd.DataFrame({
-                    'timestamp': timestamps,
-                    'proton_density': data['proton_density'][:],
-                    'proton_density_error': data['numden_p_uncer'][:],
-                    'proton_bulk_speed': data['proton_bulk_speed'][:],
-                    'proton_speed_error': data['bulk_p_uncer'][:],
-                    'proton_vx': data['proton_xvelocity'][:],
-                    'proton_vy': data['proton_yvelocity'][:],
-                    'proton_vz': data['proton_zvelocity'][:],
-                    'proton_thermal_speed': data['proton_thermal'][:],
-                    'proton_thermal_error': data['thermal_p_uncer'][:],
-                    'alpha_density': data['alpha_density'][:],
-                    'alpha_density_error': data['numden_a_uncer'][:],
-                    'alpha_bulk_speed': data['alpha_bulk_speed'][:],
-                    'alpha_speed_error': data['bulk_a_uncer'][:],
-                    'alpha_thermal_speed': data['alpha_thermal'][:],
-                    'alpha_thermal_error': data['thermal_a_uncer'][:],
-                    'spacecraft_x': data['spacecraft_xpos'][:],
-                    'spacecraft_y': data['spacecraft_ypos'][:],
-                    'spacecraft_z': data['spacecraft_zpos'][:],
-                })
+                # Read every bulk variable once, then build the frame from the arrays
+                raw = {col: data[var][...] for col, var in BLK_VARS.items()}
+                df = pd.DataFrame({'timestamp': timestamps, **raw})
                 
                 # Calculate derived parameters
                 df['total_proton_speed'] = np.sqrt(df['proton_vx']**2 + df['proton_vy']**2 + df['proton_vz']**2)
@@ -116,17 +219,20 @@ class SWISDataLoader:
     def _apply_quality_filters(self, df: pd.DataFrame) -> pd.DataFrame:
         """Apply quality filters to remove bad data points"""
         # Remove negative or zero values
-        df = df[df['proton_density'] > 0]
-        df = df[df['proton_bulk_speed'] > 0]
-        df = df[df['alpha_density'] >= 0]
+        mask = ((df['proton_density'].values > 0) &
+                (df['proton_bulk_speed'].values > 0) &
+                (df['alpha_density'].values >= 0))
         
-        # Remove extreme outliers (beyond 5 sigma)
+        # Remove extreme outliers (beyond 5 sigma), with statistics taken over the
+        # physically valid samples, then apply everything as one selection
         for col in ['proton_density', 'proton_bulk_speed', 'proton_thermal_speed']:
-            mean_val = df[col].mean()
-            std_val = df[col].std()
-            df = df[np.abs(df[col] - mean_val) < 5 * std_val]
+            values = df[col].values
+            valid = values[mask]
+            mean_val = np.nanmean(valid)
+            std_val = np.nanstd(valid, ddof=1)
+            mask &= np.abs(values - mean_val) < 5 * std_val
         
-        return df.reset_index(drop=True)
+        return df.iloc[mask].reset_index(drop=True)
     
     def load_date_range(self, start_date: str, end_date: str) -> pd.DataFrame:
         """
@@ -148,15 +254,22 @@ class SWISDataLoader:
         
         print(f"Loading {len(date_range)} days of data...")
         
+        # Days are independent, so parse them in worker processes; results keep date order
+        if len(date_range) > 1:
+            with ProcessPoolExecutor(max_workers=min(len(date_range), os.cpu_count() or 1)) as executor:
+                day_frames = list(executor.map(self.load_single_day, date_range))
+        else:
+            day_frames = [self.load_single_day(date_range[0])]
+        
         all_data = []
-        for date in date_range:
-            df = self.load_single_day(date)
+        for date, df in zip(date_range, day_frames):
             if df is not None and len(df) > 0:
                 all_data.append(df)
                 print(f"Loaded {date}: {len(df)} data points")
         
         if all_data:
-            combined_df = pd.concat(all_data, ignore_index=True)
+            # A single day needs no concatenation
+            combined_df = all_data[0] if len(all_data) == 1 else pd.concat(all_data, ignore_index=True)
             combined_df = combined_df.sort_values('timestamp').reset_index(drop=True)
             print(f"Total data points: {len(combined_df)}")
             return combined_df
@@ -176,12 +289,12 @@ class SWISDataLoader:
         """
         window_size = window_hours * 3600 // 5  # Assuming ~5 second cadence
         
-        background = {}
-        for param in ['proton_density', 'proton_bulk_speed', 'proton_thermal_speed', 'alpha_proton_ratio']:
-            if param in df.columns:
-                background[param] = df[param].rolling(window=window_size, center=True).median()
+        params = [p for p in ['proton_density', 'proton_bulk_speed', 'proton_thermal_speed', 'alpha_proton_ratio']
+                  if p in df.columns]
+        values = np.column_stack([df[p].values.astype(np.float64) for p in params]) if params else np.empty((len(df), 0))
+        medians = _rolling_medians(values, window_size)
         
-        return background
+        return {p: pd.Series(medians[:, j], index=df.index, name=p) for j, p in enumerate(params)}
     
     def prepare_for_ml(self, df: pd.DataFrame, sequence_length: int = 360) -> Tuple[torch.Tensor, torch.Tensor]:
         """
@@ -205,20 +318,31 @@ class SWISDataLoader:
         features = df[feature_cols].values
         features_norm = (features - np.nanmean(features, axis=0)) / (np.nanstd(features, axis=0) + 1e-8)
         
-        # Create sequences
-        X, y = [], []
-        for i in range(len(features_norm) - sequence_length):
-            X.append(features_norm[i:i+sequence_length])
-            # Simple anomaly target based on extreme values
-            future_window = features_norm[i+sequence_length:i+sequence_length+60]  # Next hour
-            if len(future_window) > 0:
-                anomaly_score = np.mean(np.abs(future_window - np.mean(features_norm, axis=0)) > 2)
-                y.append(1 if anomaly_score > 0.3 else 0)
-            else:
-                y.append(0)
+        n_seq = max(len(features_norm) - sequence_length, 0)
+        n_features = features_norm.shape[1]
+        if n_seq == 0:
+            return (torch.empty((0, sequence_length, n_features), device=self.device),
+                    torch.empty(0, device=self.device))
+
+        # Sequence i is features_norm[i:i+sequence_length]; the window view shares memory
+        windows = np.lib.stride_tricks.sliding_window_view(features_norm, sequence_length, axis=0)
         
-        X = torch.tensor(np.array(X), dtype=torch.float32).to(self.device)
-        y = torch.tensor(np.array(y), dtype=torch.float32).to(self.device)
+        # Copy the windows straight into a pinned host buffer and start the upload;
+        # the transfer overlaps with computing the targets below
+        X_host = torch.empty((n_seq, sequence_length, n_features), dtype=torch.float32,
+                             pin_memory=self.device == 'cuda')
+        X_host.numpy()[...] = windows[:n_seq].transpose(0, 2, 1)
+        X = X_host.to(self.device, non_blocking=True)
+        
+        # Simple anomaly target based on extreme values in the next hour (up to 60 rows, fewer at the end)
+        extreme = (np.abs(features_norm - np.mean(features_norm, axis=0)) > 2).sum(axis=1)
+        cumulative = np.concatenate(([0], np.cumsum(extreme)))
+        window_start = np.arange(n_seq) + sequence_length
+        window_end = np.minimum(window_start + 60, len(features_norm))
+        anomaly_score = (cumulative[window_end] - cumulative[window_start]) / ((window_end - window_start) * n_features)
+        y = (anomaly_score > 0.3).astype(np.float32)
+        
+        y = torch.from_numpy(y).to(self.device)
         
         return X, y
     
@@ -235,48 +359,47 @@ class SWISDataLoader:
         if len(df) < 1000:  # Need sufficient data
             return []
         
-        # Calculate background levels
-        background = self.calculate_background_levels(df)
-        
-        # Detect anomalies
+        # Background levels and, per sample, how many parameters exceed their background
+        # by the threshold factor, in one parallel pass
+        params, thresholds = [], []
+        for param, threshold in [
+            ('proton_density', self.cme_thresholds['proton_density_increase']),
+            ('proton_bulk_speed', self.cme_thresholds['proton_speed_increase']),
+            ('proton_thermal_speed', self.cme_thresholds['proton_thermal_increase']),
+            ('alpha_proton_ratio', self.cme_thresholds['alpha_proton_ratio_increase'])
+        ]:
+            if param in df.columns:
+                params.append(param)
+                thresholds.append(threshold)
+        if not params:
+            return []
+        values = np.column_stack([df[p].values.astype(np.float64) for p in params])
+        window_size = self.cme_thresholds['background_window_hours'] * 3600 // 5  # Assuming ~5 second cadence
+        _, scores = _background_scores(values, np.array(thresholds), window_size)
+
+        # Event boundaries: a start where the score rises to >= 2, an end where it drops back
+        times_ns = df['timestamp'].values.astype('datetime64[ns]').view(np.int64)
+        min_dur_ns = int(self.cme_thresholds['minimum_duration_minutes'] * 60 * 1e9)
+        starts, ends, durations_ns = _scan_events((scores >= 2).view(np.uint8), times_ns, min_dur_ns)
+
+        # Pull the columns out once; the per-event lookups below index plain arrays
+        timestamps = df['timestamp']
+        proton_density = df['proton_density'].values
+        proton_speed = df['proton_bulk_speed'].values
+        alpha_ratio = df['alpha_proton_ratio'].values
+
         events = []
-        in_event = False
-        event_start = None
-        
-        for i, row in df.iterrows():
-            anomaly_score = 0
-            
-            # Check each parameter against background
-            for param, threshold in [
-                ('proton_density', self.cme_thresholds['proton_density_increase']),
-                ('proton_bulk_speed', self.cme_thresholds['proton_speed_increase']),
-                ('proton_thermal_speed', self.cme_thresholds['proton_thermal_increase']),
-                ('alpha_proton_ratio', self.cme_thresholds['alpha_proton_ratio_increase'])
-            ]:
-                if param in background and not pd.isna(background[param].iloc[i]):
-                    ratio = row[param] / (background[param].iloc[i] + 1e-10)
-                    if ratio > threshold:
-                        anomaly_score += 1
-            
-            # Event detection logic
-            if anomaly_score >= 2 and not in_event:  # Start of event
-                in_event = True
-                event_start = i
-            elif anomaly_score < 2 and in_event:  # End of event
-                in_event = False
-                duration_minutes = (df.iloc[i]['timestamp'] - df.iloc[event_start]['timestamp']).total_seconds() / 60
-                
-                if duration_minutes >= self.cme_thresholds['minimum_duration_minutes']:
-                    event = {
-                        'start_time': df.iloc[event_start]['timestamp'],
-                        'end_time': df.iloc[i]['timestamp'],
-                        'duration_minutes': duration_minutes,
-                        'max_proton_density': df.iloc[event_start:i]['proton_density'].max(),
-                        'max_proton_speed': df.iloc[event_start:i]['proton_bulk_speed'].max(),
-                        'max_alpha_ratio': df.iloc[event_start:i]['alpha_proton_ratio'].max(),
-                        'event_strength': anomaly_score
-                    }
-                    events.append(event)
+        for event_start, i, duration_ns in zip(starts, ends, durations_ns):
+            event = {
+                'start_time': timestamps.iat[event_start],
+                'end_time': timestamps.iat[i],
+                'duration_minutes': duration_ns / 60e9,
+                'max_proton_density': np.nanmax(proton_density[event_start:i]),
+                'max_proton_speed': np.nanmax(proton_speed[event_start:i]),
+                'max_alpha_ratio': np.nanmax(alpha_ratio[event_start:i]),
+                'event_strength': int(scores[i])
+            }
+            events.append(event)
         
         return events
 
@@ -5,9 +5,13 @@ import pandas as pd
 import numpy as np
 import spacepy.pycdf as pycdf
 from torch.utils.data import Dataset, DataLoader
-from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 
+# Sequence length is fixed, so let cuDNN benchmark and keep the fastest LSTM kernels
+torch.backends.cudnn.benchmark = True
+# Let matmuls left in fp32 (outside autocast) use TF32 tensor cores
+torch.set_float32_matmul_precision('high')
+
 # Define the LSTM Model
 class CMEDetectorLSTM(nn.Module):
     def __init__(self, input_size, hidden_size, num_layers, dropout=0.2, output_size=1):
@@ -16,63 +20,61 @@ class CMEDetectorLSTM(nn.Module):
         self.num_layers = num_layers
         self.lstm = nn.LSTM(input_size, hidden_size, num_layers, batch_first=True, dropout=dropout)
         self.fc = nn.Linear(hidden_size, output_size)
-        self.sigmoid = nn.Sigmoid()
 
     def forward(self, x):
-        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(x.device)
-        c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(x.device)
-        out, _ = self.lstm(x, (h0, c0))
+        # nn.LSTM starts from zero hidden/cell states when none are passed; the fused
+        # cuDNN kernel wants a contiguous (batch, time, feature) input
+        out, _ = self.lstm(x.contiguous())
         out = self.fc(out[:, -1, :])  # Last time step
-        out = self.sigmoid(out)       # Binary classification output
-        return out
+        return out                    # Logits; apply torch.sigmoid for probabilities
 
 # Custom Dataset
 class CMEDataset(Dataset):
     def __init__(self, data, labels, sequence_length=50):
         self.sequence_length = sequence_length
-        self.scaler = StandardScaler()
-        self.data = self.scaler.fit_transform(data)
+        # Standardize once and keep a float32 buffer so __getitem__ can hand out views
+        self.mean = data.mean(axis=0)
+        self.std = data.std(axis=0) + 1e-8
+        self.data = ((data - self.mean) / self.std).astype(np.float32)
         min_len = len(self.data) - self.sequence_length + 1
         self.data = self.data[:min_len + self.sequence_length - 1]
-        self.labels = labels[:min_len + self.sequence_length - 1]
+        self.labels = np.asarray(labels[:min_len + self.sequence_length - 1], dtype=np.float32)
 
     def __len__(self):
         return len(self.data) - self.sequence_length + 1
 
     def __getitem__(self, idx):
         sequence = self.data[idx:idx + self.sequence_length]
-        label = self.labels[idx + self.sequence_length - 1]  # Label for the last time step
-        return torch.FloatTensor(sequence), torch.FloatTensor([label])
+        end = idx + self.sequence_length
+        label = self.labels[end - 1:end]  # Label for the last time step
+        return torch.from_numpy(sequence), torch.from_numpy(label)
 
 # Load and Prepare Data from CDF Files
 def prepare_data(file_paths):
-    dfs = []
+    # Columns share one integer row index across files; the first file to provide a column wins
+    columns = {}
     for file_path in file_paths:
-        cdf = pycdf.CDF(file_path)
-        if 'L2_BLK' in str(file_path):
-            df = pd.DataFrame({
-                'time': pd.to_datetime(cdf['epoch_for_cdf_mod'][:]),
-                'proton_bulk_speed': cdf['proton_bulk_speed'][:],
-                'proton_density': cdf['proton_density'][:],
-                'alpha_density': cdf['alpha_density'][:],
-                'spacecraft_xpos': cdf['spacecraft_xpos'][:],
-                'spacecraft_ypos': cdf['spacecraft_ypos'][:],
-                'spacecraft_zpos': cdf['spacecraft_zpos'][:]
-            })
-            dfs.append(df)
-        elif 'L1_AUX' in str(file_path):
-            df = pd.DataFrame({
-                'spacecraft_xpos': cdf['spacecraft_xpos'][:],
-                'spacecraft_ypos': cdf['spacecraft_ypos'][:],
-                'spacecraft_zpos': cdf['spacecraft_zpos'][:]
-            })
-            dfs.append(df)
-    combined_df = pd.concat(dfs, axis=1, join='outer').ffill().bfill()
-
-    # ✅ Remove duplicated column names
-    combined_df = combined_df.loc[:, ~combined_df.columns.duplicated()]
-
-    return combined_df
+        with pycdf.CDF(file_path) as cdf:
+            if 'L2_BLK' in str(file_path):
+                names = ['proton_bulk_speed', 'proton_density', 'alpha_density',
+                         'spacecraft_xpos', 'spacecraft_ypos', 'spacecraft_zpos']
+                columns.setdefault('time', pd.to_datetime(cdf['epoch_for_cdf_mod'][:]))
+            elif 'L1_AUX' in str(file_path):
+                names = ['spacecraft_xpos', 'spacecraft_ypos', 'spacecraft_zpos']
+            else:
+                continue
+            for name in names:
+                if name not in columns:
+                    columns[name] = cdf[name][...]
+
+    # Pad shorter columns to the common length by repeating their last value
+    n_rows = max(len(v) for v in columns.values())
+    for name, values in columns.items():
+        if len(values) < n_rows:
+            columns[name] = np.pad(np.asarray(values), (0, n_rows - len(values)), mode='edge')
+
+    # Fill any gaps inside the columns themselves, as before
+    return pd.DataFrame(columns).ffill().bfill()
 
 
 # Generate Labels
@@ -80,8 +82,13 @@ def generate_labels(df):
     df['alpha_to_proton_ratio'] = df['alpha_density'] / df['proton_density']
     
     # Convert both to boolean (avoid float before using `&`)
-    condition1 = (df['alpha_to_proton_ratio'] > 0.08)
-    condition2 = (df['proton_bulk_speed'] > 500).rolling(window=10, min_periods=1).mean() > 0.5
+    condition1 = df['alpha_to_proton_ratio'].values > 0.08
+    # Majority of the trailing 10 samples above 500 km/s (shorter window at the start),
+    # as a trailing int8 convolution instead of a rolling mean over booleans
+    fast = (df['proton_bulk_speed'].values > 500).astype(np.int8)
+    fast_count = np.convolve(fast, np.ones(10, dtype=np.int8))[:len(fast)]
+    window = np.minimum(np.arange(1, len(fast) + 1), 10)
+    condition2 = fast_count > window / 2
     
     # Combine both conditions
     df['cme_label'] = (condition1 & condition2).astype(float)
@@ -89,8 +96,11 @@ def generate_labels(df):
 
 
 # Training Function
-def train_model(model, train_loader, val_loader, num_epochs, device):
-    criterion = nn.BCELoss()
+def train_model(model, train_loader, val_loader, num_epochs, device, amp_dtype=torch.bfloat16):
+    criterion = nn.BCEWithLogitsLoss()  # Fused sigmoid + BCE on the logits
+    # Mixed precision on CUDA; only fp16 needs loss scaling, bf16 has fp32's exponent range
+    use_amp = device.type == 'cuda'
+    scaler = torch.amp.GradScaler('cuda', enabled=use_amp and amp_dtype == torch.float16)
     optimizer = optim.Adam(model.parameters(), lr=0.001)
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=5)
     best_val_loss = float('inf')
@@ -101,12 +111,15 @@ def train_model(model, train_loader, val_loader, num_epochs, device):
         model.train()
         train_loss = 0
         for sequences, labels in train_loader:
-            sequences, labels = sequences.to(device), labels.to(device)
+            sequences = sequences.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
             optimizer.zero_grad()
-            outputs = model(sequences)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
+            with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                outputs = model(sequences)
+                loss = criterion(outputs, labels)
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
             train_loss += loss.item()
 
         # Validation
@@ -114,9 +127,11 @@ def train_model(model, train_loader, val_loader, num_epochs, device):
         val_loss = 0
         with torch.no_grad():
             for sequences, labels in val_loader:
-                sequences, labels = sequences.to(device), labels.to(device)
-                outputs = model(sequences)
-                val_loss += criterion(outputs, labels).item()
+                sequences = sequences.to(device, non_blocking=True)
+                labels = labels.to(device, non_blocking=True)
+                with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                    outputs = model(sequences)
+                    val_loss += criterion(outputs, labels).item()
 
         avg_train_loss = train_loss / len(train_loader)
         avg_val_loss = val_loss / len(val_loader)
@@ -173,8 +188,10 @@ if __name__ == "__main__":
     # Create Datasets and DataLoaders
     train_dataset = CMEDataset(train_features, train_labels)
     val_dataset = CMEDataset(val_features, val_labels)
-    train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=32)
+    # Pinned batches from worker processes let the non-blocking copies in train_model overlap
+    loader_kwargs = dict(batch_size=32, pin_memory=True, num_workers=4, persistent_workers=True)
+    train_loader = DataLoader(train_dataset, shuffle=True, **loader_kwargs)
+    val_loader = DataLoader(val_dataset, **loader_kwargs)
 
     # Initialize model and device
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
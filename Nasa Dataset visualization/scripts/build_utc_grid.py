@@ -1,21 +1,48 @@
 import dask.dataframe as dd
-from minio import Minio
+from minio_connection import get_minio, MAX_WORKERS, PART_SIZE
 import os
 from io import BytesIO
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pyarrow as pa
-import pyarrow.parquet as pq
-import pandas as pd
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
 
 RAW_BUCKET = "cme-data-raw"
 CURATED_BUCKET = "cme-data-curated"
 SOURCES = ["ace_parent_directory"]
 
-minio_client = Minio(
-    endpoint="localhost:9000",
-    access_key="minioadmin",
-    secret_key="minioadmin",
-    secure=False
+EPAM_COLUMNS = [
+    "YR", "MO", "DA", "HHMM", "Julian_Day", "Sec_Day",
+    "S_e", "Electron_38_53", "Electron_175_315",
+    "S_p", "Proton_47_65", "Proton_112_187", "Proton_310_580",
+    "Proton_761_1220", "Proton_060_1910", "Anisotropy_Ratio"
+]
+EPAM_FLOAT_COLUMNS = [
+    "Electron_38_53", "Electron_175_315", "Proton_47_65", "Proton_112_187",
+    "Proton_310_580", "Proton_761_1220", "Proton_060_1910", "Anisotropy_Ratio"
+]
+LEADING_TRAILING_WS = re.compile(rb"(?m)^[ \t]+|[ \t]+(?=\r?$)")
+WS_RUN = re.compile(rb"[ \t]+")
+
+# Year folders used in the curated bucket; anything else lands in unknown_year
+VALID_YEARS = frozenset(str(y) for y in range(2001, 2026))
+
+# Parquet output: ZSTD pages with column statistics for predicate pushdown in readers.
+# Dictionary pages only for the low-cardinality date/status columns (the float
+# measurements are mostly unique), and row groups large enough that a yearly file is
+# a single group rather than many small reads against object storage
+PARQUET_OPTIONS = dict(
+    compression="zstd",
+    compression_level=3,
+    use_dictionary=["YR", "MO", "DA", "HHMM", "S_e", "S_p"],
+    write_statistics=True,
+    data_page_size=1 << 20
 )
+ROW_GROUP_SIZE = 1_000_000
+
+minio_client = get_minio()
 
 def list_raw_files(prefix):
     return [
@@ -24,85 +51,127 @@ def list_raw_files(prefix):
         if obj.object_name.endswith(".txt")
     ]
 
-def parse_epam_file(buffer: BytesIO) -> pd.DataFrame:
+def parse_epam_file(buffer: BytesIO) -> pa.Table:
     """
     Parse ACE EPAM-like file after skipping comments and reading structured data.
     """
     buffer.seek(0)
-    lines = buffer.read().decode().splitlines()
 
-    # Find the actual data line start
-    for i, line in enumerate(lines):
-        if line.strip().startswith("2001") or line.strip()[0:4].isdigit():
-            data_start = i
+    # Find the actual data line start without decoding the whole file
+    data_start = None
+    offset = 0
+    for line in buffer:
+        if line.strip()[0:4].isdigit():
+            data_start = offset
             break
-    else:
+        offset += len(line)
+    if data_start is None:
         raise ValueError("No data found")
 
-    # Read from line i onwards using fixed space
-    data = "\n".join(lines[data_start:])
-    df = pd.read_csv(
-        BytesIO(data.encode()),
-        delim_whitespace=True,
-        header=None,
-        names=[
-            "YR", "MO", "DA", "HHMM", "Julian_Day", "Sec_Day",
-            "S_e", "Electron_38_53", "Electron_175_315",
-            "S_p", "Proton_47_65", "Proton_112_187", "Proton_310_580",
-            "Proton_761_1220", "Proton_060_1910", "Anisotropy_Ratio"
-        ],
-        engine="python",
-        on_bad_lines="skip"
+    # Columns are separated by runs of spaces; collapse them so Arrow's
+    # single-character delimiter applies
+    data = LEADING_TRAILING_WS.sub(b"", buffer.getbuffer()[data_start:])
+    data = WS_RUN.sub(b" ", data)
+
+    # Files are already converted in parallel by the worker pool, so each read stays on
+    # its own thread instead of oversubscribing the cores with Arrow's reader threads
+    return pv.read_csv(
+        pa.BufferReader(data),
+        read_options=pv.ReadOptions(column_names=EPAM_COLUMNS, block_size=8 << 20, use_threads=False),
+        parse_options=pv.ParseOptions(
+            delimiter=" ",
+            ignore_empty_lines=True,
+            invalid_row_handler=lambda row: "skip"
+        ),
+        # Measurements are stored in single precision; date and status fields keep inferred types
+        convert_options=pv.ConvertOptions(column_types={c: pa.float32() for c in EPAM_FLOAT_COLUMNS})
     )
 
-    return df
+def process_one(file_key):
+    """
+    Fetch and parse one raw file, tagging its rows with the year folder it belongs to.
+    """
+    print(f"📦 Fetching: {file_key}")
+    try:
+        response = minio_client.get_object(RAW_BUCKET, file_key)
+        try:
+            buffer = BytesIO(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+        table = parse_epam_file(buffer)
+
+        if table.num_rows == 0:
+            raise ValueError("Parsed table is empty")
+
+        # Extract year from filename (first 4 chars)
+        year = os.path.basename(file_key)[:4]
+        if year not in VALID_YEARS:
+            year = "unknown_year"
+
+        return table.append_column("year", pa.repeat(year, table.num_rows))
+
+    except Exception as e:
+        print(f"❌ Error processing {file_key}: {e}")
+        return None
+
+def upload_dataset(source, local_dir):
+    """
+    Upload every Parquet file written under local_dir to the curated bucket.
+    """
+    uploads = []
+    for root, _, names in os.walk(local_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            target_key = f"{source}/{os.path.relpath(path, local_dir).replace(os.sep, '/')}"
+            uploads.append((path, target_key))
+
+    def upload(path, target_key):
+        minio_client.fput_object(CURATED_BUCKET, target_key, path, part_size=PART_SIZE)
+        print(f"✅ Uploaded: {target_key}")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(upload, path, target_key) for path, target_key in uploads]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Upload failed: {e}")
 
 def transform_and_store_parquet():
     if not minio_client.bucket_exists(CURATED_BUCKET):
         minio_client.make_bucket(CURATED_BUCKET)
 
+    file_format = ds.ParquetFileFormat()
+    write_options = file_format.make_write_options(**PARQUET_OPTIONS)
+
     for source in SOURCES:
         print(f"\n🚀 Processing source: {source}")
         files = list_raw_files(source)
 
-        for file_key in files:
-            print(f"📦 Fetching: {file_key}")
-            try:
-                response = minio_client.get_object(RAW_BUCKET, file_key)
-                buffer = BytesIO(response.read())
-                df = parse_epam_file(buffer)
-
-                if df.empty:
-                    raise ValueError("Parsed DataFrame is empty")
-
-                # Convert to pyarrow Table
-                table = pa.Table.from_pandas(df)
-
-                # Write to Parquet in memory
-                parquet_buf = BytesIO()
-                pq.write_table(table, parquet_buf)
-                parquet_buf.seek(0)
-
-                filename = os.path.basename(file_key).replace(".txt", ".parquet")
-
-                # Extract year from filename (first 4 chars)
-                year = filename[:4]
-                if year not in [str(y) for y in range(2001, 2026)]:
-                    year = "unknown_year"
-
-                target_key = f"{source}/{year}/{filename}"
-
-                minio_client.put_object(
-                    bucket_name=CURATED_BUCKET,
-                    object_name=target_key,
-                    data=parquet_buf,
-                    length=len(parquet_buf.getvalue())
-                )
-
-                print(f"✅ Uploaded: {target_key}")
-
-            except Exception as e:
-                print(f"❌ Error processing {file_key}: {e}")
+        # Overlap GET and parse across files; the shared client is thread-safe
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            tables = [table for table in executor.map(process_one, files) if table is not None]
+        if not tables:
+            print(f"⚠️ No parsable files for source: {source}")
+            continue
+
+        # One partitioned write per source: each year becomes a single {year}/ folder of
+        # large row groups instead of one small object per raw file
+        table = pa.concat_tables(tables, promote_options="permissive")
+        with tempfile.TemporaryDirectory() as local_dir:
+            ds.write_dataset(
+                table,
+                local_dir,
+                format=file_format,
+                file_options=write_options,
+                partitioning=["year"],
+                basename_template="part-{i}.parquet",
+                max_rows_per_group=ROW_GROUP_SIZE,
+                min_rows_per_group=ROW_GROUP_SIZE,
+                existing_data_behavior="overwrite_or_ignore"
+            )
+            upload_dataset(source, local_dir)
 
 if __name__ == "__main__":
     transform_and_store_parquet()
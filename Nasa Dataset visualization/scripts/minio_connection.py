@@ -0,0 +1,52 @@
+import os
+from functools import lru_cache
+import urllib3
+from minio import Minio
+
+MINIO_ENDPOINT = "localhost:9000"
+MINIO_ACCESS_KEY = "minioadmin"
+MINIO_SECRET_KEY = "minioadmin"
+
+# Connections kept open per host; enough for every upload/convert worker to hold one
+POOL_MAXSIZE = 64
+
+# Concurrent uploads; well within the shared connection pool and far below the
+# point where MinIO starts answering SlowDown
+MAX_WORKERS = 16
+# Multipart chunk size for fput_object uploads
+PART_SIZE = 64 << 20
+
+@lru_cache(maxsize=None)
+def get_minio():
+    """
+    Return the process-wide Minio client, built once on a pooled urllib3 manager that
+    keeps connections alive across files and retries transient 5xx / SlowDown replies.
+    """
+    http_client = urllib3.PoolManager(
+        num_pools=4,
+        maxsize=POOL_MAXSIZE,
+        block=True,
+        timeout=urllib3.Timeout(connect=10, read=300),
+        retries=urllib3.Retry(total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
+    )
+    return Minio(
+        endpoint=MINIO_ENDPOINT,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=False,
+        http_client=http_client
+    )
+
+def iter_files(root):
+    """
+    Yield every file path under root, recursing with os.scandir. Like os.walk, a
+    missing root yields nothing.
+    """
+    if not os.path.isdir(root):
+        return
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(entry.path)
+            elif entry.is_file():
+                yield entry.path
@@ -1,8 +1,9 @@
 # ~/Projects/space-weather-pipeline/scripts/upload_ace_only.py
 
 import os
-from minio import Minio
+from minio_connection import get_minio, iter_files, MAX_WORKERS, PART_SIZE
 from minio.error import S3Error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Local ACE folder
 LOCAL_ACE_FOLDER = os.path.expanduser("~/Desktop/ace_parent_directory")
@@ -10,32 +11,25 @@ LOCAL_ACE_FOLDER = os.path.expanduser("~/Desktop/ace_parent_directory")
 
 # MinIO settings
 MINIO_BUCKET = "cme-data-raw"
-MINIO_CLIENT = Minio(
-    endpoint="localhost:9000",
-    access_key="minioadmin",
-    secret_key="minioadmin",
-    secure=False
-)
+MINIO_CLIENT = get_minio()
 
 def upload_ace():
     if not MINIO_CLIENT.bucket_exists(MINIO_BUCKET):
         MINIO_CLIENT.make_bucket(MINIO_BUCKET)
         print(f"📦 Created bucket: {MINIO_BUCKET}")
 
-    for root, _, files in os.walk(LOCAL_ACE_FOLDER):
-        for file in files:
-            local_path = os.path.join(root, file)
+    # fput_object streams each file (multipart above PART_SIZE); files upload in parallel
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for local_path in iter_files(LOCAL_ACE_FOLDER):
             relative_path = os.path.relpath(local_path, LOCAL_ACE_FOLDER)
             object_name = f"ace_parent_directory/{relative_path}"
+            futures[executor.submit(MINIO_CLIENT.fput_object, MINIO_BUCKET, object_name,
+                                    local_path, part_size=PART_SIZE)] = object_name
 
-            with open(local_path, "rb") as f:
-                MINIO_CLIENT.put_object(
-                    bucket_name=MINIO_BUCKET,
-                    object_name=object_name,
-                    data=f,
-                    length=os.path.getsize(local_path)
-                )
-            print(f"✅ Uploaded: {object_name}")
+        for future in as_completed(futures):
+            future.result()
+            print(f"✅ Uploaded: {futures[future]}")
 
 if __name__ == "__main__":
     upload_ace()
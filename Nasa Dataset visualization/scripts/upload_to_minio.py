@@ -1,37 +1,33 @@
 import os
-from minio import Minio
+from minio_connection import get_minio, iter_files, MAX_WORKERS, PART_SIZE
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 LOCAL_ROOT = os.path.expanduser("~/Projects/space-weather-pipeline/data")
 SOURCES = ["ace_parent_directory", "cactus_db", "kp_data", "aditya_l1"]
 RAW_BUCKET = "cme-data-raw"
 
-minio_client = Minio(
-    endpoint="localhost:9000",
-    access_key="minioadmin",
-    secret_key="minioadmin",
-    secure=False
-)
+minio_client = get_minio()
 
 def upload_raw():
     if not minio_client.bucket_exists(RAW_BUCKET):
         minio_client.make_bucket(RAW_BUCKET)
 
-    for source in SOURCES:
-        src_path = os.path.join(LOCAL_ROOT, source)
-        for root, _, files in os.walk(src_path):
-            for fname in files:
-                fpath = os.path.join(root, fname)
+    # fput_object streams each file (multipart above PART_SIZE); files upload in parallel
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for source in SOURCES:
+            src_path = os.path.join(LOCAL_ROOT, source)
+            if not os.path.isdir(src_path):
+                continue
+            for fpath in iter_files(src_path):
                 relpath = os.path.relpath(fpath, src_path)
                 object_name = f"{source}/{relpath}"
+                futures[executor.submit(minio_client.fput_object, RAW_BUCKET, object_name,
+                                        fpath, part_size=PART_SIZE)] = object_name
 
-                with open(fpath, "rb") as f:
-                    minio_client.put_object(
-                        bucket_name=RAW_BUCKET,
-                        object_name=object_name,
-                        data=f,
-                        length=os.path.getsize(fpath)
-                    )
-                print(f"✅ Uploaded {object_name} to {RAW_BUCKET}")
+        for future in as_completed(futures):
+            future.result()
+            print(f"✅ Uploaded {futures[future]} to {RAW_BUCKET}")
 
 if __name__ == "__main__":
     upload_raw()
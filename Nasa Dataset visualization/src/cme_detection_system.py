@@ -12,14 +12,18 @@ It processes time-series data from Solar Wind Ion Spectrometer (SWIS) instrument
 Handles differing HHMM formats and large datasets with robust data cleaning.
 """
 
+import io
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # figures are only written to files; no GUI backend
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection, PolyCollection
 import seaborn as sns
-from datetime import datetime, timedelta
+from datetime import datetime
 from scipy import signal
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+from numba import njit
 import logging
 import warnings
 warnings.filterwarnings('ignore')
@@ -35,6 +39,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def rolling_time_mean(index, values, window='60min', min_periods=10):
+    """
+    Centered time-based rolling mean of several columns in one pass
+
+    Matches ``rolling(window, center=True, min_periods=min_periods).mean()``: the window
+    around t covers (t - window/2, t + window/2] and needs min_periods non-NaN values.
+    
+    Args:
+        index (pd.DatetimeIndex): Sorted timestamps
+        values (np.ndarray): Array of shape (N, K), one column per series
+        window (str): Window length as a pandas offset string
+        min_periods (int): Minimum non-NaN observations for a valid mean
+        
+    Returns:
+        np.ndarray: Rolling means of shape (N, K)
+    """
+    ts = index.values.astype('datetime64[ns]').view('i8')
+    half = pd.Timedelta(window).value // 2
+    start = np.searchsorted(ts, ts - half, side='right')
+    end = np.searchsorted(ts, ts + half, side='right')
+    
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(np.where(valid, values, 0.0), axis=0, out=sums[1:])
+    counts = np.zeros((len(values) + 1, values.shape[1]), dtype=np.int64)
+    np.cumsum(valid, axis=0, out=counts[1:])
+    
+    count = counts[end] - counts[start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (sums[end] - sums[start]) / count
+    mean[count < min_periods] = np.nan
+    return mean
+
+def plot_envelope(ax, x, values, n_bins, **kwargs):
+    """
+    Plot a series as its per-bin min/max envelope so the artist size is bounded by the
+    plot width rather than the number of samples
+    
+    Args:
+        ax (matplotlib.axes.Axes): Target axes
+        x (np.ndarray): Numeric x values (date numbers)
+        values (np.ndarray): Series values aligned with x
+        n_bins (int): Number of bins, roughly the width of the axes in pixels
+        **kwargs: Styling passed to fill_between (or plot for short series)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= 2 * n_bins:
+        return ax.plot(x, values, **kwargs)
+    
+    stride = -(-len(values) // n_bins)
+    n_full = -(-len(values) // stride)
+    padded = np.full(n_full * stride, np.nan)
+    padded[:len(values)] = values
+    binned = padded.reshape(n_full, stride)
+    return ax.fill_between(x[::stride], np.nanmin(binned, axis=1), np.nanmax(binned, axis=1), **kwargs)
+
+def add_detection_lines(ax, detection_times, label='CME Detection'):
+    """
+    Draw every detection time as a dashed vertical line using a single collection artist
+    
+    Args:
+        ax (matplotlib.axes.Axes): Axes with a datetime x axis
+        detection_times (pd.Series): Detection timestamps
+        label (str): Legend label shared by all lines
+    """
+    if len(detection_times) == 0:
+        return
+    x = mdates.date2num(detection_times.to_numpy())
+    # x in data coordinates, y spanning the full axes height like axvline
+    segments = np.stack([np.column_stack([x, np.zeros_like(x)]), np.column_stack([x, np.ones_like(x)])], axis=1)
+    ax.add_collection(LineCollection(segments, colors='red', alpha=0.5, linestyles='--',
+                                     label=label, transform=ax.get_xaxis_transform()))
+
+@njit(cache=True)
+def _merge_windows(ts_ns, window_ns):
+    """
+    Greedy time windows over sorted timestamps: each window opens at the first
+    detection not yet covered and takes every detection up to window_ns later.
+    
+    Returns:
+        (start_idx, end_idx) arrays; window k covers ts_ns[start_idx[k]:end_idx[k]]
+    """
+    n = ts_ns.shape[0]
+    starts = np.empty(n, dtype=np.int64)
+    ends = np.empty(n, dtype=np.int64)
+    count = 0
+    i = 0
+    while i < n:
+        j = i + 1
+        limit = ts_ns[i] + window_ns
+        while j < n and ts_ns[j] <= limit:
+            j += 1
+        starts[count] = i
+        ends[count] = j
+        count += 1
+        i = j
+    return starts[:count], ends[:count]
+
 class CMEDetectionSystem:
     """
     Advanced CME Detection System for analyzing solar wind data
@@ -51,6 +154,7 @@ class CMEDetectionSystem:
         self.data = {}
         self.processed_data = {}
         self.detection_results = {}
+        self.merged_events = None
         self.thresholds = {}
         
         # Adjusted CME detection parameters for higher sensitivity
@@ -95,31 +199,37 @@ class CMEDetectionSystem:
                     df.columns = df.iloc[0]
                     df = df[1:]
 
-                # Normalize HHMM or derive from HH and MM
+                # Split HHMM arithmetically or take HH and MM as given
                 if 'HHMM' in df.columns:
-                    df['HHMM'] = df['HHMM'].astype(str).str.zfill(4)
-                    df['HH'] = df['HHMM'].str[:2]
-                    df['MM'] = df['HHMM'].str[2:]
+                    hhmm = pd.to_numeric(df['HHMM'], errors='coerce')
+                    hours, minutes = hhmm // 100, hhmm % 100
                 elif 'HH' in df.columns and 'MM' in df.columns:
                     logger.info(f"{instrument}: Using separate HH and MM columns")
-                    df['HH'] = df['HH'].astype(str).str.zfill(2)
-                    df['MM'] = df['MM'].astype(str).str.zfill(2)
+                    hours = pd.to_numeric(df['HH'], errors='coerce')
+                    minutes = pd.to_numeric(df['MM'], errors='coerce')
                 else:
                     logger.error(f"{instrument}: No HHMM or HH/MM columns found")
                     raise ValueError(f"{instrument}: Cannot construct datetime without HHMM or HH/MM columns")
 
-                # Log sample of problematic HHMM entries
-                invalid_hhmm = df['HHMM'].str.contains(r'[^0-9]', na=True) | (df['HHMM'].str.len() != 4)
-                if invalid_hhmm.any():
-                    sample_invalid = df[invalid_hhmm]['HHMM'].head(5).tolist()
+                # Log sample of problematic time entries; they become NaT below
+                invalid_time = (hours.isna() | minutes.isna() | (hours % 1 != 0) | (minutes % 1 != 0) |
+                                ~hours.between(0, 23) | ~minutes.between(0, 59))
+                if invalid_time.any():
+                    time_col = 'HHMM' if 'HHMM' in df.columns else ['HH', 'MM']
+                    sample_invalid = df.loc[invalid_time, time_col].head(5).values.tolist()
                     logger.warning(f"{instrument}: Sample invalid HHMM entries: {sample_invalid}")
+                df['HH'] = hours.mask(invalid_time)
+                df['MM'] = minutes.mask(invalid_time)
 
-                # Create datetime column
+                # Create datetime column from the numeric parts in one vectorized call
                 df['datetime'] = pd.to_datetime(
-                    df['YR'].astype(str) + '-' + 
-                    df['MO'].astype(str).str.zfill(2) + '-' + 
-                    df['DA'].astype(str).str.zfill(2) + ' ' + 
-                    df['HH'] + ':' + df['MM'],
+                    {
+                        'year': pd.to_numeric(df['YR'], errors='coerce'),
+                        'month': pd.to_numeric(df['MO'], errors='coerce'),
+                        'day': pd.to_numeric(df['DA'], errors='coerce'),
+                        'hour': df['HH'],
+                        'minute': df['MM']
+                    },
                     errors='coerce'
                 )
                 
@@ -142,6 +252,9 @@ class CMEDetectionSystem:
                     invalid_count = df[col].isna().sum()
                     if invalid_count > 0:
                         logger.warning(f"{instrument}: {col} has {invalid_count} non-numeric values converted to NaN")
+                # Single precision is ample for these measurements and halves the memory traffic
+                # of the resampling, filling and rolling passes that follow
+                df[numeric_cols] = df[numeric_cols].astype(np.float32)
 
                 # Downsample large datasets to reduce memory usage (e.g., to 5-minute resolution for swepam)
                 df = df.set_index('datetime')
@@ -167,15 +280,13 @@ class CMEDetectionSystem:
         
         for instrument, df in self.data.items():
             try:
-                processed_df = df.copy()
-
                 # Ensure datetime is valid
-                if 'datetime' not in processed_df.columns or not pd.api.types.is_datetime64_any_dtype(processed_df['datetime']):
+                if 'datetime' not in df.columns or not pd.api.types.is_datetime64_any_dtype(df['datetime']):
                     logger.error(f"Invalid datetime column for {instrument}")
                     continue
                 
-                # Set DatetimeIndex
-                processed_df = processed_df.set_index('datetime')
+                # Set DatetimeIndex (returns a new frame, so self.data is left untouched)
+                processed_df = df.set_index('datetime')
                 processed_df = processed_df.sort_index()
 
                 # Identify numeric columns
@@ -195,19 +306,24 @@ class CMEDetectionSystem:
                 processed_df[numeric_cols] = processed_df[numeric_cols].ffill().bfill()
                 processed_df[numeric_cols] = processed_df[numeric_cols].interpolate(method='time', limit_direction='both')
 
-                # Remove extreme outliers
-                for col in numeric_cols:
-                    if processed_df[col].notna().sum() > 100:
-                        Q1 = processed_df[col].quantile(0.25)
-                        Q3 = processed_df[col].quantile(0.75)
-                        IQR = Q3 - Q1
-                        lower_bound = Q1 - 3 * IQR
-                        upper_bound = Q3 + 3 * IQR
-                        outlier_mask = (processed_df[col] < lower_bound) | (processed_df[col] > upper_bound)
-                        processed_df.loc[outlier_mask, col] = np.nan
-                        processed_df[col] = processed_df[col].interpolate(method='time', limit_direction='both')
+                # Remove extreme outliers: 3 x IQR bounds for every well-populated column at once,
+                # then a single time interpolation over the masked block
+                valid_counts = processed_df[numeric_cols].notna().sum()
+                outlier_cols = valid_counts.index[valid_counts > 100]
+                # Constant columns (flags, status words) have IQR 0 and nothing outside it; skip them
+                if len(outlier_cols) > 0:
+                    values = processed_df[outlier_cols].to_numpy()
+                    outlier_cols = outlier_cols[np.nanmax(values, axis=0) > np.nanmin(values, axis=0)]
+                if len(outlier_cols) > 0:
+                    values = processed_df[outlier_cols].to_numpy(copy=True)
+                    Q1, Q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+                    IQR = Q3 - Q1
+                    values[(values < Q1 - 3 * IQR) | (values > Q3 + 3 * IQR)] = np.nan
+                    processed_df[outlier_cols] = pd.DataFrame(
+                        values, index=processed_df.index, columns=outlier_cols
+                    ).interpolate(method='time', limit_direction='both')
 
-                processed_df = processed_df.reset_index()
+                # Keep the DatetimeIndex through feature derivation and detection
                 self.processed_data[instrument] = processed_df
                 logger.info(f"Preprocessed {instrument} data successfully")
 
@@ -224,31 +340,39 @@ class CMEDetectionSystem:
                     logger.warning(f"Skipping feature derivation for {instrument}: empty dataset")
                     continue
                 
-                df = df.set_index('datetime')
                 if instrument == 'swepam':
-                    df['speed_ma_1h'] = df['Bulk_Speed'].rolling(window='60min', center=True, min_periods=10).mean()
+                    # All four 1-hour backgrounds in one windowed pass
+                    dynamic_pressure = df['Proton_Density'] * df['Bulk_Speed']**2
+                    ma = rolling_time_mean(df.index, np.column_stack([
+                        df['Bulk_Speed'], df['Proton_Density'], df['Ion_Temperature'], dynamic_pressure
+                    ]))
+                    
+                    df['speed_ma_1h'] = ma[:, 0]
                     df['speed_gradient'] = df['Bulk_Speed'].diff()
                     df['speed_enhancement'] = df['Bulk_Speed'] - df['speed_ma_1h']
                     
-                    df['density_ma_1h'] = df['Proton_Density'].rolling(window='60min', center=True, min_periods=10).mean()
+                    df['density_ma_1h'] = ma[:, 1]
                     df['density_enhancement'] = df['Proton_Density'] / df['density_ma_1h']
                     
-                    df['temp_ma_1h'] = df['Ion_Temperature'].rolling(window='60min', center=True, min_periods=10).mean()
+                    df['temp_ma_1h'] = ma[:, 2]
                     df['temp_depression'] = df['temp_ma_1h'] / df['Ion_Temperature']
                     
-                    df['dynamic_pressure'] = df['Proton_Density'] * df['Bulk_Speed']**2
-                    df['pressure_ma_1h'] = df['dynamic_pressure'].rolling(window='60min', center=True, min_periods=10).mean()
+                    df['dynamic_pressure'] = dynamic_pressure
+                    df['pressure_ma_1h'] = ma[:, 3]
                     df['pressure_enhancement'] = df['dynamic_pressure'] / df['pressure_ma_1h']
                     
                 elif instrument == 'mag':
-                    df['Bt_ma_1h'] = df['Bt'].rolling(window='60min', center=True, min_periods=10).mean()
+                    field_rotation = np.sqrt(df['Bx'].diff()**2 + df['By'].diff()**2 + df['Bz'].diff()**2)
+                    ma = rolling_time_mean(df.index, np.column_stack([df['Bt'], field_rotation]))
+                    
+                    df['Bt_ma_1h'] = ma[:, 0]
                     df['field_enhancement'] = df['Bt'] / df['Bt_ma_1h']
                     
-                    df['field_rotation'] = np.sqrt(df['Bx'].diff()**2 + df['By'].diff()**2 + df['Bz'].diff()**2)
-                    df['rotation_ma_1h'] = df['field_rotation'].rolling(window='60min', center=True, min_periods=10).mean()
+                    df['field_rotation'] = field_rotation
+                    df['rotation_ma_1h'] = ma[:, 1]
                     
                     if 'swepam' in self.processed_data:
-                        swepam_aligned = self.processed_data['swepam'].set_index('datetime')
+                        swepam_aligned = self.processed_data['swepam']
                         mag_aligned = df
                         common_times = swepam_aligned.index.intersection(mag_aligned.index)
                         if len(common_times) > 100:
@@ -263,11 +387,14 @@ class CMEDetectionSystem:
                     if not flux_cols:
                         flux_cols = [col for col in df.columns if any(keyword in col for keyword in ['Electron', 'Anisotropy', 'MeV']) and col not in ['YR', 'MO', 'DA', 'HH', 'MM', 'year', 'file']]
                     
-                    for col in flux_cols[:5]:
-                        if col in df.columns and df[col].dtype in ['float64', 'int64', 'float32', 'int32']:
-                            df[f'{col}_ma_1h'] = df[col].rolling(window='60min', center=True, min_periods=10).mean()
-                            df[f'{col}_enhancement'] = df[col] / df[f'{col}_ma_1h']
-                            df[f'{col}_gradient'] = df[col].diff()
+                    flux_cols = [col for col in flux_cols[:5]
+                                 if col in df.columns and df[col].dtype in ['float64', 'int64', 'float32', 'int32']]
+                    if flux_cols:
+                        ma = rolling_time_mean(df.index, df[flux_cols].to_numpy(dtype=np.float64))
+                    for j, col in enumerate(flux_cols):
+                        df[f'{col}_ma_1h'] = ma[:, j]
+                        df[f'{col}_enhancement'] = df[col] / df[f'{col}_ma_1h']
+                        df[f'{col}_gradient'] = df[col].diff()
                 
                 numeric_cols = df.select_dtypes(include=[np.number]).columns
                 exclude_cols = ['YR', 'MO', 'DA', 'HHMM', 'HH', 'MM', 'Julian_Day', 'Seconds_of_Day', 'year', 'file']
@@ -277,7 +404,7 @@ class CMEDetectionSystem:
                     if col in df.columns:
                         df[f'{col}_variance'] = df[col].rolling(window='60min', min_periods=10).var()
                 
-                self.processed_data[instrument] = df.reset_index()
+                self.processed_data[instrument] = df
                 logger.info(f"Derived features for {instrument}")
                 
             except Exception as e:
@@ -313,11 +440,9 @@ class CMEDetectionSystem:
         if not enhancement_cols:
             return pd.Series(False, index=df.index)
         
-        detections = pd.DataFrame(False, index=df.index, columns=enhancement_cols)
-        for col in enhancement_cols:
-            detections[col] = df[col] > threshold_factor
-        
-        return detections.any(axis=1)
+        # One comparison and or-reduction over the stacked columns (NaN compares False)
+        values = df[enhancement_cols].to_numpy()
+        return pd.Series((values > threshold_factor).any(axis=1), index=df.index)
     
     def detect_magnetic_field_rotations(self, df, threshold_degrees=20):
         """Detect magnetic field rotations"""
@@ -332,6 +457,7 @@ class CMEDetectionSystem:
         logger.info("Performing composite CME detection...")
         
         all_detections = []
+        self.merged_events = None
         
         for instrument, df in self.processed_data.items():
             try:
@@ -339,36 +465,36 @@ class CMEDetectionSystem:
                     logger.warning(f"Skipping CME detection for {instrument}: empty dataset")
                     continue
                 
-                detections = pd.DataFrame({
-                    'datetime': df['datetime'],
-                    'instrument': instrument
-                })
-                
-                df = df.set_index('datetime')
                 if instrument == 'swepam':
-                    detections['speed_enhancement'] = self.detect_speed_enhancements(df)
-                    detections['density_enhancement'] = self.detect_density_enhancements(df)
-                    detections['temp_depression'] = self.detect_temperature_depressions(df)
-                    detections['swepam_score'] = (
-                        detections['speed_enhancement'].astype(int) +
-                        detections['density_enhancement'].astype(int) +
-                        detections['temp_depression'].astype(int)
-                    )
-                    detections['cme_detected'] = detections['swepam_score'] >= 2
-                
+                    signatures = {
+                        'speed_enhancement': self.detect_speed_enhancements,
+                        'density_enhancement': self.detect_density_enhancements,
+                        'temp_depression': self.detect_temperature_depressions
+                    }
                 elif instrument == 'mag':
-                    detections['field_rotation'] = self.detect_magnetic_field_rotations(df)
-                    detections['cme_detected'] = detections['field_rotation']
-                
+                    signatures = {'field_rotation': self.detect_magnetic_field_rotations}
                 elif instrument in ['epam', 'sis']:
-                    detections['particle_enhancement'] = self.detect_particle_flux_enhancements(df)
-                    detections['cme_detected'] = detections['particle_enhancement']
+                    signatures = {'particle_enhancement': self.detect_particle_flux_enhancements}
+                else:
+                    signatures = {}
+                
+                # One (rows x signatures) flag matrix per instrument; detector outputs are
+                # datetime-indexed, so take their values positionally to line up with df
+                flags = np.zeros((len(df), len(signatures)), dtype=bool)
+                for j, detector in enumerate(signatures.values()):
+                    flags[:, j] = detector(df).to_numpy(dtype=bool)
+                # bool is one byte, so an int8 view sums the flags without a casting copy
+                score = flags.view(np.int8).sum(axis=1, dtype=np.int8)
                 
-                signature_cols = [col for col in detections.columns if col in [
-                    'speed_enhancement', 'density_enhancement', 'temp_depression', 
-                    'field_rotation', 'particle_enhancement'
-                ]]
-                detections['confidence'] = detections[signature_cols].sum(axis=1) / max(1, len(signature_cols))
+                columns = {'datetime': df.index, 'instrument': instrument}
+                columns.update(zip(signatures, flags.T))
+                if instrument == 'swepam':
+                    columns['swepam_score'] = score
+                    columns['cme_detected'] = score >= 2
+                elif signatures:
+                    columns['cme_detected'] = score >= 1
+                columns['confidence'] = score / max(1, len(signatures))
+                detections = pd.DataFrame(columns)
                 
                 all_detections.append(detections)
                 self.detection_results[instrument] = detections
@@ -387,48 +513,48 @@ class CMEDetectionSystem:
             logger.warning("No detection results to merge")
             return None
         
-        all_events = []
+        times, confidences, sources = [], [], []
         for instrument, detections in self.detection_results.items():
-            events = detections[detections['cme_detected'] == True].copy()
-            if len(events) > 0:
-                events['source_instrument'] = instrument
-                all_events.append(events[['datetime', 'confidence', 'source_instrument']])
+            detected = (detections['cme_detected'] == True).to_numpy()
+            if detected.any():
+                times.append(detections['datetime'].to_numpy(dtype='datetime64[ns]')[detected])
+                confidences.append(detections['confidence'].to_numpy(dtype=np.float64)[detected])
+                sources.append(np.full(detected.sum(), instrument, dtype=object))
         
-        if not all_events:
+        if not times:
             logger.info("No CME events detected by any instrument")
             return pd.DataFrame()
         
-        combined_events = pd.concat(all_events, ignore_index=True)
-        combined_events = combined_events.sort_values('datetime').reset_index(drop=True)
-        
-        merged_events = []
-        time_window = timedelta(hours=time_window_hours)
-        
-        i = 0
-        while i < len(combined_events):
-            event_start = combined_events.loc[i, 'datetime']
-            event_end = event_start + time_window
-            
-            window_events = combined_events[
-                (combined_events['datetime'] >= event_start) &
-                (combined_events['datetime'] <= event_end)
-            ]
-            
-            merged_event = {
-                'start_time': window_events['datetime'].min(),
-                'end_time': window_events['datetime'].max(),
-                'duration_hours': (window_events['datetime'].max() - window_events['datetime'].min()).total_seconds() / 3600,
-                'instruments': ', '.join(np.unique(window_events['source_instrument'])),
-                'num_instruments': len(np.unique(window_events['source_instrument'])),
-                'avg_confidence': window_events['confidence'].mean(),
-                'max_confidence': window_events['confidence'].max()
-            }
-            
-            merged_events.append(merged_event)
-            i = len(combined_events[combined_events['datetime'] <= event_end])
+        # Sort all detections by time once, then split them into consecutive windows
+        times = np.concatenate(times)
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        confidences = np.concatenate(confidences)[order]
+        instrument_names, instrument_ids = np.unique(np.concatenate(sources)[order], return_inverse=True)
+        
+        window_ns = pd.Timedelta(hours=time_window_hours).value
+        starts, ends = _merge_windows(times.view('i8'), window_ns)
+        
+        counts = ends - starts
+        window_ids = np.repeat(np.arange(len(starts)), counts)
+        present = np.zeros((len(starts), len(instrument_names)), dtype=bool)
+        present[window_ids, instrument_ids] = True
+        
+        start_times = times[starts]
+        end_times = times[ends - 1]
+        merged_events = {
+            'start_time': start_times,
+            'end_time': end_times,
+            'duration_hours': (end_times - start_times) / np.timedelta64(1, 'h'),
+            'instruments': [', '.join(instrument_names[row]) for row in present],
+            'num_instruments': present.sum(axis=1),
+            'avg_confidence': np.add.reduceat(confidences, starts) / counts,
+            'max_confidence': np.maximum.reduceat(confidences, starts)
+        }
         
         merged_df = pd.DataFrame(merged_events)
-        logger.info(f"Merged {len(combined_events)} individual detections into {len(merged_df)} CME events")
+        logger.info(f"Merged {len(times)} individual detections into {len(merged_df)} CME events")
+        self.merged_events = merged_df
         return merged_df
     
     def validate_cme_events(self, merged_events, min_duration_hours=2, min_instruments=1, min_confidence=0.2):
@@ -445,20 +571,24 @@ class CMEDetectionSystem:
             (merged_events['avg_confidence'] >= min_confidence)
         ].copy()
         
-        def classify_event(row):
-            if row['num_instruments'] >= 3 and row['avg_confidence'] > 0.6:
-                return 'High Confidence'
-            elif row['num_instruments'] >= 2 and row['avg_confidence'] > 0.4:
-                return 'Medium Confidence'
-            else:
-                return 'Low Confidence'
-        
-        valid_events['classification'] = valid_events.apply(classify_event, axis=1)
+        num_instruments = valid_events['num_instruments'].to_numpy()
+        avg_confidence = valid_events['avg_confidence'].to_numpy()
+        valid_events['classification'] = np.select(
+            [(num_instruments >= 3) & (avg_confidence > 0.6),
+             (num_instruments >= 2) & (avg_confidence > 0.4)],
+            ['High Confidence', 'Medium Confidence'],
+            default='Low Confidence'
+        )
         logger.info(f"Validated {len(valid_events)} CME events out of {len(merged_events)} candidates")
         return valid_events
     
-    def plot_detection_overview(self, start_date=None, end_date=None, figsize=(15, 15)):
-        """Plot overview of CME detections with enhanced visualization"""
+    def plot_detection_overview(self, start_date=None, end_date=None, figsize=(15, 15), merged_events=None):
+        """Plot overview of CME detections with enhanced visualization
+        
+        Args:
+            merged_events (pd.DataFrame): Output of merge_detections; defaults to the last
+                merged result, merging only if none has been computed yet
+        """
         logger.info("Creating detection overview plot...")
         
         fig, axes = plt.subplots(len(self.processed_data) + 1, 1, figsize=figsize, sharex=True)
@@ -469,6 +599,9 @@ class CMEDetectionSystem:
         if len(self.processed_data) == 1:
             axes = [axes]
         
+        # About one envelope bin per horizontal pixel
+        n_bins = int(fig.get_size_inches()[0] * fig.dpi)
+        
         for i, (instrument, df) in enumerate(self.processed_data.items()):
             if len(df) == 0:
                 logger.warning(f"Skipping plot for {instrument}: empty dataset")
@@ -477,33 +610,33 @@ class CMEDetectionSystem:
             ax = axes[i]
             
             if start_date and end_date:
-                mask = (df['datetime'] >= pd.to_datetime(start_date)) & (df['datetime'] <= pd.to_datetime(end_date))
+                mask = (df.index >= pd.to_datetime(start_date)) & (df.index <= pd.to_datetime(end_date))
                 df_plot = df[mask]
             else:
                 df_plot = df.head(10000)
             
+            # Convert the timestamps once and plot every series against the same numeric x
+            x = mdates.date2num(df_plot.index.to_numpy())
+            ax.xaxis_date()
+            
             if instrument == 'swepam':
                 ax2 = ax.twinx()
-                l1 = ax.plot(df_plot['datetime'], df_plot['Bulk_Speed'], 'b-', alpha=0.7, label='Solar Wind Speed')
-                l2 = ax2.plot(df_plot['datetime'], df_plot['Proton_Density'], 'r-', alpha=0.7, label='Proton Density')
+                l1 = plot_envelope(ax, x, df_plot['Bulk_Speed'].to_numpy(), n_bins, color='b', alpha=0.7, label='Solar Wind Speed')
+                l2 = plot_envelope(ax2, x, df_plot['Proton_Density'].to_numpy(), n_bins, color='r', alpha=0.7, label='Proton Density')
                 ax.set_ylabel('Speed (km/s)', color='b')
                 ax2.set_ylabel('Density (cm⁻³)', color='r')
                 
                 if instrument in self.detection_results:
                     detections = self.detection_results[instrument]
-                    detection_times = detections[detections['cme_detected'] == True]['datetime']
-                    for det_time in detection_times:
-                        ax.axvline(x=det_time, color='red', alpha=0.5, linestyle='--', label='CME Detection' if det_time == detection_times.iloc[0] else '')
+                    add_detection_lines(ax, detections[detections['cme_detected'] == True]['datetime'])
             
             elif instrument == 'mag':
-                ax.plot(df_plot['datetime'], df_plot['Bt'], 'g-', alpha=0.7, label='|B| Total')
+                plot_envelope(ax, x, df_plot['Bt'].to_numpy(), n_bins, color='g', alpha=0.7, label='|B| Total')
                 ax.set_ylabel('Magnetic Field (nT)', color='g')
                 
                 if instrument in self.detection_results:
                     detections = self.detection_results[instrument]
-                    detection_times = detections[detections['cme_detected'] == True]['datetime']
-                    for det_time in detection_times:
-                        ax.axvline(x=det_time, color='red', alpha=0.5, linestyle='--', label='CME Detection' if det_time == detection_times.iloc[0] else '')
+                    add_detection_lines(ax, detections[detections['cme_detected'] == True]['datetime'])
             
             elif instrument in ['epam', 'sis']:
                 flux_cols = [col for col in df_plot.columns if 'Proton' in col and col not in ['YR', 'MO', 'DA', 'HH', 'MM']][:3]
@@ -511,17 +644,15 @@ class CMEDetectionSystem:
                 
                 for j, col in enumerate(flux_cols):
                     if col in df_plot.columns:
-                        ax.plot(df_plot['datetime'], df_plot[col], color=colors[j % len(colors)], 
-                               alpha=0.7, label=col, linewidth=0.8)
+                        plot_envelope(ax, x, df_plot[col].to_numpy(), n_bins, color=colors[j % len(colors)], 
+                                      alpha=0.7, label=col, linewidth=0.8)
                 
                 ax.set_ylabel('Particle Flux')
                 ax.set_yscale('log')
                 
                 if instrument in self.detection_results:
                     detections = self.detection_results[instrument]
-                    detection_times = detections[detections['cme_detected'] == True]['datetime']
-                    for det_time in detection_times:
-                        ax.axvline(x=det_time, color='red', alpha=0.5, linestyle='--', label='CME Detection' if det_time == detection_times.iloc[0] else '')
+                    add_detection_lines(ax, detections[detections['cme_detected'] == True]['datetime'])
             
             ax.set_title(f'{instrument.upper()} - CME Detection Overview', fontsize=10)
             ax.grid(True, alpha=0.3)
@@ -530,14 +661,29 @@ class CMEDetectionSystem:
                 ax2.legend(loc='upper right')
         
         ax = axes[-1]
-        merged_events = self.merge_detections()
-        if not merged_events.empty:
-            for idx, event in merged_events.iterrows():
-                ax.axvspan(event['start_time'], event['end_time'], color='orange', alpha=0.3, 
-                          label=f"CME Event ({event['classification']})" if idx == 0 else '')
-                ax.text(event['start_time'], 0.5, f"Event {idx+1}\n{event['classification']}", 
+        if merged_events is None:
+            merged_events = self.merged_events if self.merged_events is not None else self.merge_detections()
+        if merged_events is not None and not merged_events.empty:
+            # Merged events are not classified until validate_cme_events runs
+            if 'classification' in merged_events:
+                classifications = merged_events['classification'].to_numpy()
+            else:
+                classifications = np.full(len(merged_events), 'Unclassified', dtype=object)
+            starts = mdates.date2num(merged_events['start_time'].to_numpy())
+            ends = mdates.date2num(merged_events['end_time'].to_numpy())
+            # One polygon per event spanning the full axes height, drawn as a single artist
+            spans = np.stack([np.column_stack([starts, np.zeros_like(starts)]),
+                              np.column_stack([starts, np.ones_like(starts)]),
+                              np.column_stack([ends, np.ones_like(ends)]),
+                              np.column_stack([ends, np.zeros_like(ends)])], axis=1)
+            ax.add_collection(PolyCollection(spans, facecolors='orange', edgecolors='none', alpha=0.3,
+                                             label=f"CME Event ({classifications[0]})",
+                                             transform=ax.get_xaxis_transform()))
+            for idx, (start, classification) in enumerate(zip(starts, classifications)):
+                ax.text(start, 0.5, f"Event {idx+1}\n{classification}", 
                         rotation=90, va='center', ha='right', fontsize=8)
         
+        ax.xaxis_date()
         ax.set_ylabel('CME Events')
         ax.set_ylim(0, 1)
         ax.set_title('Merged CME Events Across All Instruments', fontsize=10)
@@ -546,8 +692,9 @@ class CMEDetectionSystem:
         plt.xlabel('Time')
         plt.suptitle('CME Detection System - Multi-Instrument Overview', fontsize=16, fontweight='bold')
         plt.tight_layout(rect=[0, 0, 1, 0.95])
-        plt.savefig('cme_detection_overview.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        # tight_layout already fits the figure, so skip the extra bbox_inches='tight' render
+        fig.savefig('cme_detection_overview.png', dpi=150)
+        plt.close(fig)
         
         logger.info("Detection overview plot saved as 'cme_detection_overview.png'")
     
@@ -555,72 +702,75 @@ class CMEDetectionSystem:
         """Generate comprehensive CME detection report"""
         logger.info("Generating CME detection report...")
         
-        report = []
-        report.append("=" * 80)
-        report.append("ADITYA-L1 SWIS CME DETECTION SYSTEM - ANALYSIS REPORT")
-        report.append("=" * 80)
-        report.append(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        report.append("")
+        buf = io.StringIO()
+        w = buf.write
+        w("=" * 80 + "\n")
+        w("ADITYA-L1 SWIS CME DETECTION SYSTEM - ANALYSIS REPORT\n")
+        w("=" * 80 + "\n")
+        w(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        w("\n")
         
-        report.append("DATA SUMMARY:")
-        report.append("-" * 40)
+        w("DATA SUMMARY:\n")
+        w("-" * 40 + "\n")
         for instrument, df in self.processed_data.items():
-            report.append(f"{instrument.upper()}: {len(df):,} records")
-            report.append(f"  Time range: {df['datetime'].min()} to {df['datetime'].max()}")
-            report.append(f"  Duration: {(df['datetime'].max() - df['datetime'].min()).days if len(df) > 0 else 0} days")
-        report.append("")
+            w(f"{instrument.upper()}: {len(df):,} records\n")
+            w(f"  Time range: {df.index.min()} to {df.index.max()}\n")
+            w(f"  Duration: {(df.index.max() - df.index.min()).days if len(df) > 0 else 0} days\n")
+        w("\n")
         
-        report.append("DETECTION RESULTS:")
-        report.append("-" * 40)
+        w("DETECTION RESULTS:\n")
+        w("-" * 40 + "\n")
         total_detections = 0
         for instrument, detections in self.detection_results.items():
             num_detections = detections['cme_detected'].sum() if len(detections) > 0 else 0
             total_detections += num_detections
-            report.append(f"{instrument.upper()}: {num_detections} CME signatures detected")
+            w(f"{instrument.upper()}: {num_detections} CME signatures detected\n")
         
-        report.append(f"TOTAL INDIVIDUAL DETECTIONS: {total_detections}")
-        report.append("")
+        w(f"TOTAL INDIVIDUAL DETECTIONS: {total_detections}\n")
+        w("\n")
         
         if valid_events is not None and len(valid_events) > 0:
-            report.append("VALIDATED CME EVENTS:")
-            report.append("-" * 40)
-            report.append(f"Total validated events: {len(valid_events)}")
+            w("VALIDATED CME EVENTS:\n")
+            w("-" * 40 + "\n")
+            w(f"Total validated events: {len(valid_events)}\n")
             
             for classification in valid_events['classification'].unique():
                 count = len(valid_events[valid_events['classification'] == classification])
-                report.append(f"{classification}: {count} events")
+                w(f"{classification}: {count} events\n")
             
-            report.append("")
-            report.append("EVENT DETAILS:")
-            report.append("-" * 40)
+            w("\n")
+            w("EVENT DETAILS:\n")
+            w("-" * 40 + "\n")
             
-            for idx, event in valid_events.iterrows():
-                report.append(f"Event {idx + 1}:")
-                report.append(f"  Start: {event['start_time']}")
-                report.append(f"  Duration: {event['duration_hours']:.1f} hours")
-                report.append(f"  Instruments: {event['instruments']}")
-                report.append(f"  Confidence: {event['avg_confidence']:.2f}")
-                report.append(f"  Classification: {event['classification']}")
-                report.append("")
-        
-        report.append("DETECTION STATISTICS:")
-        report.append("-" * 40)
+            # Format whole columns and concatenate them into one block per event
+            details = (
+                "Event " + pd.Series(valid_events.index + 1, index=valid_events.index).astype(str) +
+                ":\n  Start: " + valid_events['start_time'].astype(str) +
+                "\n  Duration: " + valid_events['duration_hours'].map('{:.1f}'.format) +
+                " hours\n  Instruments: " + valid_events['instruments'].astype(str) +
+                "\n  Confidence: " + valid_events['avg_confidence'].map('{:.2f}'.format) +
+                "\n  Classification: " + valid_events['classification'].astype(str) + "\n\n"
+            )
+            w("".join(details.tolist()))
+        
+        w("DETECTION STATISTICS:\n")
+        w("-" * 40 + "\n")
         if valid_events is not None and len(valid_events) > 0:
             avg_duration = valid_events['duration_hours'].mean()
             max_duration = valid_events['duration_hours'].max()
             avg_confidence = valid_events['avg_confidence'].mean()
-            report.append(f"Average event duration: {avg_duration:.1f} hours")
-            report.append(f"Maximum event duration: {max_duration:.1f} hours")
-            report.append(f"Average confidence: {avg_confidence:.2f}")
+            w(f"Average event duration: {avg_duration:.1f} hours\n")
+            w(f"Maximum event duration: {max_duration:.1f} hours\n")
+            w(f"Average confidence: {avg_confidence:.2f}\n")
             multi_instrument = valid_events[valid_events['num_instruments'] > 1]
             correlation_rate = len(multi_instrument) / len(valid_events) * 100 if len(valid_events) > 0 else 0
-            report.append(f"Multi-instrument correlation rate: {correlation_rate:.1f}%")
+            w(f"Multi-instrument correlation rate: {correlation_rate:.1f}%\n")
         
-        report.append("")
-        report.append("=" * 80)
+        w("\n")
+        w("=" * 80 + "\n")
         
-        report_text = "\n".join(report)
-        with open('cme_detection_report.txt', 'w') as f:
+        report_text = buf.getvalue()
+        with open('cme_detection_report.txt', 'w', buffering=1 << 16) as f:
             f.write(report_text)
         
         print(report_text)
@@ -639,7 +789,7 @@ class CMEDetectionSystem:
             self.composite_cme_detection()
             merged_events = self.merge_detections()
             valid_events = self.validate_cme_events(merged_events)
-            self.plot_detection_overview()
+            self.plot_detection_overview(merged_events=merged_events)
             self.generate_report(valid_events)
             logger.info("CME detection analysis completed successfully!")
             return valid_events
@@ -1,28 +1,29 @@
-import pandas as pd
+import re
 import numpy as np
 import polars as pl
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
-from scipy.signal import savgol_filter
 import logging
-from sklearn.metrics import precision_score, recall_score, f1_score
 
 
+# ACE text files: ':' / '#' header lines, then whitespace-aligned columns
+COMMENT_LINES = re.compile(rb"(?m)^[#:].*(?:\r?\n|$)")
+LEADING_TRAILING_WS = re.compile(rb"(?m)^[ \t]+|[ \t]+(?=\r?$)")
+EMPTY_LINES = re.compile(rb"(?m)^\r?\n")
+WS_RUN = re.compile(rb"[ \t]+")
+
 def load_ace_file(filepath):
-    with open(filepath, 'r') as file:
-        lines = file.readlines()
+    with open(filepath, 'rb') as file:
+        data = file.read()
 
-    # Filter out comment lines
-    data_lines = [line for line in lines if not line.startswith(('#', ':')) and line.strip()]
-    
-    # Convert to a DataFrame using fixed-width format
-    from io import StringIO
-    data_str = ''.join(data_lines)
-    df = pd.read_fwf(StringIO(data_str))
+    # Drop comment and blank lines and collapse the column padding to single spaces,
+    # then let the Polars CSV reader parse the rest natively
+    data = COMMENT_LINES.sub(b"", data)
+    data = LEADING_TRAILING_WS.sub(b"", data)
+    data = EMPTY_LINES.sub(b"", data)
+    data = WS_RUN.sub(b" ", data)
+    df = pl.read_csv(data, separator=' ', has_header=True)
     
-    return df
+    return df.to_pandas()
 
 # Set up logging
 logging.basicConfig(
@@ -36,16 +37,13 @@ def load_and_preprocess_csv(file_path, file_type):
     """Load and preprocess ACE CSV files."""
     try:
         df = pl.read_csv(file_path)
-        # Create datetime column from YR, MO, DA, HHMM
+        # Create datetime column from YR, MO, DA, HHMM with integer arithmetic
         df = df.with_columns(
-            pl.col("YR").cast(str) + "-" +
-            pl.col("MO").cast(str).str.zfill(2) + "-" +
-            pl.col("DA").cast(str).str.zfill(2) + " " +
-            pl.col("HHMM").cast(str).str.zfill(4).str.slice(0, 2) + ":" +
-            pl.col("HHMM").cast(str).str.zfill(4).str.slice(2, 2)
-        ).with_columns(
-            pl.col("col_0").str.strptime(pl.Datetime, format="%Y-%m-%d %H:%M").alias("datetime")
-        ).drop(["YR", "MO", "DA", "HHMM", "col_0"])
+            pl.datetime(
+                pl.col("YR"), pl.col("MO"), pl.col("DA"),
+                pl.col("HHMM") // 100, pl.col("HHMM") % 100
+            ).alias("datetime")
+        ).drop(["YR", "MO", "DA", "HHMM"])
         logger.info(f"Loaded and preprocessed {file_path}")
         return df
     except Exception as e:
@@ -68,18 +66,20 @@ def load_cactus_cme(cme_file):
 
 def extract_cme_windows(data_df, cme_df, window_hours=12):
     """Extract time windows around CME events."""
-    windows = []
-    for cme_time in cme_df["CME_time"]:
-        start_time = cme_time - timedelta(hours=window_hours)
-        end_time = cme_time + timedelta(hours=window_hours)
-        window_df = data_df.filter(
-            (pl.col("datetime") >= start_time) & (pl.col("datetime") <= end_time)
-        )
-        window_df = window_df.with_columns(pl.lit(cme_time).alias("cme_time"))
-        windows.append(window_df)
-    if windows:
-        return pl.concat(windows)
-    return None
+    if len(cme_df) == 0:
+        return None
+    bounds = cme_df.select(
+        pl.col("CME_time").alias("cme_time"),
+        (pl.col("CME_time") - pl.duration(hours=window_hours)).alias("window_start"),
+        (pl.col("CME_time") + pl.duration(hours=window_hours)).alias("window_end")
+    )
+    # One range join instead of filtering the full frame once per CME
+    windows = data_df.join_where(
+        bounds,
+        pl.col("datetime") >= pl.col("window_start"),
+        pl.col("datetime") <= pl.col("window_end")
+    )
+    return windows.drop(["window_start", "window_end"]).sort("cme_time", "datetime", maintain_order=True)
 
 def derive_features(df, file_type):
     """Derive time-series features for CME detection."""
@@ -94,22 +94,18 @@ def derive_features(df, file_type):
         else:
             return df
         
-        # Compute moving averages (1-hour window, assuming 5-min data)
+        # Compute moving averages (1-hour window, assuming 5-min data) and gradients,
+        # collected into one with_columns so Polars evaluates them in a single pass
         window_size = 12  # 12 * 5min = 1 hour
+        exprs = []
         for col in flux_cols:
-            df = df.with_columns(
-                pl.col(col).rolling_mean(window_size=window_size, min_periods=1).alias(f"{col}_ma")
-            )
-            # Compute gradient
-            df = df.with_columns(
-                (pl.col(col) - pl.col(col).shift(1)).alias(f"{col}_gradient")
-            )
+            exprs.append(pl.col(col).rolling_mean(window_size=window_size, min_periods=1).alias(f"{col}_ma"))
+            exprs.append((pl.col(col) - pl.col(col).shift(1)).alias(f"{col}_gradient"))
         
         # Compute combined metric (e.g., flux * speed for swepam)
         if file_type == "swepam":
-            df = df.with_columns(
-                (pl.col("Proton_Density") * pl.col("Bulk_Speed")).alias("density_speed_product")
-            )
+            exprs.append((pl.col("Proton_Density") * pl.col("Bulk_Speed")).alias("density_speed_product"))
+        df = df.with_columns(exprs)
         return df
     except Exception as e:
         logger.error(f"Error deriving features for {file_type}: {str(e)}")
@@ -118,31 +114,35 @@ def derive_features(df, file_type):
 def detect_cme_events(df, file_type, thresholds):
     """Detect CME events based on thresholds."""
     try:
-        detections = pl.DataFrame({"datetime": df["datetime"], "is_cme": False})
-        for col, thresh in thresholds.items():
-            if col in df.columns:
-                detections = detections.with_columns(
-                    pl.col("is_cme") | (pl.col(col) > thresh).fill_null(False)
-                )
-        return detections
+        # All threshold tests in one expression, OR-ed across columns in a single pass
+        exprs = [(pl.col(col) > thresh).fill_null(False) for col, thresh in thresholds.items() if col in df.columns]
+        is_cme = pl.any_horizontal(exprs) if exprs else pl.lit(False)
+        return df.select(pl.col("datetime"), is_cme.alias("is_cme"))
     except Exception as e:
         logger.error(f"Error detecting CMEs for {file_type}: {str(e)}")
         return None
 
 def validate_detections(detections, cme_df, tolerance_minutes=60):
     """Validate detected CMEs against CACTUS timestamps."""
+    # sklearn is slow to import and only needed here
+    from sklearn.metrics import precision_score, recall_score, f1_score
     try:
-        true_cmes = cme_df["CME_time"].to_list()
-        detected_cmes = detections.filter(pl.col("is_cme") == True)["datetime"].to_list()
+        # Work on sorted int64 nanosecond timestamps so nearest-CME lookup is a binary search
+        true_cmes = np.sort(cme_df["CME_time"].drop_nulls().to_numpy().astype("datetime64[ns]").view("i8"))
+        times = detections["datetime"].to_numpy().astype("datetime64[ns]").view("i8")
+        is_cme = detections["is_cme"].to_numpy().astype(bool)
         
-        y_true = []
-        y_pred = []
-        for dt in detections["datetime"]:
-            # Check if datetime is near a true CME (within tolerance)
-            is_true_cme = any(abs((dt - cme).total_seconds()) / 60 <= tolerance_minutes for cme in true_cmes)
-            y_true.append(is_true_cme)
-            is_pred_cme = dt in detected_cmes
-            y_pred.append(is_pred_cme)
+        # A timestamp is a true CME if the nearest CACTUS time on either side is within tolerance
+        tolerance_ns = tolerance_minutes * 60 * 10**9
+        if len(true_cmes):
+            idx = np.searchsorted(true_cmes, times)
+            before = true_cmes[np.clip(idx - 1, 0, len(true_cmes) - 1)]
+            after = true_cmes[np.clip(idx, 0, len(true_cmes) - 1)]
+            y_true = np.minimum(np.abs(times - before), np.abs(times - after)) <= tolerance_ns
+        else:
+            y_true = np.zeros(len(times), dtype=bool)
+        # Predicted wherever the timestamp appears among the detected rows
+        y_pred = np.isin(times, times[is_cme])
         
         precision = precision_score(y_true, y_pred)
         recall = recall_score(y_true, y_pred)
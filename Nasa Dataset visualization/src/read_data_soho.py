@@ -1,23 +1,29 @@
 import os
 import re
 import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 BASE_URL = "https://sohoftp.nascom.nasa.gov/sdb/goes/ace/daily/"
 LOCAL_ROOT = "ace_daily"
+MAX_WORKERS = 16
+CHUNK_SIZE = 1 << 16
+# Links to text files in the Apache directory index
+TXT_LINK = re.compile(rb'href="([^"]+\.txt)"')
 
 def download_ace_files():
-    # Step 1: Get file list from the web directory
-    response = requests.get(BASE_URL)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    # One session for the listing and every download so connections are kept alive
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
 
-    links = soup.find_all('a', href=True)
-    txt_files = [link['href'] for link in links if link['href'].endswith('.txt')]
+    # Step 1: Get file list from the web directory
+    response = session.get(BASE_URL)
+    txt_files = [m.group(1).decode() for m in TXT_LINK.finditer(response.content)]
 
     # Step 2: Create root folder
     os.makedirs(LOCAL_ROOT, exist_ok=True)
 
-    for file in txt_files:
+    def fetch(file):
         year = file[:4] if file[:4].isdigit() else "unknown"
         year_dir = os.path.join(LOCAL_ROOT, year)
         os.makedirs(year_dir, exist_ok=True)
@@ -27,16 +33,26 @@ def download_ace_files():
 
         if os.path.exists(dest_path):
             print(f"Skipping: {file}")
-            continue
+            return
 
         print(f"Downloading: {file_url}")
         try:
-            r = requests.get(file_url)
-            with open(dest_path, 'wb') as f:
-                f.write(r.content)
+            # Stream to disk instead of holding the whole file in memory
+            with session.get(file_url, stream=True) as r:
+                r.raise_for_status()
+                with open(dest_path, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
         except Exception as e:
+            # Don't leave a partial file behind, or the next run would skip it
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
             print(f"Error downloading {file}: {e}")
 
+    # Downloads are latency-bound, so overlap them across a pool of threads
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(fetch, txt_files))
+
     print("✅ All files downloaded and organized.")
 
 if __name__ == "__main__":
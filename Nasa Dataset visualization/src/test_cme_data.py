@@ -54,14 +54,14 @@ def check_data_files():
             
             # Try to create datetime
             try:
-                df['datetime'] = pd.to_datetime(
-                    df['YR'].astype(int).astype(str) + '-' + 
-                    df['MO'].astype(int).astype(str).str.zfill(2) + '-' + 
-                    df['DA'].astype(int).astype(str).str.zfill(2) + ' ' + 
-                    df['HHMM'].astype(int).astype(str).str.zfill(4).str[:2] + ':' + 
-                    df['HHMM'].astype(int).astype(str).str.zfill(4).str[2:], 
-                    errors='coerce'
-                )
+                hhmm = df['HHMM'].astype(int)
+                df['datetime'] = pd.to_datetime({
+                    'year': df['YR'].astype(int),
+                    'month': df['MO'].astype(int),
+                    'day': df['DA'].astype(int),
+                    'hour': hhmm // 100,
+                    'minute': hhmm % 100
+                }, errors='coerce')
                 
                 valid_dates = df['datetime'].notna().sum()
                 print(f"Valid dates created: {valid_dates}/{len(df)}")
@@ -153,13 +153,15 @@ def run_simple_cme_detection(data):
         elif instrument == 'mag':
             # Simple magnetic field rotation detection
             if all(col in df.columns for col in ['Bx', 'By', 'Bz']):
-                bx = pd.to_numeric(df['Bx'], errors='coerce')
-                by = pd.to_numeric(df['By'], errors='coerce')
-                bz = pd.to_numeric(df['Bz'], errors='coerce')
+                # Components as one (N, 3) array so the step vectors come from a single diff
+                b = np.empty((len(df), 3))
+                for j, col in enumerate(['Bx', 'By', 'Bz']):
+                    b[:, j] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
                 
                 # Calculate field changes
-                field_changes = np.sqrt(bx.diff()**2 + by.diff()**2 + bz.diff()**2)
-                threshold = field_changes.quantile(0.95)
+                steps = np.diff(b, axis=0)
+                field_changes = np.sqrt(np.einsum('ij,ij->i', steps, steps))
+                threshold = np.nanquantile(field_changes, 0.95) if len(field_changes) else np.nan
                 
                 rotations = field_changes > threshold
                 detections = rotations.sum()
@@ -11,15 +11,300 @@ This module provides advanced techniques for:
 
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime, timedelta
+from datetime import datetime
 from scipy import stats
 from sklearn.metrics import roc_curve, auc, precision_recall_curve
+from numba import njit, prange
+from concurrent.futures import ThreadPoolExecutor
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fill values used for missing measurements in the ACE files
+FILL_VALUES = (9, 99, 999, 9999, -999, -99, -9)
+
+# Rows per parallel block in the rolling kernels; each block rebuilds its first window
+ROLLING_BLOCK = 1 << 16
+# Rows per tumbling sub-window for the approximate rolling quantiles
+QUANTILE_SUBWINDOW = 64
+
+def centered_window_bounds(index, window):
+    """
+    Row bounds of pandas' centered time-based windows
+    
+    The window around t covers (t - window/2, t + window/2], as in
+    ``rolling(window, center=True)`` on a DatetimeIndex.
+    
+    Args:
+        index (pd.DatetimeIndex): Sorted timestamps
+        window (pd.Timedelta): Window length
+        
+    Returns:
+        (start, end) int64 arrays; row i's window is values[start[i]:end[i]]
+    """
+    ts = index.values.astype('datetime64[ns]').view('i8')
+    half = pd.Timedelta(window).value // 2
+    start = np.searchsorted(ts, ts - half, side='right').astype(np.int64)
+    end = np.searchsorted(ts, ts + half, side='right').astype(np.int64)
+    return start, end
+
+@njit(parallel=True, nogil=True, cache=True, error_model='numpy')
+def rolling_mean_std(values, start, end, min_periods):
+    """
+    Rolling mean, sample std and z-score in one pass over monotonic window bounds
+    
+    Each block keeps a running count, mean and sum of squared deviations (Welford
+    add/remove, as pandas does) while its window slides, so every row costs O(1).
+    
+    Returns:
+        (mean, std, normalized) float64 arrays; NaN where fewer than min_periods
+        non-NaN values fall in the window, and normalized is also NaN where std is 0
+    """
+    n = values.shape[0]
+    mean_out = np.full(n, np.nan)
+    std_out = np.full(n, np.nan)
+    norm_out = np.full(n, np.nan)
+    n_blocks = (n + ROLLING_BLOCK - 1) // ROLLING_BLOCK
+    
+    for b in prange(n_blocks):
+        lo = b * ROLLING_BLOCK
+        hi = min(lo + ROLLING_BLOCK, n)
+        nobs = 0
+        mean = 0.0
+        ssqdm = 0.0
+        win_start = start[lo]
+        win_end = start[lo]
+        for i in range(lo, hi):
+            # Grow the window on the right
+            while win_end < end[i]:
+                x = values[win_end]
+                if not np.isnan(x):
+                    nobs += 1
+                    delta = x - mean
+                    mean += delta / nobs
+                    ssqdm += delta * (x - mean)
+                win_end += 1
+            # Shrink it on the left
+            while win_start < start[i]:
+                x = values[win_start]
+                if not np.isnan(x):
+                    nobs -= 1
+                    if nobs > 0:
+                        delta = x - mean
+                        mean -= delta / nobs
+                        ssqdm -= delta * (x - mean)
+                    else:
+                        mean = 0.0
+                        ssqdm = 0.0
+                win_start += 1
+            
+            if nobs >= min_periods:
+                mean_out[i] = mean
+                if nobs > 1:
+                    std = np.sqrt(max(ssqdm, 0.0) / (nobs - 1))
+                    std_out[i] = std
+                    # A constant window leaves a rounding residual in mean; pandas'
+                    # (x - mean) / 0 is NaN there, not +-inf
+                    if std > 0:
+                        norm_out[i] = (values[i] - mean) / std
+    return mean_out, std_out, norm_out
+
+@njit(parallel=True, nogil=True, cache=True)
+def rolling_quantile_approx(values, start, end, q, subwindow, min_periods):
+    """
+    Approximate rolling quantile from exact quantiles of tumbling sub-windows
+    
+    The series is cut into blocks of ``subwindow`` rows and each block's quantile is
+    computed once; a row's result is the mean quantile of the blocks its window touches.
+    Cost is O(n log subwindow) instead of re-sorting every window.
+    
+    Returns:
+        float64 array; NaN where fewer than min_periods non-NaN values fall in the window
+    """
+    n = values.shape[0]
+    n_blocks = (n + subwindow - 1) // subwindow
+    block_q = np.empty(n_blocks)
+    for b in prange(n_blocks):
+        block_q[b] = np.nanquantile(values[b * subwindow:min((b + 1) * subwindow, n)], q)
+    
+    # Prefix sums over blocks and valid rows make each window lookup O(1)
+    q_sum = np.zeros(n_blocks + 1)
+    q_count = np.zeros(n_blocks + 1, dtype=np.int64)
+    for b in range(n_blocks):
+        valid = not np.isnan(block_q[b])
+        q_sum[b + 1] = q_sum[b] + (block_q[b] if valid else 0.0)
+        q_count[b + 1] = q_count[b] + valid
+    obs = np.zeros(n + 1, dtype=np.int64)
+    for i in range(n):
+        obs[i + 1] = obs[i] + (not np.isnan(values[i]))
+    
+    out = np.full(n, np.nan)
+    for i in prange(n):
+        if obs[end[i]] - obs[start[i]] >= min_periods:
+            first = start[i] // subwindow
+            last = (end[i] - 1) // subwindow + 1
+            count = q_count[last] - q_count[first]
+            if count > 0:
+                out[i] = (q_sum[last] - q_sum[first]) / count
+    return out
+
+@njit(nogil=True, cache=True)
+def _fenwick_add(tree, i, delta):
+    """Add delta to the count of rank i (0-based) in a Fenwick tree"""
+    i += 1
+    while i < tree.shape[0]:
+        tree[i] += delta
+        i += i & -i
+
+@njit(nogil=True, cache=True)
+def _fenwick_count_below(tree, i):
+    """Number of stored values with rank < i (0-based) in a Fenwick tree"""
+    total = 0
+    while i > 0:
+        total += tree[i]
+        i -= i & -i
+    return total
+
+@njit(parallel=True, nogil=True, cache=True)
+def rolling_rank_pct(values, start, end, min_periods):
+    """
+    Rolling percentile rank, matching ``rolling(...).rank(pct=True)`` (average ties)
+    
+    As in pandas, the sample ranked at row i is the last one of its window,
+    ``values[end[i] - 1]`` (not ``values[i]`` when the window is centered).
+    Each block ranks the values its windows span once, then keeps the window's
+    counts per rank in a Fenwick tree, so every insert, removal and rank query
+    is O(log w).
+    
+    Returns:
+        float64 array; NaN where the ranked sample is NaN or the window has
+        fewer than min_periods values
+    """
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if n == 0:
+        return out
+    n_blocks = (n + ROLLING_BLOCK - 1) // ROLLING_BLOCK
+    
+    for b in prange(n_blocks):
+        lo = b * ROLLING_BLOCK
+        hi = min(lo + ROLLING_BLOCK, n)
+        # Window bounds are non-decreasing, so the block's windows all lie in [base, stop)
+        base = start[lo]
+        stop = end[hi - 1]
+        span = values[base:stop]
+        uniq = np.unique(span[~np.isnan(span)])
+        ranks = np.searchsorted(uniq, span)
+        tree = np.zeros(uniq.shape[0] + 1, dtype=np.int64)
+        size = 0
+        win_start = base
+        win_end = base
+        for i in range(lo, hi):
+            while win_end < end[i]:
+                if not np.isnan(values[win_end]):
+                    _fenwick_add(tree, ranks[win_end - base], 1)
+                    size += 1
+                win_end += 1
+            while win_start < start[i]:
+                if not np.isnan(values[win_start]):
+                    _fenwick_add(tree, ranks[win_start - base], -1)
+                    size -= 1
+                win_start += 1
+            
+            last = end[i] - 1
+            if size >= min_periods and last >= start[i] and not np.isnan(values[last]):
+                r = ranks[last - base]
+                below = _fenwick_count_below(tree, r)
+                upto = _fenwick_count_below(tree, r + 1)
+                out[i] = (below + (upto - below + 1) / 2.0) / size
+    return out
+
+def clean_background_series(param_data):
+    """
+    Mask the ACE fill values and fill the gaps from the neighbouring measurements
+    
+    Args:
+        param_data (pd.Series): Raw parameter values
+        
+    Returns:
+        pd.Series: Cleaned values
+    """
+    param_data = param_data.mask(param_data.isin(FILL_VALUES))
+    return param_data.ffill().bfill()
+
+def rolling_background_columns(param, param_data, window_size, min_periods=10):
+    """
+    Rolling background columns computed by the numba kernels for one parameter
+    
+    The kernels already spread each call over every core, so call this from the
+    main thread: parallel kernels launched from worker threads hang the process at
+    exit under numba's TBB threading layer.
+    
+    Args:
+        param (str): Column name, used to prefix the output columns
+        param_data (pd.Series): Cleaned parameter values on a DatetimeIndex
+        window_size (pd.Timedelta): Centered rolling window length
+        min_periods (int): Minimum observations per window
+        
+    Returns:
+        dict: New columns keyed by name
+    """
+    # Centered windows need neighbours on both sides, so roll over the whole
+    # series at once rather than per chunk
+    values = param_data.to_numpy(dtype=np.float64)
+    start, end = centered_window_bounds(param_data.index, window_size)
+    bg_mean, bg_std, normalized = rolling_mean_std(values, start, end, min_periods)
+    # Tail levels from sub-window quantiles; exact quantiles are kept for the summary
+    bg_p95 = rolling_quantile_approx(values, start, end, 0.95, QUANTILE_SUBWINDOW, min_periods)
+    bg_p05 = rolling_quantile_approx(values, start, end, 0.05, QUANTILE_SUBWINDOW, min_periods)
+    percentile = rolling_rank_pct(values, start, end, min_periods)
+    
+    return {
+        f'{param}_bg_mean': bg_mean,
+        f'{param}_bg_std': bg_std,
+        f'{param}_bg_p95': bg_p95,
+        f'{param}_bg_p05': bg_p05,
+        f'{param}_normalized': normalized,
+        f'{param}_percentile': percentile
+    }
+
+def background_summary(param, param_data, window_size, min_periods=10):
+    """
+    Rolling median column and global summary statistics for one parameter
+    
+    Only pandas work that runs in C is done here, so several parameters can be
+    processed from a thread pool.
+    
+    Args:
+        param (str): Column name, used to prefix the output column
+        param_data (pd.Series): Cleaned parameter values on a DatetimeIndex
+        window_size (pd.Timedelta): Centered rolling window length
+        min_periods (int): Minimum observations per window
+        
+    Returns:
+        (dict, dict): The median column keyed by name, and the parameter's summary statistics
+    """
+    bg_median = param_data.rolling(window=window_size, center=True, min_periods=min_periods).median()
+    
+    # One sort serves every global quantile, including the median
+    quantiles = param_data.quantile([0.01, 0.05, 0.5, 0.95, 0.99]).to_numpy()
+    stats = {
+        'mean': param_data.mean(),
+        'std': param_data.std(),
+        'median': quantiles[2],
+        'p95': quantiles[3],
+        'p05': quantiles[1],
+        'p99': quantiles[4],
+        'p01': quantiles[0],
+        'missing_count': param_data.isna().sum()
+    }
+    return {f'{param}_bg_median': bg_median.to_numpy()}, stats
+
 class ThresholdOptimizer:
     """
     Advanced threshold optimization for CME detection
@@ -37,81 +322,67 @@ class ThresholdOptimizer:
         self.optimal_thresholds = {}
         self.validation_results = {}
     
-    def calculate_background_statistics(self, window_days=30, chunk_size=100_000):
+    def calculate_background_statistics(self, window_days=30):
         """
-        Calculate background statistics for each parameter with chunking for large datasets
+        Calculate background statistics for each parameter
         
         Args:
             window_days (int): Number of days for rolling background calculation
-            chunk_size (int): Number of rows to process in each chunk
         """
         logger.info("Calculating background statistics...")
         
+        window_size = pd.Timedelta(days=window_days)
+        tasks = {}
         for instrument, df in self.cme_system.processed_data.items():
-            try:
-                if len(df) == 0:
-                    logger.warning(f"Skipping {instrument}: empty dataset")
-                    continue
-                
-                stats_dict = {}
-                df = df.set_index('datetime')
-                
-                if instrument == 'swepam':
-                    params = ['Bulk_Speed', 'Proton_Density', 'Ion_Temperature']
-                elif instrument == 'mag':
-                    params = ['Bt', 'Bx', 'By', 'Bz']
-                elif instrument in ['epam', 'sis']:
-                    params = [col for col in df.columns if 'Proton' in col and col not in ['YR', 'MO', 'DA', 'HH', 'MM']][:5]
-                else:
-                    continue
-                
-                window_size = pd.Timedelta(days=window_days)
-                
-                for param in params:
-                    if param in df.columns and df[param].notna().sum() > 100:
-                        param_data = df[param].replace([9, 99, 999, 9999, -999, -99, -9], np.nan)
-                        param_data = param_data.ffill().bfill()
-                        
-                        # Process in chunks to reduce memory usage
-                        chunks = []
-                        for start in range(0, len(param_data), chunk_size):
-                            chunk = param_data[start:start + chunk_size]
-                            chunk_stats = {}
-                            chunk_stats[f'{param}_bg_mean'] = chunk.rolling(window=window_size, center=True, min_periods=10).mean()
-                            chunk_stats[f'{param}_bg_std'] = chunk.rolling(window=window_size, center=True, min_periods=10).std()
-                            chunk_stats[f'{param}_bg_median'] = chunk.rolling(window=window_size, center=True, min_periods=10).median()
-                            chunk_stats[f'{param}_bg_p95'] = chunk.rolling(window=window_size, center=True, min_periods=10).quantile(0.95)
-                            chunk_stats[f'{param}_bg_p05'] = chunk.rolling(window=window_size, center=True, min_periods=10).quantile(0.05)
-                            chunks.append(pd.DataFrame(chunk_stats, index=chunk.index))
-                        
-                        # Combine chunks
-                        chunk_df = pd.concat(chunks)
-                        df[f'{param}_bg_mean'] = chunk_df[f'{param}_bg_mean']
-                        df[f'{param}_bg_std'] = chunk_df[f'{param}_bg_std']
-                        df[f'{param}_bg_median'] = chunk_df[f'{param}_bg_median']
-                        df[f'{param}_bg_p95'] = chunk_df[f'{param}_bg_p95']
-                        df[f'{param}_bg_p05'] = chunk_df[f'{param}_bg_p05']
-                        
-                        df[f'{param}_normalized'] = (param_data - df[f'{param}_bg_mean']) / df[f'{param}_bg_std']
-                        df[f'{param}_percentile'] = param_data.rolling(window=window_size, center=True, min_periods=10).rank(pct=True)
-                        
-                        stats_dict[param] = {
-                            'mean': param_data.mean(),
-                            'std': param_data.std(),
-                            'median': param_data.median(),
-                            'p95': param_data.quantile(0.95),
-                            'p05': param_data.quantile(0.05),
-                            'p99': param_data.quantile(0.99),
-                            'p01': param_data.quantile(0.01),
-                            'missing_count': param_data.isna().sum()
-                        }
-                
-                self.background_stats[instrument] = stats_dict
-                self.cme_system.processed_data[instrument] = df.reset_index()
-                logger.info(f"Background statistics calculated for {instrument}")
-                
-            except Exception as e:
-                logger.error(f"Error calculating background statistics for {instrument}: {str(e)}")
+            if len(df) == 0:
+                logger.warning(f"Skipping {instrument}: empty dataset")
+                continue
+            
+            if instrument == 'swepam':
+                params = ['Bulk_Speed', 'Proton_Density', 'Ion_Temperature']
+            elif instrument == 'mag':
+                params = ['Bt', 'Bx', 'By', 'Bz']
+            elif instrument in ['epam', 'sis']:
+                params = [col for col in df.columns if 'Proton' in col and col not in ['YR', 'MO', 'DA', 'HH', 'MM']][:5]
+            else:
+                continue
+            
+            tasks[instrument] = [param for param in params
+                                 if param in df.columns and df[param].notna().sum() > 100]
+        
+        # The pandas median and quantiles of every (instrument, parameter) pair run in the
+        # pool while the numba kernels, which use every core themselves, run here;
+        # frames are only written back on this thread
+        n_tasks = sum(len(params) for params in tasks.values())
+        with ThreadPoolExecutor(max_workers=max(1, min(n_tasks, os.cpu_count() or 1))) as executor:
+            cleaned = {
+                instrument: {param: clean_background_series(self.cme_system.processed_data[instrument][param])
+                             for param in params}
+                for instrument, params in tasks.items()
+            }
+            futures = {
+                instrument: {param: executor.submit(background_summary, param, param_data, window_size)
+                             for param, param_data in series.items()}
+                for instrument, series in cleaned.items()
+            }
+            
+            for instrument, series in cleaned.items():
+                try:
+                    df = self.cme_system.processed_data[instrument]
+                    stats_dict = {}
+                    for param, param_data in series.items():
+                        columns = rolling_background_columns(param, param_data, window_size)
+                        median_columns, stats_dict[param] = futures[instrument][param].result()
+                        columns.update(median_columns)
+                        for name, column in columns.items():
+                            df[name] = column
+                    
+                    self.background_stats[instrument] = stats_dict
+                    self.cme_system.processed_data[instrument] = df
+                    logger.info(f"Background statistics calculated for {instrument}")
+                    
+                except Exception as e:
+                    logger.error(f"Error calculating background statistics for {instrument}: {str(e)}")
     
     def optimize_thresholds_statistical(self, sigma_levels=[1.5, 2, 2.5, 3]):
         """
@@ -132,12 +403,14 @@ class ThresholdOptimizer:
                 missing_ratio = stats['missing_count'] / self.cme_system.processed_data[instrument].shape[0]
                 adjustment_factor = 1.0 if missing_ratio < 0.3 else 1.5
                 
-                for sigma in sigma_levels:
-                    adjusted_sigma = sigma * adjustment_factor
-                    upper_threshold = stats['mean'] + adjusted_sigma * stats['std']
-                    lower_threshold = stats['mean'] - adjusted_sigma * stats['std']
+                # Thresholds for every sigma level in one vector op
+                adjusted_sigmas = np.asarray(sigma_levels, dtype=float) * adjustment_factor
+                upper_thresholds = stats['mean'] + adjusted_sigmas * stats['std']
+                lower_thresholds = stats['mean'] - adjusted_sigmas * stats['std']
+
+                for sigma, upper_threshold, lower_threshold in zip(sigma_levels, upper_thresholds.tolist(), lower_thresholds.tolist()):
                     percentile_threshold = stats['p95'] if sigma <= 2 else stats['p99']
-                    
+
                     param_thresholds[f'{sigma}sigma_upper'] = upper_threshold
                     param_thresholds[f'{sigma}sigma_lower'] = lower_threshold
                     param_thresholds[f'{sigma}sigma_percentile'] = percentile_threshold
@@ -166,62 +439,56 @@ class ThresholdOptimizer:
             if len(df) < 100:
                 logger.warning(f"Skipping {instrument}: insufficient data ({len(df)} rows)")
                 continue
-                
-            df = df.set_index('datetime')
-            instrument_events = []
+            
+            valid_indices = df.index[df.index.notna()]
+            if len(valid_indices) < 100:
+                continue
             stats = self.background_stats.get(instrument, {})
             
-            for i in range(num_events):
-                valid_indices = df.index[df.index.notna()]
-                if len(valid_indices) < 100:
-                    continue
-                start_time = np.random.choice(valid_indices[50:-50])
-                duration_hours = np.random.uniform(2, 24)
-                end_time = start_time + pd.Timedelta(hours=duration_hours)
-                
-                event = {
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'duration_hours': duration_hours,
-                    'instrument': instrument,
-                    'is_synthetic': True
-                }
-                
-                if instrument == 'swepam':
-                    speed_stats = stats.get('Bulk_Speed', {'mean': 400, 'std': 100})
-                    density_stats = stats.get('Proton_Density', {'mean': 5, 'std': 2})
-                    temp_stats = stats.get('Ion_Temperature', {'mean': 1e5, 'std': 5e4})
-                    
-                    event['speed_enhancement'] = np.random.uniform(
-                        speed_stats['mean'] + speed_stats['std'],
-                        speed_stats['mean'] + 3 * speed_stats['std']
-                    )
-                    event['density_enhancement'] = np.random.uniform(1.5, 5)
-                    event['temp_depression'] = np.random.uniform(0.5, 0.8)
+            # Draw every event of this instrument at once
+            start_times = pd.DatetimeIndex(np.random.choice(valid_indices[50:-50], size=num_events))
+            duration_hours = np.random.uniform(2, 24, size=num_events)
+            events = {
+                'start_time': start_times,
+                'end_time': start_times + pd.to_timedelta(duration_hours, unit='h'),
+                'duration_hours': duration_hours,
+                'instrument': instrument,
+                'is_synthetic': True
+            }
+            
+            if instrument == 'swepam':
+                speed_stats = stats.get('Bulk_Speed', {'mean': 400, 'std': 100})
                 
-                elif instrument == 'mag':
-                    bt_stats = stats.get('Bt', {'mean': 5, 'std': 2})
-                    event['field_rotation'] = np.random.uniform(20, 60)
-                    event['field_enhancement'] = np.random.uniform(
-                        bt_stats['mean'] + bt_stats['std'],
-                        bt_stats['mean'] + 3 * bt_stats['std']
+                events['speed_enhancement'] = np.random.uniform(
+                    speed_stats['mean'] + speed_stats['std'],
+                    speed_stats['mean'] + 3 * speed_stats['std'],
+                    size=num_events
+                )
+                events['density_enhancement'] = np.random.uniform(1.5, 5, size=num_events)
+                events['temp_depression'] = np.random.uniform(0.5, 0.8, size=num_events)
+            
+            elif instrument == 'mag':
+                bt_stats = stats.get('Bt', {'mean': 5, 'std': 2})
+                events['field_rotation'] = np.random.uniform(20, 60, size=num_events)
+                events['field_enhancement'] = np.random.uniform(
+                    bt_stats['mean'] + bt_stats['std'],
+                    bt_stats['mean'] + 3 * bt_stats['std'],
+                    size=num_events
+                )
+            
+            elif instrument in ['epam', 'sis']:
+                proton_cols = [col for col in df.columns if 'Proton' in col and col not in ['YR', 'MO', 'DA', 'HH', 'MM']]
+                if proton_cols:
+                    proton_stats = stats.get(proton_cols[0], {'mean': 1e3, 'std': 1e2})
+                    events['particle_enhancement'] = np.random.uniform(
+                        proton_stats['mean'] + proton_stats['std'],
+                        proton_stats['mean'] + 3 * proton_stats['std'],
+                        size=num_events
                     )
-                
-                elif instrument in ['epam', 'sis']:
-                    proton_cols = [col for col in df.columns if 'Proton' in col and col not in ['YR', 'MO', 'DA', 'HH', 'MM']]
-                    if proton_cols:
-                        proton_stats = stats.get(proton_cols[0], {'mean': 1e3, 'std': 1e2})
-                        event['particle_enhancement'] = np.random.uniform(
-                            proton_stats['mean'] + proton_stats['std'],
-                            proton_stats['mean'] + 3 * proton_stats['std']
-                        )
-                
-                instrument_events.append(event)
             
-            synthetic_events.extend(instrument_events)
-            df = df.reset_index()
+            synthetic_events.append(pd.DataFrame(events))
         
-        self.synthetic_events = pd.DataFrame(synthetic_events)
+        self.synthetic_events = pd.concat(synthetic_events, ignore_index=True) if synthetic_events else pd.DataFrame()
         logger.info(f"Created {len(self.synthetic_events)} synthetic events")
         
         return self.synthetic_events
@@ -280,63 +547,66 @@ class ThresholdOptimizer:
     
     def _apply_thresholds_and_detect(self, thresholds):
         """Apply thresholds and perform detection"""
-        detections = []
+        frames = []
         
         for instrument, df in self.cme_system.processed_data.items():
             if len(df) == 0 or instrument not in thresholds:
                 continue
             
-            df = df.set_index('datetime')
             instrument_thresholds = thresholds[instrument]
-            detection_flags = pd.Series(False, index=df.index)
-            
-            for param, threshold in instrument_thresholds.items():
+            upper_params = []
+            lower_params = []
+            for param in instrument_thresholds:
                 if param in df.columns:
-                    if 'speed' in param.lower() or 'density' in param.lower() or 'proton' in param.lower():
-                        detection_flags |= (df[param] > threshold)
-                    elif 'temp' in param.lower():
-                        detection_flags |= (df[param] < threshold)
-            
-            detected_times = df[detection_flags].index
-            for det_time in detected_times:
-                detections.append({
-                    'detection_time': det_time,
-                    'instrument': instrument
-                })
+                    name = param.lower()
+                    if 'speed' in name or 'density' in name or 'proton' in name:
+                        upper_params.append(param)
+                    elif 'temp' in name:
+                        lower_params.append(param)
+
+            # Compare every parameter against its threshold at once and reduce across columns
+            detection_flags = np.zeros(len(df), dtype=bool)
+            if upper_params:
+                upper_limits = np.array([instrument_thresholds[p] for p in upper_params])
+                detection_flags |= (df[upper_params].to_numpy() > upper_limits).any(axis=1)
+            if lower_params:
+                lower_limits = np.array([instrument_thresholds[p] for p in lower_params])
+                detection_flags |= (df[lower_params].to_numpy() < lower_limits).any(axis=1)
             
-            df = df.reset_index()
-        
-        return pd.DataFrame(detections)
+            frames.append(pd.DataFrame({
+                'detection_time': df.index[detection_flags],
+                'instrument': instrument
+            }))
+        
+        if not frames:
+            return pd.DataFrame(columns=['detection_time', 'instrument'])
+        return pd.concat(frames, ignore_index=True)
     
     def _calculate_validation_metrics(self, detections, synthetic_events, tolerance_hours=2):
         """Calculate validation metrics"""
-        tolerance = timedelta(hours=tolerance_hours)
-        
-        true_positives = 0
-        false_negatives = 0
-        false_positives = 0
-        
-        detection_times = {(row['detection_time'], row['instrument']) for _, row in detections.iterrows()}
-        synthetic_times = {(row['start_time'], row['instrument']) for _, row in synthetic_events.iterrows()}
-        
-        for synth_time, instrument in synthetic_times:
-            matched = False
-            for det_time, det_instrument in detection_times:
-                if det_instrument == instrument and abs(det_time - synth_time) <= tolerance:
-                    true_positives += 1
-                    matched = True
-                    break
-            if not matched:
-                false_negatives += 1
-        
-        for det_time, instrument in detection_times:
-            matched = False
-            for synth_time, synth_instrument in synthetic_times:
-                if synth_instrument == instrument and abs(det_time - synth_time) <= tolerance:
-                    matched = True
-                    break
-            if not matched:
-                false_positives += 1
+        tolerance = pd.Timedelta(hours=tolerance_hours)
+        
+        # Distinct (time, instrument) pairs, sorted by time as merge_asof requires
+        synthetic_times = (synthetic_events[['start_time', 'instrument']].drop_duplicates()
+                           .astype({'start_time': 'datetime64[ns]'}).sort_values('start_time'))
+        if len(detections) > 0:
+            detection_times = (detections[['detection_time', 'instrument']].drop_duplicates()
+                               .astype({'detection_time': 'datetime64[ns]'}).sort_values('detection_time'))
+        else:
+            detection_times = pd.DataFrame({'detection_time': pd.Series(dtype='datetime64[ns]'),
+                                            'instrument': pd.Series(dtype=object)})
+        
+        # Nearest same-instrument neighbour within the tolerance, in both directions
+        synth_matches = pd.merge_asof(synthetic_times, detection_times, left_on='start_time',
+                                      right_on='detection_time', by='instrument',
+                                      tolerance=tolerance, direction='nearest')
+        det_matches = pd.merge_asof(detection_times, synthetic_times, left_on='detection_time',
+                                    right_on='start_time', by='instrument',
+                                    tolerance=tolerance, direction='nearest')
+        
+        true_positives = int(synth_matches['detection_time'].notna().sum())
+        false_negatives = len(synthetic_times) - true_positives
+        false_positives = int(det_matches['start_time'].isna().sum())
         
         precision = true_positives / (true_positives + false_positives) if (true_positives + false_positives) > 0 else 0
         recall = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0
@@ -364,15 +634,15 @@ class ThresholdOptimizer:
         self._plot_validation_metrics(axes[3])
         
         plt.tight_layout()
-        plt.savefig('threshold_analysis.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        fig.savefig('threshold_analysis.png', dpi=150)
+        plt.close(fig)
         
         logger.info("Threshold analysis plots saved as 'threshold_analysis.png'")
     
     def _plot_parameter_distributions(self, ax):
         """Plot parameter distributions with threshold lines"""
         if 'swepam' in self.cme_system.processed_data:
-            df = self.cme_system.processed_data['swepam'].set_index('datetime')
+            df = self.cme_system.processed_data['swepam']
             if 'Bulk_Speed' in df.columns:
                 ax.hist(df['Bulk_Speed'].dropna(), bins=50, alpha=0.7, density=True, label='Bulk Speed')
                 
@@ -475,24 +745,25 @@ class ThresholdOptimizer:
         
         report.append("BACKGROUND STATISTICS SUMMARY:")
         report.append("-" * 50)
+        # One table per instrument, formatted by pandas rather than value by value
         for instrument, stats_dict in self.background_stats.items():
             report.append(f"\n{instrument.upper()}:")
-            for param, stats in stats_dict.items():
-                report.append(f"  {param}:")
-                report.append(f"    Mean: {stats['mean']:.2f}")
-                report.append(f"    Std:  {stats['std']:.2f}")
-                report.append(f"    95th percentile: {stats['p95']:.2f}")
-                report.append(f"    Missing values: {stats['missing_count']}")
-        
+            if not stats_dict:
+                continue
+            stats_df = pd.DataFrame.from_dict(stats_dict, orient='index')
+            stats_df = stats_df[['mean', 'std', 'p95', 'missing_count']]
+            stats_df.columns = ['Mean', 'Std', '95th percentile', 'Missing values']
+            report.append(stats_df.to_string(float_format='{:.2f}'.format))
+
         report.append("\n\nOPTIMAL THRESHOLDS:")
         report.append("-" * 50)
         for instrument, instrument_thresholds in self.optimal_thresholds.items():
             report.append(f"\n{instrument.upper()}:")
-            for param, param_thresholds in instrument_thresholds.items():
-                report.append(f"  {param}:")
-                for threshold_type, value in param_thresholds.items():
-                    if 'upper' in threshold_type:
-                        report.append(f"    {threshold_type}: {value:.2f}")
+            if not instrument_thresholds:
+                continue
+            thresholds_df = pd.DataFrame.from_dict(instrument_thresholds, orient='index')
+            thresholds_df = thresholds_df[[col for col in thresholds_df.columns if 'upper' in col]]
+            report.append(thresholds_df.to_string(float_format='{:.2f}'.format))
         
         report.append("\n\nVALIDATION RESULTS:")
         report.append("-" * 50)
@@ -3,135 +3,167 @@ import spacepy.pycdf as pycdf
 import pandas as pd
 import numpy as np
 import os
+import warnings
+from datetime import datetime
+from numba import njit, prange
 
 # Constants
 FILL_VALUE = -1.0e31
 k_B = 1.381e-23
 m_p = 1.673e-27
+# Folded temperature constants: T_exp = T_EXP_COEF * v**0.67, T_obs = (t*1000)**2 * MP_OVER_2KB
+T_EXP_COEF = 3.0e4 / 100.0 ** 0.67
+MP_OVER_2KB = m_p / (2.0 * k_B)
+
+
+def _make_col(arr, primary_len, pad_value):
+    """
+    Build one full-length column from a 0-d or 1-d CDF array with a typed dtype:
+    numbers stay numeric (float64 when padding is needed), epochs become
+    datetime64[ns] padded with NaT, and only other content falls back to object.
+    """
+    if arr.dtype == object and arr.size and isinstance(arr.flat[0], datetime):
+        arr = arr.astype('datetime64[ns]')
+    kind = arr.dtype.kind
+    if arr.ndim == 0:
+        return np.full(primary_len, arr[()], dtype=arr.dtype if kind in 'fiubM' else object)
+    if kind in 'fiubM' and arr.shape[0] == primary_len:
+        # already full length: keep the typed array as is
+        return arr
+    if kind == 'M':
+        col = np.full(primary_len, np.datetime64('NaT'), dtype=arr.dtype)
+    else:
+        # padding needs NaN, so numeric columns widen to float64 rather than object
+        col = np.full(primary_len, pad_value, dtype=np.float64 if kind in 'fiub' else object)
+    length = min(primary_len, arr.shape[0])
+    col[:length] = arr[:length]
+    return col
 
 
 def cdf_to_csv(cdf_path, max_rows=None, pad_value=np.nan):
     """
     Convert a CDF to pandas DataFrame handling multi-dimensional variables.
-    Keeps object dtype for mixed content; numeric arrays remain numeric.
+    Keeps object dtype for mixed content; numeric arrays keep their dtype, widened to
+    float64 only when they need NaN padding, and epochs are stored as datetime64[ns].
     """
-    cdf = pycdf.CDF(cdf_path)
-
-    # read all variables first
-    raw_vars = {}
-    for var in cdf:
-        arr = cdf[var][...]
-        if hasattr(arr, 'filled'):
-            arr = arr.filled(np.nan)
-        arr = np.asarray(arr)
-        raw_vars[var] = arr
-
-    # determine primary length
-    lengths = []
-    for arr in raw_vars.values():
-        if arr.ndim == 0:
-            lengths.append(1)
-        else:
-            lengths.append(arr.shape[0])
-    primary_len = int(max(lengths)) if lengths else 0
-    if primary_len == 0:
-        raise ValueError("No data found in CDF.")
-
-    # build columns
     columns = {}
-    for name, arr in raw_vars.items():
-        if arr.ndim == 0:
-            columns[name] = np.full(primary_len, arr.item(), dtype=object)
-        elif arr.ndim == 1:
-            col = np.full(primary_len, pad_value, dtype=object)
-            length = min(primary_len, arr.shape[0])
-            col[:length] = arr[:length]
-            columns[name] = col
-        else:
-            # multi-dim: if first axis equals primary_len, flatten remaining dims
-            if arr.shape[0] == primary_len:
-                rest_shape = arr.shape[1:]
-                ncols = int(np.prod(rest_shape))
-                reshaped = arr.reshape((primary_len, ncols))
-                for i in range(ncols):
-                    columns[f"{name}_{i}"] = reshaped[:, i]
-            elif arr.shape[-1] == primary_len:
-                # if time axis is last, move it to first then flatten
-                reshaped = np.moveaxis(arr, -1, 0)
-                ncols = int(np.prod(reshaped.shape[1:]))
-                reshaped = reshaped.reshape((primary_len, ncols))
-                for i in range(ncols):
-                    columns[f"{name}_{i}"] = reshaped[:, i]
+    with pycdf.CDF(cdf_path) as cdf:
+        # determine primary length from the variable headers, before reading any data
+        shapes = {name: cdf[name].shape for name in cdf}
+        primary_len = int(max((shape[0] if shape else 1 for shape in shapes.values()), default=0))
+        if primary_len == 0:
+            raise ValueError("No data found in CDF.")
+        n_rows = min(primary_len, max_rows) if max_rows else primary_len
+
+        # read one variable at a time and turn it into columns straight away, so at most
+        # one raw variable is held next to the output; only the kept rows are read
+        for name, shape in shapes.items():
+            time_first = bool(shape) and shape[0] == primary_len
+            arr = cdf[name][:n_rows] if time_first else cdf[name][...]
+            if hasattr(arr, 'filled'):
+                arr = arr.filled(np.nan)
+            arr = np.asarray(arr)
+
+            if arr.ndim <= 1:
+                columns[name] = _make_col(arr, n_rows, pad_value)
             else:
-                # fallback: store each row as list/object
-                col = np.full(primary_len, pad_value, dtype=object)
-                for i in range(min(arr.shape[0], primary_len)):
-                    col[i] = arr[i].tolist()
-                columns[name] = col
-
-    df = pd.DataFrame(columns)
-    if max_rows:
-        df = df.head(max_rows)
-    return df
+                # multi-dim: bring the time axis to the front if it is last, then flatten
+                # the remaining dims into one column each
+                if not time_first and shape[-1] == primary_len:
+                    arr = np.moveaxis(arr, -1, 0)[:n_rows]
+                    time_first = True
+                if time_first:
+                    reshaped = arr.reshape(n_rows, -1)
+                    columns.update(zip([f"{name}_{i}" for i in range(reshaped.shape[1])], reshaped.T))
+                else:
+                    # fallback: store each row as list/object
+                    col = np.full(n_rows, pad_value, dtype=object)
+                    for i in range(min(arr.shape[0], n_rows)):
+                        col[i] = arr[i].tolist()
+                    columns[name] = col
+
+    return pd.DataFrame(columns)
+
+
+# 'contract' allows FMA; the full fastmath set would assume away the NaN/inf checks below
+@njit(cache=True, fastmath={'contract'}, error_model='numpy')
+def _cme_score_kernel(pd_arr, v_arr, t_arr, a_arr):
+    """
+    Fused per-sample CME score: all four weighted terms in one pass, no temporaries.
+    """
+    n = pd_arr.shape[0]
+    score = np.empty(n)
+    for i in range(n):
+        p, v, t, a = pd_arr[i], v_arr[i], t_arr[i], a_arr[i]
+
+        # Validity packed into 3 bits (exclude fill values and non-finite):
+        # bit 0 proton density+speed, bit 1 alpha density, bit 2 thermal speed
+        m = ((p > FILL_VALUE and np.isfinite(p) and v > FILL_VALUE and np.isfinite(v)) * 1
+             | (a > FILL_VALUE and np.isfinite(a)) * 2
+             | (t > FILL_VALUE and np.isfinite(t)) * 4)
+        if m == 0:
+            score[i] = 0.0
+            continue
+
+        s = 0.0
+        if m & 1:
+            # Alpha ratio score (0.4)
+            if m & 2 and p > 0:
+                s += 0.4 * min(max((a / p - 0.003) / 0.008, 0.0), 1.0)
+
+            # Speed score (0.4)
+            s += 0.4 * min(max((v - 380.0) / 200.0, 0.0), 1.0)
+
+            # Temperature score (0.1); v > 0 keeps the fractional power real
+            if m & 4 and v > 0:
+                T_exp = T_EXP_COEF * v ** 0.67
+                T_obs = ((t * 1000.0) ** 2) * MP_OVER_2KB
+                T_ratio = T_obs / T_exp
+                if T_ratio < 0.5 and np.isfinite(T_ratio):
+                    s += 0.1 * max(0.0, 1.0 - 2.0 * T_ratio)
+
+        # Quality score (0.1): one third per valid group
+        s += 0.1 * (((m & 1) + ((m >> 1) & 1) + ((m >> 2) & 1)) / 3.0)
+        score[i] = s
+    return score
 
 
 def calculate_cme_score(proton_density, proton_bulk_speed, proton_thermal, alpha_density):
     """
     Vectorized CME score calculator that accepts pandas Series or numpy arrays.
-    Returns a pandas Series if input was pandas Series, else numpy array.
+    Returns a numpy array aligned to the input by position.
     """
-    is_series = isinstance(proton_density, (pd.Series, pd.Index))
-    idx = proton_density.index if is_series else None
-
     pd_arr = np.asarray(proton_density, dtype=float)
     v_arr = np.asarray(proton_bulk_speed, dtype=float)
     t_arr = np.asarray(proton_thermal, dtype=float)
     a_arr = np.asarray(alpha_density, dtype=float)
 
-    # Validity masks (exclude fill values and non-finite)
-    valid_proton = (pd_arr > FILL_VALUE) & np.isfinite(pd_arr) & (v_arr > FILL_VALUE) & np.isfinite(v_arr)
-    valid_alpha = (a_arr > FILL_VALUE) & np.isfinite(a_arr)
-    valid_thermal = (t_arr > FILL_VALUE) & np.isfinite(t_arr)
-
-    score = np.zeros_like(pd_arr, dtype=float)
-
-    # Alpha ratio score (0.4)
-    denom_ok = pd_arr > 0
-    mask_alpha = valid_proton & valid_alpha & denom_ok
-    alpha_ratio = np.zeros_like(pd_arr, dtype=float)
-    alpha_ratio[mask_alpha] = a_arr[mask_alpha] / pd_arr[mask_alpha]
-    alpha_scaled = np.clip((alpha_ratio - 0.003) / 0.008, 0, 1)
-    score += 0.4 * alpha_scaled
-
-    # Speed score (0.4)
-    mask_speed = valid_proton
-    speed_scaled = np.zeros_like(pd_arr, dtype=float)
-    speed_scaled[mask_speed] = np.clip((v_arr[mask_speed] - 380.0) / 200.0, 0.0, 1.0)
-    score += 0.4 * speed_scaled
-
-    # Temperature score (0.1)
-    mask_temp = valid_proton & valid_thermal & (v_arr > 0)
-    if np.any(mask_temp):
-        v_masked = v_arr[mask_temp]
-        t_masked = t_arr[mask_temp]
-        # expected temperature (avoid fractional power on negative values by masking v>0)
-        T_exp = 3.0 * (v_masked / 100.0) ** 0.67 * 1e4
-        T_obs = ((t_masked * 1000.0) ** 2) * m_p / (2.0 * k_B)
-        # avoid divide-by-zero or nan
-        safe_T_exp = np.where(T_exp > 0, T_exp, np.nan)
-        T_ratio = T_obs / safe_T_exp
-        temp_contrib = np.zeros_like(T_ratio)
-        cond = (T_ratio < 0.5) & np.isfinite(T_ratio)
-        temp_contrib[cond] = np.maximum(0.0, 1.0 - 2.0 * T_ratio[cond])
-        score[mask_temp] += 0.1 * temp_contrib
-
-    # Quality score (0.1)
-    valid_count = valid_proton.astype(int) + valid_alpha.astype(int) + valid_thermal.astype(int)
-    score += 0.1 * (valid_count / 3.0)
-
-    if idx is not None:
-        return pd.Series(score, index=idx)
-    return score
+    return _cme_score_kernel(pd_arr, v_arr, t_arr, a_arr)
+
+
+@njit(cache=True)
+def _speed_signatures_kernel(ps, out_scores, out_rapid, out_accel, out_accel_changes):
+    """
+    Single pass over the speeds filling all four detect_cme_speed_signatures outputs.
+    speed change i is ps[i] - ps[i-1] and acceleration change i is the difference of
+    consecutive speed changes, both taken as 0 at i = 0.
+    """
+    prev_change = 0.0
+    for i in range(ps.shape[0]):
+        v = ps[i]
+        # enhancement score mapping
+        if v > FILL_VALUE and np.isfinite(v):
+            out_scores[i] = min(max((v - 380.0) / 200.0, 0.0), 1.0)
+        else:
+            out_scores[i] = 0.0
+
+        change = v - ps[i - 1] if i > 0 else 0.0
+        out_rapid[i] = change > 5.0 and np.isfinite(change)
+
+        accel_change = change - prev_change if i > 0 else 0.0
+        out_accel_changes[i] = accel_change
+        out_accel[i] = accel_change > 2.0 and np.isfinite(accel_change)
+        prev_change = change
 
 
 def detect_cme_speed_signatures(proton_speeds):
@@ -148,26 +180,44 @@ def detect_cme_speed_signatures(proton_speeds):
     if n == 0:
         return np.zeros(0, dtype=float), np.zeros(0, dtype=bool), np.zeros(0, dtype=bool), np.zeros(0, dtype=float)
 
-    # enhancement score mapping
-    valid = (ps > FILL_VALUE) & np.isfinite(ps)
-    enhancement_scores = np.zeros(n, dtype=float)
-    enhancement_scores[valid] = np.clip((ps[valid] - 380.0) / 200.0, 0.0, 1.0)
+    enhancement_scores = np.empty(n, dtype=float)
+    rapid_increases = np.empty(n, dtype=bool)
+    accelerations = np.empty(n, dtype=bool)
+    acceleration_changes = np.empty(n, dtype=float)
+    _speed_signatures_kernel(ps, enhancement_scores, rapid_increases, accelerations, acceleration_changes)
 
-    # speed first differences (aligned so diff[i] = ps[i] - ps[i-1], diff[0]=0)
-    speed_changes = np.empty(n, dtype=float)
-    speed_changes[0] = 0.0
-    speed_changes[1:] = ps[1:] - ps[:-1]
+    return enhancement_scores, rapid_increases, accelerations, acceleration_changes
 
-    rapid_increases = (speed_changes > 5.0) & np.isfinite(speed_changes)
 
-    # second diff (acceleration): accel[i] = speed_changes[i] - speed_changes[i-1], accel[0]=0
-    acceleration_changes = np.empty(n, dtype=float)
-    acceleration_changes[0] = 0.0
-    acceleration_changes[1:] = speed_changes[1:] - speed_changes[:-1]
+@njit(cache=True, parallel=True)
+def _valid_bits(a, p, v, t):
+    """
+    Validity of all four inputs packed into one byte per sample, in a single pass
+    (finite and above the fill value): bit 0 alpha, bit 1 proton density,
+    bit 2 bulk speed, bit 3 thermal speed.
+    """
+    out = np.empty(a.shape[0], dtype=np.uint8)
+    for i in prange(a.shape[0]):
+        out[i] = ((a[i] > FILL_VALUE and np.isfinite(a[i])) * 1
+                  | (p[i] > FILL_VALUE and np.isfinite(p[i])) * 2
+                  | (v[i] > FILL_VALUE and np.isfinite(v[i])) * 4
+                  | (t[i] > FILL_VALUE and np.isfinite(t[i])) * 8)
+    return out
 
-    accelerations = (acceleration_changes > 2.0) & np.isfinite(acceleration_changes)
 
-    return enhancement_scores, rapid_increases, accelerations, acceleration_changes
+@njit(cache=True, parallel=True, fastmath={'contract'}, error_model='numpy')
+def _temp_flag_kernel(v, t, valid, out_flag):
+    """
+    Temperature depression flag in one fused pass: T_obs below half the speed-expected T_exp.
+    """
+    for i in prange(v.shape[0]):
+        flag = False
+        # speed and thermal bits of the packed validity (see _valid_bits)
+        if (valid[i] & 12) == 12 and v[i] > 0:
+            T_exp = T_EXP_COEF * v[i] ** 0.67
+            T_obs = ((t[i] * 1000.0) ** 2) * MP_OVER_2KB
+            flag = T_exp > 0 and np.isfinite(T_exp) and np.isfinite(T_obs) and T_obs < 0.5 * T_exp
+        out_flag[i] = flag
 
 
 def detect_cme_thresholds(alpha_density, proton_density, proton_bulk_speed, proton_thermal):
@@ -183,13 +233,16 @@ def detect_cme_thresholds(alpha_density, proton_density, proton_bulk_speed, prot
     n = max(a.size, p.size, v.size, t.size)
     # Broadcast to same length when needed (if they are same length usually)
     def _broadcast(arr):
-        if arr.size == n:
+        size = arr.size
+        if size == n:
             return arr
-        if arr.size == 1:
+        if size == 1:
             return np.full(n, arr.item(), dtype=float)
-        # attempt to pad/truncate
-        out = np.full(n, np.nan, dtype=float)
-        out[:min(arr.size, n)] = arr[:min(arr.size, n)]
+        # attempt to pad/truncate: copy the head once, NaN only the tail
+        out = np.empty(n, dtype=float)
+        k = min(size, n)
+        np.copyto(out[:k], arr[:k])
+        out[k:] = np.nan
         return out
 
     a = _broadcast(a)
@@ -197,36 +250,24 @@ def detect_cme_thresholds(alpha_density, proton_density, proton_bulk_speed, prot
     v = _broadcast(v)
     t = _broadcast(t)
 
-    # Masks for valid (exclude fill and non-finite)
-    valid_a = (a > FILL_VALUE) & np.isfinite(a)
-    valid_p = (p > FILL_VALUE) & np.isfinite(p)
-    valid_v = (v > FILL_VALUE) & np.isfinite(v)
-    valid_t = (t > FILL_VALUE) & np.isfinite(t)
+    # Packed validity for all four inputs (exclude fill and non-finite)
+    v = np.ascontiguousarray(v)
+    t = np.ascontiguousarray(t)
+    valid = _valid_bits(np.ascontiguousarray(a), np.ascontiguousarray(p), v, t)
 
-    # Alpha/proton ratio (avoid division by zero)
-    alpha_proton_ratio = np.zeros(n, dtype=float)
-    denom = p != 0
-    valid_ratio = denom & valid_a & valid_p
-    alpha_proton_ratio[valid_ratio] = a[valid_ratio] / p[valid_ratio]
-    alpha_flag = np.zeros(n, dtype=bool)
-    alpha_flag[valid_ratio] = alpha_proton_ratio[valid_ratio] > 0.08
+    # Alpha/proton ratio > 0.08 wherever p != 0, negative densities included; invalid
+    # rows are masked out afterwards, so their overflow or NaN is ignored
+    nonzero_p = p != 0
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        ratio = a / np.where(nonzero_p, p, 1.0)
+    alpha_flag = ((valid & 3) == 3) & nonzero_p & (ratio > 0.08)
 
     # Bulk speed threshold
-    speed_flag = np.zeros(n, dtype=bool)
-    speed_flag[valid_v] = v[valid_v] > 450.0
+    speed_flag = ((valid & 4) != 0) & (v > 450.0)
 
     # Temperature depression: compute only where v>0 and t valid
-    temp_flag = np.zeros(n, dtype=bool)
-    mask_temp = valid_v & (v > 0) & valid_t
-    if np.any(mask_temp):
-        v_masked = v[mask_temp]
-        t_masked = t[mask_temp]
-        T_exp = 3.0 * (v_masked / 100.0) ** 0.67 * 1e4
-        T_obs = ((t_masked * 1000.0) ** 2) * m_p / (2.0 * k_B)
-        finite_mask = np.isfinite(T_exp) & (T_exp > 0) & np.isfinite(T_obs)
-        compare_mask = finite_mask & (T_obs < 0.5 * T_exp)
-        temp_indices = np.nonzero(mask_temp)[0]
-        temp_flag[temp_indices[compare_mask]] = True
+    temp_flag = np.empty(n, dtype=bool)
+    _temp_flag_kernel(v, t, valid, temp_flag)
 
     return alpha_flag, speed_flag, temp_flag
 
@@ -238,13 +279,15 @@ def compute_empirical_threshold(data, method='percentile', param=95, nan_fill_va
     - param: percentile (0-100) or number of sigma
     """
     arr = np.asarray(data, dtype=float)
-    valid = (~np.isnan(arr)) & (arr != nan_fill_value) & np.isfinite(arr)
+    # isfinite already excludes NaN, so one extra comparison covers the fill value
+    valid = np.isfinite(arr) & (arr != nan_fill_value)
     clean = arr[valid]
     if clean.size == 0:
         raise ValueError("No valid data points for threshold computation.")
 
     if method == 'percentile':
-        return np.percentile(clean, param)
+        # clean is a fresh copy from the boolean gather, so it can be partitioned in place
+        return np.percentile(clean, param, overwrite_input=True)
     elif method == 'mean_sigma':
         mu = clean.mean()
         sigma = clean.std()
@@ -252,30 +295,23 @@ def compute_empirical_threshold(data, method='percentile', param=95, nan_fill_va
     else:
         raise ValueError("method must be 'percentile' or 'mean_sigma'")
 
-def _align_series_to_index(series_like, target_index):
+def _align_frame_to_index(df, columns, target_index):
     """
-    Align a Series/1D-array to target_index length:
-      - If series_like has same index (pandas Series): reindex to target_index
-      - If it's a numpy array or Series with different length: pad with NaN or truncate
-    Returns a pandas Series indexed by target_index.
+    Select columns from df aligned to target_index in one reindex:
+      - Missing columns and rows are filled with NaN
+      - If df's index cannot be reindexed (e.g. duplicate labels), align by
+        position instead: pad with NaN or truncate to target_index length
+    Returns a pandas DataFrame indexed by target_index.
     """
-    # If pandas Series and index matches/overlaps, reindex (keeps values where possible)
-    if isinstance(series_like, pd.Series):
-        try:
-            return series_like.reindex(target_index)
-        except Exception:
-            # fallback to length-based alignment
-            arr = series_like.to_numpy()
-    else:
-        arr = np.asarray(series_like)
-
-    n_target = len(target_index)
-    out = np.full(n_target, np.nan, dtype=float)
-    take = min(len(arr), n_target)
-    out[:take] = arr[:take]
-    return pd.Series(out, index=target_index)
-
-def main(L1_AUX_path, L2_BLK_path, out_csv='final_output_01.csv'):
+    try:
+        return df.reindex(index=target_index, columns=columns)
+    except ValueError:
+        # fallback to length-based alignment
+        take = min(len(df), len(target_index))
+        head = df.iloc[:take].set_axis(target_index[:take], axis=0)
+        return head.reindex(index=target_index, columns=columns)
+
+def main(L1_AUX_path, L2_BLK_path, out_csv='final_output_01.csv', out_format='parquet'):
     # Load dataframes from CDFs
     print("Reading CDFs (this may take a moment)...")
     L1_AUX_data = cdf_to_csv(L1_AUX_path)
@@ -290,17 +326,22 @@ def main(L1_AUX_path, L2_BLK_path, out_csv='final_output_01.csv'):
     # Build results container indexed by L2_BLK (we treat L2 as the main timeline)
     final_output = pd.DataFrame(index=L2_BLK_data.index)
 
+    # Pull the four plasma columns out of pandas once, column-major so each
+    # column is a contiguous float64 view shared by all the detectors below
+    plasma = np.asfortranarray(L2_BLK_data[required].to_numpy(dtype=np.float64))
+    proton_density, proton_bulk_speed, proton_thermal, alpha_density = plasma.T
+
     # Continuous CME-like score (0-1-ish)
     final_output['score'] = calculate_cme_score(
-        L2_BLK_data['proton_density'],
-        L2_BLK_data['proton_bulk_speed'],
-        L2_BLK_data['proton_thermal'],
-        L2_BLK_data['alpha_density']
+        proton_density,
+        proton_bulk_speed,
+        proton_thermal,
+        alpha_density
     )
 
     # Speed-based signatures (returns 4 items)
     scores, rapid_increases, accelerations, acceleration_changes = detect_cme_speed_signatures(
-        L2_BLK_data['proton_bulk_speed']
+        proton_bulk_speed
     )
     final_output['speed_enhancement'] = scores
     final_output['rapid_increase'] = rapid_increases
@@ -309,23 +350,26 @@ def main(L1_AUX_path, L2_BLK_path, out_csv='final_output_01.csv'):
 
     # Threshold-based flags
     alpha_flag, speed_flag, temp_flag = detect_cme_thresholds(
-        L2_BLK_data['alpha_density'],
-        L2_BLK_data['proton_density'],
-        L2_BLK_data['proton_bulk_speed'],
-        L2_BLK_data['proton_thermal']
+        alpha_density,
+        proton_density,
+        proton_bulk_speed,
+        proton_thermal
     )
     final_output['alpha_flag'] = alpha_flag
     final_output['speed_flag'] = speed_flag
     final_output['temp_flag'] = temp_flag
 
     # Compute empirical thresholds for sensible variables (returns dict)
+    # all four at once from the plasma buffer: mask invalid samples to NaN in one pass,
+    # then take the 95th percentile per column (all-NaN columns give None, as before)
+    masked = np.where(np.isfinite(plasma) & (plasma != FILL_VALUE), plasma, np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        percentiles = dict(zip(required, np.nanpercentile(masked, 95, axis=0).tolist()))
     thresholds = {}
     for var in ['alpha_density', 'proton_density', 'proton_bulk_speed', 'proton_thermal']:
-        if var in L2_BLK_data.columns:
-            try:
-                thresholds[var] = compute_empirical_threshold(L2_BLK_data[var], method='percentile', param=95)
-            except ValueError:
-                thresholds[var] = None
+        value = percentiles[var]
+        thresholds[var] = None if np.isnan(value) else value
 
     # Requested AUX and BLK columns (de-duplicate lists)
     AUX_column = [
@@ -339,43 +383,59 @@ def main(L1_AUX_path, L2_BLK_path, out_csv='final_output_01.csv'):
     AUX_column_unique = list(dict.fromkeys(AUX_column))
     BLK_column_unique = list(dict.fromkeys(BLK_column))
 
-    # Select columns from AUX and BLK (use NaN for missing columns)
-    aux_sel = pd.DataFrame(index=L2_BLK_data.index)  # align to L2 index
-    blk_sel = pd.DataFrame(index=L2_BLK_data.index)
-
-    for col in AUX_column_unique:
-        if col in L1_AUX_data.columns:
-            # try to align by index; if lengths differ, broadcast/pad/truncate safely
-            aux_sel[col] = _align_series_to_index(L1_AUX_data[col], L2_BLK_data.index)
-        else:
-            aux_sel[col] = np.nan
-
-    for col in BLK_column_unique:
-        if col in L2_BLK_data.columns:
-            blk_sel[col] = _align_series_to_index(L2_BLK_data[col], L2_BLK_data.index)
-        else:
-            blk_sel[col] = np.nan
+    # Select columns from AUX and BLK aligned to the L2 index (NaN for missing columns)
+    aux_sel = _align_frame_to_index(L1_AUX_data, AUX_column_unique, L2_BLK_data.index)
+    blk_sel = L2_BLK_data.reindex(columns=BLK_column_unique)
 
     # Combine everything: BLK selections, AUX selections, and the computed flags/scores
     # Note: final_output already carries the computed metrics and is indexed by L2_BLK_data.index
-    combined = pd.concat([blk_sel, aux_sel, final_output], axis=1)
+    combined = pd.concat([blk_sel, aux_sel, final_output], axis=1, copy=False)
 
-    # Reset index so time/index is saved as a column in CSV (rename 'index' -> 'timestamp' if desired)
-    combined = combined.reset_index()
+    if out_format == 'parquet':
+        # Columnar binary write; the index is kept in the file metadata
+        out_path = os.path.splitext(out_csv)[0] + '.parquet'
+        try:
+            combined.to_parquet(out_path, engine='pyarrow', compression='zstd')
+        except ImportError:
+            print("pyarrow not available, falling back to CSV")
+            out_format = 'csv'
+
+    if out_format == 'csv':
+        # Reset index so time/index is saved as a column in CSV (rename 'index' -> 'timestamp' if desired)
+        combined = combined.reset_index()
+        out_path = out_csv
+        combined.to_csv(out_path, index=False)
 
-    # Save to CSV
-    combined.to_csv(out_csv, index=False)
+    print(f"Saved output to: {out_path}")
 
     return combined, thresholds
 
 
+def _warm_up_kernels():
+    """
+    Compile (or load from the on-disk cache) every Numba kernel on a tiny input,
+    so the first real call in main does not pay the JIT cost.
+    """
+    x = np.zeros(4)
+    _cme_score_kernel(x, x, x, x)
+    _speed_signatures_kernel(x, np.empty(4), np.empty(4, dtype=bool), np.empty(4, dtype=bool), np.empty(4))
+    _temp_flag_kernel(x, x, _valid_bits(x, x, x, x), np.empty(4, dtype=bool))
+
+
+try:
+    _warm_up_kernels()
+except Exception as e:
+    # compilation problems resurface with a full traceback on first real use
+    print("Numba warm-up failed:", type(e).__name__, e)
+
+
 if __name__ == "__main__":
     # Example usage - update paths to your local files if needed
     L1_AUX = 'swis_2025Oct02T114501986/AL1_ASW91_L1_AUX_20250930_UNP_9999_999999_V01.cdf'
     L2_BLK = 'swis_2025Oct02T114501986/AL1_ASW91_L2_BLK_20250930_UNP_9999_999999_V02.cdf'
     try:
         result, threshold = main(L1_AUX, L2_BLK)
-        print("Processing completed. Output saved to final_output_01.csv")
+        print("Processing completed.")
         print(f"Output shape: {result.shape}")
         print(f"Columns: {list(result.columns)}")
         print("Thresholds (95th percentile):", threshold)
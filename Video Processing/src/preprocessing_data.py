@@ -4,6 +4,10 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from spacepy import pycdf
 
+# Folded temperature constants: T_exp = T_EXP_COEF * v**0.67, T_obs = (t*1000)**2 * MP_OVER_2KB
+T_EXP_COEF = 3.0e4 / 100.0 ** 0.67
+MP_OVER_2KB = 1.673e-27 / (2.0 * 1.381e-23)
+
 
 def cdf_to_csv(cdf_path, csv_path, max_rows=None, pad_value=np.nan):
     """
@@ -157,7 +161,6 @@ def calculate_cme_score(proton_density, proton_bulk_speed, proton_thermal, alpha
     a_arr = np.asarray(alpha_density, dtype=float)
 
     FILL_VALUE = -1.0e31
-    k_B, m_p = 1.381e-23, 1.673e-27
 
     # Validity masks
     valid_proton = (pd_arr > FILL_VALUE) & (v_arr > FILL_VALUE)
@@ -174,13 +177,18 @@ def calculate_cme_score(proton_density, proton_bulk_speed, proton_thermal, alpha
     alpha_ratio = np.zeros_like(pd_arr, dtype=float)
     alpha_ratio[mask_alpha] = a_arr[mask_alpha] / pd_arr[mask_alpha]
     # scaled into [0,1] where 0.003->0 and 0.011->1 (as in your original)
-    alpha_scaled = np.clip((alpha_ratio - 0.003) / 0.008, 0, 1)
-    score += 0.4 * alpha_scaled
+    # (scaled in place in the alpha_ratio buffer to avoid temporaries)
+    np.subtract(alpha_ratio, 0.003, out=alpha_ratio)
+    np.multiply(alpha_ratio, 1.0 / 0.008, out=alpha_ratio)
+    np.clip(alpha_ratio, 0.0, 1.0, out=alpha_ratio)
+    score += 0.4 * alpha_ratio
 
     # --- Speed score (0.4 weight) ---
     mask_speed = valid_proton
-    speed_scaled = np.zeros_like(pd_arr, dtype=float)
-    speed_scaled[mask_speed] = np.clip((v_arr[mask_speed] - 380) / 200, 0, 1)
+    speed_scaled = np.subtract(v_arr, 380.0)
+    np.multiply(speed_scaled, 1.0 / 200.0, out=speed_scaled)
+    np.clip(speed_scaled, 0.0, 1.0, out=speed_scaled)
+    speed_scaled[~mask_speed] = 0.0
     score += 0.4 * speed_scaled
 
     # --- Temperature score (0.1 weight) ---
@@ -188,10 +196,10 @@ def calculate_cme_score(proton_density, proton_bulk_speed, proton_thermal, alpha
     mask_temp = valid_proton & valid_thermal
     if np.any(mask_temp):
         # Expected temperature (T_exp) (matches your formula)
-        T_exp = 3.0 * (v_arr[mask_temp] / 100.0) ** 0.67 * 1e4  # same units as original
+        T_exp = T_EXP_COEF * v_arr[mask_temp] ** 0.67  # same units as original
         # Observed temperature (T_obs) using given relation
         # (proton_thermal * 1000)**2 * m_p / (2 * k_B)
-        T_obs = ((t_arr[mask_temp] * 1000.0) ** 2) * m_p / (2.0 * k_B)
+        T_obs = ((t_arr[mask_temp] * 1000.0) ** 2) * MP_OVER_2KB
         # Avoid negative/zero T_exp
         safe_T_exp = np.where(T_exp > 0, T_exp, np.nan)
         T_ratio = T_obs / safe_T_exp
@@ -202,8 +210,9 @@ def calculate_cme_score(proton_density, proton_bulk_speed, proton_thermal, alpha
         score[mask_temp] += 0.1 * temp_contrib
 
     # --- Quality score (0.1 weight) ---
-    valid_count = valid_proton.astype(int) + valid_alpha.astype(int) + valid_thermal.astype(int)
-    score += 0.1 * (valid_count / 3.0)
+    # bool masks are 1-byte, so a uint8 view counts them without int64 copies
+    valid_count = valid_proton.view(np.uint8) + valid_alpha.view(np.uint8) + valid_thermal.view(np.uint8)
+    score += (0.1 / 3.0) * valid_count
 
     # Return pandas Series if input was Series, else numpy array
     if idx is not None:
@@ -2,61 +2,292 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 # import seborn as sns
+import argparse
 import os
+import queue
+import re
+import threading
 import cv2
 import sunpy.map
 import matplotlib.pyplot as plt
 from astropy.io import fits
 import matplotlib.pyplot as plt
+from collections import deque
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from numba import njit
 
-def video_gen(path):
-    import cv2
-    import os
+# Number of images decoded ahead of the encoder
+PREFETCH = 8
+DIGITS_RE = re.compile(r'(\d+)')
 
-    # Folder containing your 91 sun images
-    image_folder = path
-    output_video = 'sun_video.avi'
-    images = [img for img in sorted(os.listdir(image_folder)) if img.endswith('.png') or img.endswith('.jpg')]
-    frame = cv2.imread(os.path.join(image_folder, images[0]))
+def _bounded_map(executor, fn, items, window):
+    # Yield fn(item) in order with at most `window` calls submitted and not yet consumed,
+    # so finished results never pile up faster than the caller takes them
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _prefetch(fn, items, window=PREFETCH):
+    # Yield fn(item) in order while up to `window` calls run ahead on worker threads
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        yield from _bounded_map(executor, fn, items, window)
+
+class _CudaVideoWriter:
+    # cv2.VideoWriter-like wrapper around the NVENC writer: frames are uploaded
+    # into one reused GpuMat before encoding
+    def __init__(self, output_video, size, fps):
+        self._writer = cv2.cudacodec.createVideoWriter(output_video, size, cv2.cudacodec.H264, fps,
+                                                       cv2.cudacodec.ColorFormat_BGR)
+        self._gpu_frame = cv2.cuda_GpuMat()
+
+    def write(self, frame):
+        self._gpu_frame.upload(frame)
+        self._writer.write(self._gpu_frame)
+
+    def release(self):
+        self._writer.release()
+
+class ThreadedVideoWriter:
+    # Wraps a video writer so write() only enqueues and a background thread does the
+    # encoding; the caller keeps decoding/rendering the next frames meanwhile
+    def __init__(self, writer, maxsize=8):
+        self._writer = writer
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+
+    def _consume(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            if self._error is None:
+                try:
+                    self._writer.write(frame)
+                except Exception as e:
+                    # keep draining so write() never blocks; reported by release()
+                    self._error = e
+
+    def write(self, frame):
+        self._queue.put(frame)
+
+    def release(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._writer.release()
+        if self._error is not None:
+            raise self._error
+
+# CPU encoders in order of preference, with the container each one goes into
+VIDEO_CODECS = (('avc1', '.mp4'), ('mp4v', '.mp4'), ('XVID', '.avi'))
+
+def create_video_writer(output_name, size, fps=10):
+    # output_name has no extension; returns the writer and the file it writes to
+    # Encode on the GPU (NVENC H.264) when OpenCV was built with CUDA and a device is present
+    if hasattr(cv2, 'cudacodec') and cv2.cuda.getCudaEnabledDeviceCount() > 0:
+        try:
+            output_video = output_name + '.mp4'
+            return _CudaVideoWriter(output_video, size, fps), output_video
+        except cv2.error as e:
+            print("NVENC writer unavailable, falling back to CPU encoding:", e)
+    # Not every OpenCV build ships libx264, so fall back until a writer opens
+    for fourcc, extension in VIDEO_CODECS:
+        output_video = output_name + extension
+        video = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if video.isOpened():
+            return video, output_video
+        video.release()
+    raise RuntimeError(f"No usable video encoder for {output_name}")
+
+def natural_key(name):
+    # Compare digit runs as numbers and everything else as text
+    return [int(part) if part.isdigit() else part for part in DIGITS_RE.split(name)]
+
+def write_video(frames, output_name='sun_video', fps=10):
+    # Let OpenCV's codecs use every core
+    cv2.setNumThreads(os.cpu_count())
+
+    # The first frame sizes the writer and is then written like the others
+    frames = iter(frames)
+    frame = next(frames)
     height, width, layers = frame.shape
-    video = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*'XVID'), 10, (width, height))  # 10 FPS
-    for image in images:
-        image_path = os.path.join(image_folder, image)
-        frame = cv2.imread(image_path)
+    video, output_video = create_video_writer(output_name, (width, height), fps=fps)
+    video = ThreadedVideoWriter(video)
+    video.write(frame)
+    for frame in frames:
         video.write(frame)
 
     video.release()
 
     print("Video creation completed: ", output_video)
+    return output_video
 
-def fits_video(path):
-    import os
-    import sunpy.map
-    import matplotlib.pyplot as plt
+def video_gen(path, step=1):
+    # Folder containing your 91 sun images
+    image_folder = path
+    with os.scandir(image_folder) as it:
+        images = [entry.name for entry in it if entry.name.endswith(('.png', '.jpg'))]
+    # Natural order, so frame_10 comes after frame_2
+    images.sort(key=natural_key)
+    # Select frames from the directory listing (keeping every `step`-th image) so
+    # skipped images are never read or decoded
+    image_paths = [os.path.join(image_folder, image) for image in images[::step]]
+    # cv2.imread releases the GIL, so the next images are read and decoded on worker
+    # threads while this thread encodes the current one
+    return write_video(_prefetch(cv2.imread, image_paths))
+
+# Percentiles of the finite pixels mapped to the ends of the 8-bit display range
+DISPLAY_PERCENTILES = (2, 98)
+JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 90, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+
+def display_range(data):
+    # Per-frame 2nd-98th percentile, so dark and bright frames both use the full range
+    finite = data[np.isfinite(data)]
+    n = finite.size
+    if n == 0:
+        return 0.0, 1.0
+    # Only two order statistics are needed: partition the (already copied) finite
+    # pixels in place around both ranks and read them off
+    k_lo, k_hi = (int(q / 100 * (n - 1)) for q in DISPLAY_PERCENTILES)
+    finite.partition((k_lo, k_hi))
+    lo, hi = float(finite[k_lo]), float(finite[k_hi])
+    return lo, (hi if hi > lo else lo + 1.0)
+
+# Inferno colormap as a BGR lookup table, one row per 8-bit level
+INFERNO_BGR = (plt.get_cmap('inferno')(np.arange(256))[:, 2::-1] * 255).round().astype(np.uint8)
+
+@njit(cache=True)
+def _map_to_bgr(data, lo, scale, lut, out):
+    # Rescale, clip and look up the colour of every pixel in one pass, no temporaries.
+    # Map rows start at the bottom (origin='lower'), image rows at the top, so rows are flipped.
+    # Serial on purpose: it runs inside one worker process per core already
+    n_rows = data.shape[0]
+    for i in range(n_rows):
+        row = out[n_rows - 1 - i]
+        for j in range(data.shape[1]):
+            v = (data[i, j] - lo) * scale
+            # Missing (off-disk) pixels are NaN, fail both tests and go to the bottom of the range
+            level = 0
+            if v >= 255.0:
+                level = 255
+            elif v > 0.0:
+                level = int(v)
+            row[j, 0] = lut[level, 0]
+            row[j, 1] = lut[level, 1]
+            row[j, 2] = lut[level, 2]
+
+def fits_to_bgr(data):
+    # Scale the data into 0..255 and apply the inferno colormap directly, no figure involved
+    # Numba needs a plain native-endian array; FITS data is big-endian and may be memory-mapped.
+    # float64 is narrowed to float32 on the way, ample for a percentile and an 8-bit remap,
+    # so the percentile and the rescale below move half the bytes
+    if data.dtype.kind == 'f' and data.dtype.itemsize > 4:
+        dtype = np.float32
+    else:
+        dtype = data.dtype.newbyteorder('=')
+    data = np.ascontiguousarray(data, dtype=dtype)
+    lo, hi = display_range(data)
+    out = np.empty(data.shape + (3,), dtype=np.uint8)
+    _map_to_bgr(data, float(lo), 255.0 / (hi - lo), INFERNO_BGR, out)
+    return out
+
+@lru_cache(maxsize=None)
+def _grid_figure():
+    # One figure per process, shared by every grid frame it renders
+    return plt.figure(figsize=(6, 6), dpi=100)
+
+# Axes, image artist and geometry of the last grid frame drawn in this process
+_grid_axes = {}
+
+def _render_frame(image_path, grid=False):
+    # Render one FITS file to a BGR frame; module level so worker processes can pickle it
+    if not grid:
+        # Only the pixels are needed: memory-map the file and skip building a sunpy Map
+        with fits.open(image_path, memmap=True) as hdul:
+            # first HDU carrying an image (compressed files keep it in an extension)
+            data = next(hdu.data for hdu in hdul if hdu.is_image and hdu.data is not None)
+            return fits_to_bgr(data)
+
+    amap = sunpy.map.Map(image_path)
+
+    # Plot with matplotlib, only needed for the coordinate grid overlay
+    lo, hi = display_range(amap.data)
+    # Reuse this process's figure instead of building and tearing down a canvas per file
+    fig = _grid_figure()
+    # Frames of one series share their pointing, so the WCS axes and the coordinate grid
+    # are built once and later frames only swap the pixel data and colour limits
+    geometry = (amap.data.shape, str(amap.detector), str(amap.wavelength),
+                str(amap.reference_pixel), str(amap.scale))
+    if _grid_axes.get('geometry') != geometry:
+        fig.clf()
+        ax = fig.add_subplot(projection=amap)
+        image = amap.plot(axes=ax, cmap='inferno', vmin=lo, vmax=hi)
+        amap.draw_grid(axes=ax)
+        _grid_axes.update(geometry=geometry, ax=ax, image=image)
+    else:
+        _grid_axes['image'].set_data(amap.data)
+        _grid_axes['image'].set_clim(lo, hi)
+    _grid_axes['ax'].set_title(os.path.basename(image_path))
+
+    # Take the rendered canvas as the frame instead of saving it
+    fig.canvas.draw()
+    return cv2.cvtColor(np.asarray(fig.canvas.buffer_rgba()), cv2.COLOR_RGBA2BGR)
+
+def _convert_one(image_path, output_folder, grid=False):
+    # Render one FITS file and save it as JPG
+    output_name = os.path.splitext(os.path.basename(image_path))[0] + ".jpg"
+    output_path = os.path.join(output_folder, output_name)
+    cv2.imwrite(output_path, _render_frame(image_path, grid), JPEG_PARAMS)
+    return output_path
+
+def list_fits(path):
+    # FITS files of a folder in natural (time) order
+    with os.scandir(path) as it:
+        names = [entry.name for entry in it if entry.name.lower().endswith(('.fits', '.fit'))]
+    names.sort(key=natural_key)
+    return [os.path.join(path, name) for name in names]
+
+def iter_fits_frames(path, grid=False):
+    # Every FITS file is independent and the work is CPU-bound Python, so spread
+    # the files over one process per core; frames come back in file order.
+    # A 4k frame is ~48 MB, so only two frames per worker are in flight at a time
+    workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from _bounded_map(executor, partial(_render_frame, grid=grid), list_fits(path), 2 * workers)
+
+def fits_video(path, grid=False, save_jpg=False):
+    if not save_jpg:
+        # Hand the rendered frames straight to the encoder, no JPG round trip through disk
+        return write_video(iter_fits_frames(path, grid))
 
     # Create output folder for JPGs
     output_folder = os.path.join(path, "jpg_output")
     os.makedirs(output_folder, exist_ok=True)
 
-    # Loop through all FITS files
-    for image in os.listdir(path):
-        if image.lower().endswith(('.fits', '.fit')):
-            image_path = os.path.join(path, image)
-            amap = sunpy.map.Map(image_path)
-
-            # Plot and save as JPG
-            fig = plt.figure(figsize=(6, 6))
-            amap.plot(cmap='inferno', vmin=100, vmax=6e4)
-            amap.draw_grid()
-            plt.title(image)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(_convert_one, list_fits(path), repeat(output_folder), repeat(grid), chunksize=4))
 
-            # Save image
-            output_name = os.path.splitext(image)[0] + ".jpg"
-            output_path = os.path.join(output_folder, output_name)
-            plt.savefig(output_path, format='jpg', dpi=150, bbox_inches='tight')
-            plt.close(fig)
+    return video_gen(output_folder)
 
-    video_gen(output_path)
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a sun video from a folder of images or FITS files")
+    parser.add_argument('path', nargs='?', default='fit_data/jpg_output',
+                        help="folder with .png/.jpg frames (or FITS files with --fits)")
+    parser.add_argument('--fits', action='store_true', help="render the FITS files in path")
+    parser.add_argument('--grid', action='store_true', help="draw the coordinate grid on FITS frames")
+    parser.add_argument('--save-jpg', action='store_true', help="also keep the rendered FITS frames as JPGs")
+    parser.add_argument('--step', type=int, default=1, help="keep every n-th image")
+    args = parser.parse_args()
 
-video_gen('fit_data/jpg_output')
\ No newline at end of file
+    if args.fits:
+        fits_video(args.path, grid=args.grid, save_jpg=args.save_jpg)
+    else:
+        video_gen(args.path, step=args.step)